@@ -1,12 +1,33 @@
 from collections import defaultdict as dd
+from collections import namedtuple
 import numpy as np
 import random
 import math
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from geometry import ONE_TILE_DIRECTIONS, TWO_TILE_DIRECTIONS, CELL_INDEX, NEIGHBOURS, SWING_MOVES
+from geometry import HEX_DISTANCE, distanceReductions
+from moves import THROW_MOVES
+from transposition import TranspositionTable, zobristKey, updateZobristKey
+from bitboard import BitBoard, fromBoardDicts, toBoardDicts, invincibleTokens
+from batch_evaluation import LeafBatch
+from mcts import mctsSearch
+from search_stats import SearchStats
+from opening_book import loadOpeningBook, DEFAULT_BOOK_PATH, BOOK_TURNS
+from evaluation_cache import EvaluationCache, DEFAULT_MAX_ENTRIES
+from tablebase import loadTablebase, tablebaseMove, tablebaseHeuristic, DEFAULT_TABLEBASE_PATH
+from incremental_evaluation import evaluationSummary, updateEvaluationSummary, incrementalHeuristic
 
 
 class Player:
 
-    def __init__(self, player):
+    def __init__(self, player, time_budget=None, max_depth=None, search_engine="average", mcts_iterations=None,
+                 parallel_workers=None, collect_stats=False, stats_hook=None,
+                 opening_book_path=DEFAULT_BOOK_PATH, book_turns=BOOK_TURNS, tablebase_path=DEFAULT_TABLEBASE_PATH,
+                 evaluation_cache_size=DEFAULT_MAX_ENTRIES, reuse_tree=True,
+                 ponder=False, incremental_evaluation=False):
         
         self.team = player
 
@@ -18,37 +39,380 @@ class Player:
         self.turn_num = 1
 
         self.last_opponent_move = None
+
+        # Scores of positions searched, kept between turns
+        self.transposition_table = TranspositionTable()
+
+        # Seconds each move may search for. If given, moves are chosen by iterative deepening up to
+        # max_depth (MAX_SEARCH_DEPTH if None), otherwise by a fixed depth 2 search
+        self.time_budget = time_budget
+        self.max_depth = MAX_SEARCH_DEPTH if max_depth is None else max_depth
+
+        # "average" scores moves by their average outcome (buildStateTree/streamingSearch), "smab" by their
+        # worst outcome with simultaneous-move alpha-beta (smabSearch), "mcts" uses Monte Carlo tree search
+        # (mcts.py) for time_budget seconds and/or mcts_iterations iterations
+        if search_engine not in SEARCH_ENGINES and search_engine != "mcts":
+            raise ValueError('search_engine of:', search_engine, 'is not one of', tuple(SEARCH_ENGINES) + ("mcts",))
+        self.search_engine = search_engine
+        self.mcts_iterations = mcts_iterations
+
+        # Statistics of the last Monte Carlo search (iterations, seconds, playouts_per_second)
+        self.last_mcts_stats = None
+
+        # Depth of the last completed iterative deepening search
+        self.last_search_depth = 0
+
+        # Nodes searched by the last call to action (joint moves applied, or iterations for "mcts")
+        self.last_search_nodes = 0
+
+        # If given, the fixed depth search of the "average" engine is split over this many worker
+        # processes (started now, and kept until close() is called)
+        self.process_pool = None if parallel_workers is None else createSearchPool(parallel_workers)
+
+        # If collect_stats is set (or a stats_hook is given), each action() keeps a SearchStats of its
+        # search in last_search_stats, and calls stats_hook(team, turn_num, search_stats) if given
+        self.collect_stats = collect_stats or stats_hook is not None
+        self.stats_hook = stats_hook
+        self.last_search_stats = None
+
+        # Heuristic scores of up to evaluation_cache_size leaf positions, kept between turns (None turns
+        # the cache off). Searches call self.heuristic_function, the cached incrementalHeuristic (same
+        # scores as test_board_heuristic_three), with the tablebase's scores if there is one (see below)
+        if evaluation_cache_size is None:
+            self.evaluation_cache = None
+            self.heuristic_function = incrementalHeuristic
+        else:
+            self.evaluation_cache = EvaluationCache(incrementalHeuristic, evaluation_cache_size)
+            self.heuristic_function = self.evaluation_cache
+
+        # If incremental_evaluation is set, every state searched gets its evaluation summary (see
+        # incremental_evaluation.py) updated from its parent's, instead of only leaves getting one
+        # from scratch
+        self.incremental_evaluation = incremental_evaluation
+
+        # If reuse_tree is set, the tree of the fixed depth search of the "average" engine is kept, and
+        # update() keeps the part of it below the joint move played, which the next search extends
+        # instead of building its first ply again
+        self.reuse_tree = reuse_tree
+        self.search_tree = None
+
+        # If ponder is set (and reuse_tree), after each action() a background thread searches the
+        # positions our move can lead to, for the opponent's replies in the kept tree (those worst for
+        # us first), until update() stops it. The next action() uses the pondered tree of the reply
+        # played if it was finished. The thread's CPU time is added up in ponder_time, it isn't part of
+        # action()'s search (last_search_nodes, last_search_stats) and its random choices don't change
+        # action()'s (see SearchContext). The thread shares the interpreter, so an opponent in the same
+        # process runs slower while we ponder, and a CPU time limit on the whole process (like the
+        # referee's) is charged for the pondering too. Seeded games with pondering are only repeatable
+        # if the same pondered trees are finished, which depends on timing
+        self.ponder = ponder
+        self.ponder_thread = None
+        self.ponder_stop = None
+        self.ponder_time = 0.0
+
+        # Reply -> fully searched tree, and the replies pondering started on, of the current pondering
+        self.pondered_trees = {}
+        self.pondered_replies = set()
+
+        # Tree of the reply played, searched while pondering, for the next action()
+        self.pondered_tree = None
+
+        # Book moves are played for the first book_turns turns, positions not in the book are searched.
+        # Without a book (no file at opening_book_path, or it is None) the hand-coded openings are used for
+        # the first 4 turns. With a book, turns after book_turns are searched even if they are in the first
+        # 4: the hand-coded moves assume the hand-coded moves were played before them (the turn 4 throw
+        # onto row 1 needs 3 earlier throws)
+        self.opening_book = None if opening_book_path is None else loadOpeningBook(opening_book_path)
+        self.book_turns = book_turns
+
+        # Positions in the endgame tablebase (tablebase.py) play a forced win if there is one, otherwise
+        # they are searched by the search engine's search (streamingSearch for "mcts", whose playouts don't
+        # use the heuristic). Every search (but "mcts") scores the leaves the table has a forced win for with
+        # the table's score instead of the heuristic, so positions with more tokens see the endgames they can
+        # lead to. Not used if there is no file at tablebase_path (or it is None), and closed by close()
+        self.tablebase = None if tablebase_path is None else loadTablebase(tablebase_path)
+        if self.tablebase is not None:
+            self.heuristic_function = tablebaseHeuristic(self.tablebase, self.heuristic_function)
         
 
 
     def action(self):
+
+        nodes_before = search_context.joint_moves_applied
+
+        # Nodes searched outside of this process's apply_joint_move (worker processes, Monte Carlo search)
+        other_nodes = 0
+
+        search_stats = SearchStats() if self.collect_stats else None
+
+        # Only the search below reuses the tree, any other way of choosing a move drops it
+        search_tree, self.search_tree = self.search_tree, None
+        pondered_tree, self.pondered_tree = self.pondered_tree, None
         
         root_state = State_node(team=self.team, coord_dict=self.coord_dict, piece_dict=self.piece_dict, 
                       upper_thrown_num=self.upper_thrown_num, lower_thrown_num=self.lower_thrown_num, 
                       primary_move_list=[], parent_secondary_node=None, node_depth=0)
 
-        if self.turn_num <= 4:
+        if self.incremental_evaluation:
+            root_state.evaluation_summary = evaluationSummary(self.piece_dict)
+
+        book_move = None
+        if self.opening_book is not None and self.turn_num <= self.book_turns:
+            book_move = self.opening_book.lookup(self.team, self.coord_dict, self.upper_thrown_num,
+                                                 self.lower_thrown_num)
+
+        # Board of the position if it is in the tablebase
+        tablebase_board = None
+        if self.tablebase is not None and self.upper_thrown_num == 9 and self.lower_thrown_num == 9:
+            board = fromBoardDicts(self.coord_dict, self.upper_thrown_num, self.lower_thrown_num)
+            if self.tablebase.covers(board):
+                tablebase_board = board
+
+        if book_move is not None:
+            move = book_move
+
+        elif self.turn_num <= 4 and self.opening_book is None:
             move = starting_move_generator_smart(self.team, self.last_opponent_move, self.turn_num)
-            
+
+        elif tablebase_board is not None:
+
+            move = tablebaseMove(self.tablebase, tablebase_board, self.team)
+
+            if move is None:
+                self.transposition_table.new_search()
+
+                search_function = SEARCH_ENGINES.get(self.search_engine, streamingSearch)
+                search_function(root_state, desired_depth=2, pruning_function=test_pruning_three,
+                                heuristic_function=self.heuristic_function, turn_num=self.turn_num,
+                                transposition_table=self.transposition_table, search_stats=search_stats)
+
+                move = getBestMove(root_state)
+
+        elif self.search_engine == "mcts":
+
+            # Both players' root moves are the pruned moves, so the playouts are spread over the moves the
+            # other engines would consider (every legal move is used below the root)
+            moves_upper, moves_lower = test_pruning_three(root_state)
+
+            move, self.last_mcts_stats = mctsSearch(
+                fromBoardDicts(self.coord_dict, self.upper_thrown_num, self.lower_thrown_num), self.team,
+                self.turn_num, time_budget=self.time_budget, iterations=self.mcts_iterations,
+                upper_moves=moves_upper, lower_moves=moves_lower)
+
+            other_nodes = self.last_mcts_stats["iterations"]
+
+            if search_stats is not None:
+                # Each iteration adds (at most) one node to the Monte Carlo tree
+                search_stats.nodes_expanded = other_nodes
+
+        elif self.time_budget is not None:
+
+            self.transposition_table.new_search()
+
+            move, self.last_search_depth = iterativeDeepeningSearch(
+                root_state, pruning_function=test_pruning_three, heuristic_function=self.heuristic_function,
+                turn_num=self.turn_num, time_budget=self.time_budget, max_depth=self.max_depth,
+                transposition_table=self.transposition_table, search_function=SEARCH_ENGINES[self.search_engine],
+                search_stats=search_stats)
+
+        elif self.search_engine == "smab":
+
+            self.transposition_table.new_search()
+
+            smabSearch(root_state, desired_depth=2, pruning_function=test_pruning_three,
+                       heuristic_function=self.heuristic_function, turn_num=self.turn_num,
+                       transposition_table=self.transposition_table, search_stats=search_stats)
+
+            move = getBestMove(root_state)
+
+        elif self.process_pool is not None:
+
+            # Each worker process searches some of the root's primary moves with its own transposition table,
+            # scoring leaves batched like the search below
+            other_nodes = parallelRootSearch(root_state, desired_depth=2, pruning_function=test_pruning_three,
+                                             turn_num=self.turn_num, process_pool=self.process_pool,
+                                             tablebase_path=None if self.tablebase is None else self.tablebase.path)
+
+            move = getBestMove(root_state)
+
         else:
 
-            # Build state tree
-            buildStateTree(root_state, desired_depth=2, pruning_function=test_pruning_three, turn_num=self.turn_num)
+            if pondered_tree is not None:
+                # Already searched while the opponent chose its move
+                root_state = pondered_tree
+                root_state.coord_dict = self.coord_dict
+                root_state.piece_dict = self.piece_dict
+
+            else:
+                self.transposition_table.new_search()
 
-            # Calculate scores for moves
-            calculateMoveScores(root_state, heuristic_function=test_board_heuristic_three)
+                # Leaves are scored together once the tree is built (test_board_heuristic_three, batched)
+                leaf_batch = LeafBatch(self.evaluation_cache, self.tablebase)
+
+                if search_tree is not None:
+                    # Extend the tree kept from the last turn
+                    root_state = search_tree
+                    root_state.coord_dict = self.coord_dict
+                    root_state.piece_dict = self.piece_dict
+
+                    extendStateTree(root_state, desired_depth=2, pruning_function=test_pruning_three,
+                                    turn_num=self.turn_num, transposition_table=self.transposition_table,
+                                    leaf_batch=leaf_batch, search_stats=search_stats)
+                else:
+                    # Build state tree
+                    buildStateTree(root_state, desired_depth=2, pruning_function=test_pruning_three,
+                                   turn_num=self.turn_num, transposition_table=self.transposition_table,
+                                   leaf_batch=leaf_batch, search_stats=search_stats)
+
+                if search_stats is not None:
+                    evaluation_start = time.perf_counter()
+
+                leaf_batch.evaluate(self.transposition_table)
+
+                if search_stats is not None:
+                    search_stats.evaluation_time += time.perf_counter() - evaluation_start
+                    search_stats.leaves_evaluated += len(leaf_batch)
+                    search_stats.transposition_hits += len(leaf_batch.duplicates)
+                    scoring_start = time.perf_counter()
+
+                # Calculate scores for moves
+                calculateMoveScores(root_state, heuristic_function=self.heuristic_function,
+                                    transposition_table=self.transposition_table, search_stats=search_stats)
+
+                if search_stats is not None:
+                    search_stats.scoring_time += time.perf_counter() - scoring_start
 
             # Chosen move
             move = getBestMove(root_state)
 
+            if self.reuse_tree:
+                self.search_tree = root_state
+
+        self.last_search_nodes = search_context.joint_moves_applied - nodes_before + other_nodes
+
+        if search_stats is not None:
+            search_stats.finish()
+            self.last_search_stats = search_stats
+
+            if self.stats_hook is not None:
+                self.stats_hook(self.team, self.turn_num, search_stats)
+
+        if self.ponder and self.search_tree is not None:
+            self.startPondering(move)
+
         return move
 
+    def startPondering(self, move):
+        # Start the pondering thread for the opponent's replies to move in the kept tree
+
+        secondary_move_list = []
+        for primary_move_node in self.search_tree.primary_move_list:
+            if primary_move_node.move == move:
+                secondary_move_list = primary_move_node.secondary_move_list
+
+        # Only expanded states can be extended, the replies best for the opponent (worst for us) first
+        secondary_move_list = sorted(
+            (secondary_move_node for secondary_move_node in secondary_move_list
+             if secondary_move_node.state_node.primary_move_list != []),
+            key=lambda secondary_move_node: stateScore(secondary_move_node.state_node))
+
+        self.pondered_trees = {}
+        self.pondered_replies = set()
+        self.ponder_stop = threading.Event()
+
+        # The thread's random choices are made with its own generator, seeded from ours, so they don't
+        # change the random choices of this thread's searches
+        rng = random.Random(search_context.rng.getrandbits(64))
+
+        self.ponder_thread = threading.Thread(target=self.ponderReplies, args=(move, secondary_move_list, rng),
+                                              daemon=True)
+        self.ponder_thread.start()
+
+    def ponderReplies(self, move, secondary_move_list, rng):
+        # Body of the pondering thread, see startPondering
+
+        start = time.thread_time()
+
+        search_context.rng = rng
+
+        for secondary_move_node in secondary_move_list:
+            if self.ponder_stop.is_set():
+                break
+
+            reply = secondary_move_node.move
+            self.pondered_replies.add(reply)
+
+            if self.team == "upper":
+                upper_move, lower_move = move, reply
+            else:
+                upper_move, lower_move = reply, move
+
+            coord_dict, piece_dict, upper_thrown_num, lower_thrown_num = resolveMoves(
+                upper_move, lower_move, self.coord_dict, self.upper_thrown_num, self.lower_thrown_num)
+
+            state_node = secondary_move_node.state_node
+            state_node.coord_dict = coord_dict
+            state_node.piece_dict = piece_dict
+
+            if ponderSearch(state_node, self.turn_num + 1, self.transposition_table, self.evaluation_cache,
+                            self.heuristic_function, self.ponder_stop, self.tablebase):
+                self.pondered_trees[reply] = state_node
+
+        self.ponder_time += time.thread_time() - start
+
+    def stopPondering(self):
+        # Stop the pondering thread (if running) and wait for it. It stops at its next expansion or
+        # between the steps of a search, so this takes at most a few tens of milliseconds
+
+        if self.ponder_thread is not None:
+            self.ponder_stop.set()
+            self.ponder_thread.join()
+            self.ponder_thread = None
+
+    def close(self):
+        # Stop pondering, shut down the worker processes of parallel_workers, which are otherwise kept
+        # until the interpreter exits, and close the tablebase file. Later moves are searched in this
+        # process, without the tablebase
+
+        self.stopPondering()
+
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
+
+        if self.tablebase is not None:
+            self.tablebase.close()
+            self.tablebase = None
+            self.heuristic_function = incrementalHeuristic if self.evaluation_cache is None else self.evaluation_cache
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def update(self, opponent_action, player_action):
         
         
         
         self.last_opponent_move = opponent_action
 
+        self.stopPondering()
+
+        if opponent_action in self.pondered_trees:
+            self.pondered_tree = self.pondered_trees[opponent_action]
+            self.search_tree = None
+
+        elif opponent_action in self.pondered_replies:
+            # Pondering was stopped part way through this reply's tree
+            self.search_tree = None
+
+        elif self.search_tree is not None:
+            self.search_tree = descendStateTree(self.search_tree, player_action, opponent_action)
+
+        self.pondered_trees = {}
+        self.pondered_replies = set()
+
         # Update board representations
 
         if self.team == "upper":
@@ -63,12 +427,8 @@ class Player:
 
 
 
-# Directions for tiles a distance of 1 away
-ONE_TILE_DIRECTIONS = ((-1, 0), (-1,1), (0,-1), (0,1), (1,-1), (1,0))
-
-# Directions for tiles a distance of 2 away
-TWO_TILE_DIRECTIONS = ((-2, 0), (-2,2), (0,-2), (0,2), (2,-2), (2,0),
-                       (2,-1), (1,1), (-1,2), (-2,1), (-1,-1), (1,-2))
+# Board pieces belonging to each team
+TEAM_PIECES = {"upper": ("R", "P", "S"), "lower": ("r", "p", "s")}
 
 UPPER_WINS = 1
 LOWER_WINS = -1
@@ -76,19 +436,40 @@ DRAW = 2
 NOT_ENDED = 0
 
 
+class SearchContext(threading.local):
+    # State of the searches of one thread, each thread sees its own attributes (so a pondering thread
+    # doesn't change the action() searches'): the number of joint moves apply_joint_move has applied,
+    # used to count search nodes, and the generator the searches' random choices (pruning, ties) are
+    # made with. That is the random module's own unless the thread sets another, so random.seed makes
+    # searches repeatable
+
+    def __init__(self):
+        self.joint_moves_applied = 0
+        self.rng = random
+
+
+search_context = SearchContext()
+
+# Deepest search iterativeDeepeningSearch starts by default
+MAX_SEARCH_DEPTH = 4
+
+
 def tuple_addition(tuple1, tuple2):
     return tuple(map(lambda i, j: i + j, tuple1, tuple2))
 
 def outOfBounds(pos):
     # Returns true if position given is out of bounds
-    x = pos[0]
-    y = pos[1]
-    return (abs(-x - y) > 4) or (abs(x) > 4 or abs(y) > 4)
+    return pos not in CELL_INDEX
 
-def validMove(piece_team, move_type, from_pos, to_pos, coord_dict):
+def hasTeamPiece(coord_dict, pos, piece_team):
+    # Returns true if there is a piece of piece_team in pos
+    team_pieces = TEAM_PIECES[piece_team]
+    for piece in coord_dict.get(pos, ()):
+        if piece in team_pieces:
+            return True
+    return False
 
-    # Need to add throw move functionality
-    # Need to have #throws_had as input
+def validMove(piece_team, move_type, from_pos, to_pos, coord_dict):
 
     # piece_team specifies if you are playing as "upper" or "lower"
 
@@ -96,55 +477,25 @@ def validMove(piece_team, move_type, from_pos, to_pos, coord_dict):
     if outOfBounds(from_pos) or outOfBounds(to_pos):
         return False
 
-    # Check that there is anything in from_pos
-    if not from_pos in coord_dict:
+    # Check that there is a piece of piece_team in from_pos
+    if not hasTeamPiece(coord_dict, from_pos, piece_team):
         return False
 
-    if piece_team == "upper":
-        # Check that there is an upper piece in from_pos
-        if not ("R" in coord_dict[from_pos] or "P" in coord_dict[from_pos] or "S" in coord_dict[from_pos]):
-            return False
-    elif piece_team == "lower":
-        if not ("r" in coord_dict[from_pos] or "p" in coord_dict[from_pos] or "s" in coord_dict[from_pos]):
-            return False
-
-    adjacent_tiles = [tuple_addition(i, from_pos) for i in ONE_TILE_DIRECTIONS]
-
     if move_type == "SLIDE":
 
-        if to_pos in adjacent_tiles:
-            return True
-        else:
-            return False
+        return to_pos in NEIGHBOURS[from_pos]
 
     elif move_type == "SWING":
 
-        # Check if from_pos is adjacent to to_pos, if it is, the move is invalid
-        if to_pos in adjacent_tiles:
-            # It is adjacent
-            return False
-
-        # Look at all tiles one distance away from from_pos
-        for adjacent_tile in adjacent_tiles:
-            # Check if adjacent tile is adjacent to to_pos
-            # If there is also an upper in that position then the move is valid
-
-
-            if to_pos in [tuple_addition(i, adjacent_tile) for i in ONE_TILE_DIRECTIONS]:
-                # The current adjacent_tile is adjacent to both from_pos and to_pos
-
+        # Look at the tiles adjacent to both from_pos and to_pos (to_pos can't be adjacent to from_pos)
+        for tile, pivots in SWING_MOVES[from_pos]:
+            if tile == to_pos:
                 # Check that there is a friendly piece to swing around
-                if piece_team == "upper":
-                    if adjacent_tile in coord_dict and ("R" in coord_dict[adjacent_tile] or "P" in coord_dict[adjacent_tile] or "S" in coord_dict[adjacent_tile]):
-                        # There is an upper piece adjacent to both from_pos and to_pos
-                        return True
-                if piece_team == "lower":
-                    if adjacent_tile in coord_dict and ("r" in coord_dict[adjacent_tile] or "p" in coord_dict[adjacent_tile] or "s" in coord_dict[adjacent_tile]):
-                        # There is a lower piece adjacent to both from_pos and to_pos
+                for pivot in pivots:
+                    if hasTeamPiece(coord_dict, pivot, piece_team):
                         return True
 
-        # If all adjacent upper pieces have been checked and none of them are adjacent to to_pos
-        # then the move is invalid
+        # If none of the tiles adjacent to both have a friendly piece then the move is invalid
         return False
 
     else:
@@ -166,135 +517,118 @@ def getEmptyBoardConfigs():
 def getValidMovesForPiece(from_pos, coord_dict, piece_team):
 
     # piece_team is either "upper" or "lower"
-    # piece_type is one of: "r", "p", "s"
-
-    # Need throw moves
-
-    valid_moves = []
-
-    # First check the 6 possible SLIDE moves
 
-    adjacent_tiles = [tuple_addition(i, from_pos) for i in ONE_TILE_DIRECTIONS]
+    # Check that there is a piece of piece_team in from_pos
+    if not hasTeamPiece(coord_dict, from_pos, piece_team):
+        return []
 
-    for adjacent_tile in adjacent_tiles:
-        if validMove(piece_team, "SLIDE", from_pos, adjacent_tile, coord_dict):
-            valid_moves.append(("SLIDE", from_pos, adjacent_tile))
+    # First the (up to) 6 possible SLIDE moves
 
-    # Secondly check the 12 SWING moves
+    valid_moves = [("SLIDE", from_pos, adjacent_tile) for adjacent_tile in NEIGHBOURS[from_pos]]
 
-    two_tiles_away = [tuple_addition(i, from_pos) for i in TWO_TILE_DIRECTIONS]
+    # Secondly the (up to) 12 SWING moves, each needs a friendly piece to swing around
 
-    for tile in two_tiles_away:
-        if validMove(piece_team, "SWING", from_pos, tile, coord_dict):
-            valid_moves.append(("SWING", from_pos, tile))
+    for tile, pivots in SWING_MOVES[from_pos]:
+        for pivot in pivots:
+            if hasTeamPiece(coord_dict, pivot, piece_team):
+                valid_moves.append(("SWING", from_pos, tile))
+                break
 
     return valid_moves
 
 
 def getThrowMoves(thrown_num, team):
-    
-    ROW_COORDS = [[(4, -4), (4, -3), (4, -2), (4, -1), (4, 0)],
-                  [(3, -4), (3, -3), (3, -2), (3, -1), (3, 0), (3, 1)],
-                  [(2, -4), (2, -3), (2, -2), (2, -1), (2, 0), (2, 1), (2, 2)],
-                  [(1, -4), (1, -3), (1, -2), (1, -1), (1, 0), (1, 1), (1, 2), (1, 3)],
-                  [(0, -4), (0, -3), (0, -2), (0, -1), (0, 0), (0, 1), (0, 2), (0, 3), (0, 4)],
-                  [(-1, -3), (-1, -2), (-1, -1), (-1, 0), (-1, 1), (-1, 2), (-1, 3), (-1, 4)],
-                  [(-2, -2), (-2, -1), (-2, 0), (-2, 1), (-2, 2), (-2, 3), (-2, 4)],
-                  [(-3, -1), (-3, 0), (-3, 1), (-3, 2), (-3, 3), (-3, 4)],
-                  [(-4, 0), (-4, 1), (-4, 2), (-4, 3), (-4, 4)]]
+    # Throws team can make after thrown_num throws, row by row from its first throw row (precomputed,
+    # see moves.py)
+    return list(THROW_MOVES[team][thrown_num])
+                
+def resolveMoves(upper_move, lower_move, coord_dict, upper_thrown_num, lower_thrown_num):
+    # Given the upper and lower moves and coord_dict, return a new coord_dict and piece_dict with the
+    # moves applied and battles resolved, along with the new throw counts.
+    # Pure wrapper around apply_joint_move, coord_dict is not modified
 
-    throws = []
+    new_coord_dict = deepCopy(coord_dict)
+    new_piece_dict = pieceDictFromCoordDict(new_coord_dict)
 
-    if team == "upper":
-        if thrown_num < 9:
-            for row_index in range(thrown_num+1):
-                for coord in ROW_COORDS[row_index]:
-                    throws += [("THROW", "r", coord), ("THROW", "p", coord), ("THROW", "s", coord)]
-    else:
-        # Deal with lower throws
-        if thrown_num < 9:
-            for row_index in range(8 - thrown_num, 9):
-                for coord in ROW_COORDS[row_index]:
-                    throws += [("THROW", "r", coord), ("THROW", "p", coord), ("THROW", "s", coord)]
+    new_upper_thrown_num, new_lower_thrown_num, _ = apply_joint_move(
+        upper_move, lower_move, new_coord_dict, new_piece_dict, upper_thrown_num, lower_thrown_num)
 
-    return throws
-                
-def resolveMoves(upper_move, lower_move, coord_dict, upper_thrown_num, lower_thrown_num):
-    # Given list of moves (one for each upper piece) and coord_dict
-    # Create new coord_dict, where the pieces are deleted from each from_pos and added to each to_pos
-    # Go through each to_pos key in coord_dict and apply the rules
-    # Create a new piece_dict, including the pieces that are still alive
+    # Hexes emptied by the moves are left in place by apply_joint_move
+    for coord in [coord for coord, pieces in new_coord_dict.items() if not pieces]:
+        del new_coord_dict[coord]
 
-    # return new coord_dict and piece_dict
+    return new_coord_dict, new_piece_dict, new_upper_thrown_num, new_lower_thrown_num
 
-    new_coord_dict = deepCopy(coord_dict)
 
-    new_piece_dict = {"upper": {"r": [], "p": [], "s": []},
-                      "lower": {"r": [], "p": [], "s": []}}
+def pieceDictFromCoordDict(coord_dict):
+    # Create a piece_dict from coord_dict
 
-    # Deal with upper 
-    move_type_upper = upper_move[0]
-    
-    if move_type_upper in ["SLIDE", "SWING"]:
+    piece_dict = {"upper": {"r": [], "p": [], "s": []},
+                  "lower": {"r": [], "p": [], "s": []}}
 
-        from_pos = upper_move[1]
-        to_pos = upper_move[2]
+    for coord, pieces in coord_dict.items():
+        for piece in pieces:
 
-        # Looking at the first element of the list for position (from_pos), it could be a LOWER piece, but it must be
-        # the same type as the UPPER which is at the same position
+            if piece in ["R", "P", "S"]:
+                piece_dict["upper"][piece.lower()].append(coord)
 
-        piece_type = new_coord_dict[from_pos][0].upper()
+            elif piece in ["r", "p", "s"]:
+                piece_dict["lower"][piece].append(coord)
+            else:
+                raise ValueError('piece value of:', piece, 'is not upper or lower!')
 
-        new_coord_dict[from_pos].remove(piece_type)
+    return piece_dict
 
-        # Check if that tile is empty now
 
-        if new_coord_dict[from_pos] == []:
-            del new_coord_dict[from_pos]
+def touchHex(coord, coord_dict, touched_hexes):
+    # Give coord a fresh list in coord_dict, remembering the old one (None if the hex was empty) the first
+    # time the hex is touched, so apply_joint_move never modifies a list that undo_joint_move restores
+    if coord not in touched_hexes:
+        old_pieces = coord_dict.get(coord)
+        touched_hexes[coord] = old_pieces
+        coord_dict[coord] = [] if old_pieces is None else old_pieces.copy()
+    return coord_dict[coord]
 
-        # Add the same type of piece to the to_coord
 
-        new_coord_dict[to_pos].append(piece_type)
-        
-    else:
-        # This is a THROW, just need to add the piece to the new coord dict
-        to_pos = upper_move[2]
-        piece_type = upper_move[1].upper()
-        new_coord_dict[to_pos].append(piece_type)
+def apply_joint_move(upper_move, lower_move, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num):
+    # Apply the upper and lower moves to coord_dict and piece_dict in place and resolve battles.
+    # Only the hexes touched by the moves are changed, and their previous contents are kept in the
+    # returned undo record. Hexes left empty keep an empty list so undoing keeps coord_dict's order.
+    # Lists are replaced rather than modified, so lists taken out of coord_dict or piece_dict before
+    # the move are unchanged by it.
+    # Returns (new_upper_thrown_num, new_lower_thrown_num, undo_record), pass undo_record to
+    # undo_joint_move to restore coord_dict and piece_dict
+    # TODO: take move codes, see the TODO of moves.py
 
+    search_context.joint_moves_applied += 1
 
-    # Deal with lower 
-    move_type_lower = lower_move[0]
-    
-    if move_type_lower in ["SLIDE", "SWING"]:
+    # coord -> list of pieces before the move (None if empty)
+    touched_hexes = {}
 
-        from_pos = lower_move[1]
-        to_pos = lower_move[2]
+    # Deal with upper then lower
+    for move, to_piece in ((upper_move, str.upper), (lower_move, str.lower)):
 
-        # Looking at the first element of the list for position (from_pos), it could be an UPPER piece, but it must be
-        # the same type as the LOWER which is at the same position
+        to_pos = move[2]
 
-        piece_type = new_coord_dict[from_pos][0].lower()
+        if move[0] != "THROW":
 
-        new_coord_dict[from_pos].remove(piece_type)
+            # Looking at the first element of the list for position (from_pos), it could be a piece of the
+            # other team, but it must be the same type as the piece being moved which is at the same position
 
-        # Check if that tile is empty now
+            from_pieces = touchHex(move[1], coord_dict, touched_hexes)
 
-        if new_coord_dict[from_pos] == []:
-            del new_coord_dict[from_pos]
+            piece_type = to_piece(from_pieces[0])
 
-        # Add the same type of piece to the to_coord
+            from_pieces.remove(piece_type)
 
-        new_coord_dict[to_pos].append(piece_type)
-        
-    else:
-        # This is a THROW, just need to add the piece to the new coord dict
-        to_pos = lower_move[2]
-        piece_type = lower_move[1].lower()
-        new_coord_dict[to_pos].append(piece_type)
+        else:
+            # This is a THROW, just need to add the piece to to_pos
+            piece_type = to_piece(move[1])
 
+        # Add the piece to the to_pos
+        touchHex(to_pos, coord_dict, touched_hexes).append(piece_type)
 
-    # Go through each to_coord and remove pieces according to the rules
+    # Go through each to_pos and remove pieces according to the rules
 
     # Rules:
         # If the hex is occupied by one or more tokens with each symbol, all of the tokens are defeated.
@@ -302,50 +636,79 @@ def resolveMoves(upper_move, lower_move, coord_dict, upper_thrown_num, lower_thr
         # If the hex is occupied by a Scissors token, all Paper tokens there are defeated.
         # If the hex is occupied by a Paper token, all Rock tokens there are defeated.
 
-    for move in list(set([upper_move, lower_move])):
-
-        to_pos = move[-1]
+    for to_pos in {upper_move[2], lower_move[2]}:
 
-        pieces = new_coord_dict[to_pos]
+        pieces = coord_dict[to_pos]
 
         rock_present = ("R" in pieces or "r" in pieces)
         paper_present = ("P" in pieces or "p" in pieces)
         scissors_present = ("S" in pieces or "s" in pieces)
 
         if rock_present and paper_present and scissors_present:
-            del new_coord_dict[to_pos]
+            coord_dict[to_pos] = []
 
         elif rock_present and scissors_present:
-            new_coord_dict[to_pos] = [piece for piece in pieces if piece not in ["S", "s"]]
+            coord_dict[to_pos] = [piece for piece in pieces if piece not in ["S", "s"]]
 
         elif scissors_present and paper_present:
-            new_coord_dict[to_pos] = [piece for piece in pieces if piece not in ["P", "p"]]
+            coord_dict[to_pos] = [piece for piece in pieces if piece not in ["P", "p"]]
 
         elif paper_present and rock_present:
-            new_coord_dict[to_pos] = [piece for piece in pieces if piece not in ["R", "r"]]
+            coord_dict[to_pos] = [piece for piece in pieces if piece not in ["R", "r"]]
 
-    # Create new_piece_dict from new_coord_dict:
+    # Update piece_dict for the touched hexes, copying each piece list before its first change
 
-    for coord, pieces in new_coord_dict.items():
-        for piece in pieces:
+    # (team, piece type) -> list of coords before the move
+    old_piece_lists = {}
 
-            if piece in ["R", "P", "S"]:
-                new_piece_dict["upper"][piece.lower()].append(coord)
+    for coord, old_pieces in touched_hexes.items():
 
-            elif piece in ["r", "p", "s"]:
-                new_piece_dict["lower"][piece.lower()].append(coord)
-            else:
-                raise ValueError('piece value of:', piece, 'is not upper or lower!')
+        new_pieces = coord_dict[coord]
+
+        for pieces, add in ((old_pieces or (), False), (new_pieces, True)):
+            for piece in pieces:
+
+                team = "upper" if piece in ["R", "P", "S"] else "lower"
+                piece_type = piece.lower()
+
+                if (team, piece_type) not in old_piece_lists:
+                    old_piece_lists[(team, piece_type)] = piece_dict[team][piece_type]
+                    piece_dict[team][piece_type] = piece_dict[team][piece_type].copy()
+
+                if add:
+                    piece_dict[team][piece_type].append(coord)
+                else:
+                    piece_dict[team][piece_type].remove(coord)
 
     new_upper_thrown_num = upper_thrown_num
     new_lower_thrown_num = lower_thrown_num
-    
-    if move_type_upper == "THROW":
+
+    if upper_move[0] == "THROW":
         new_upper_thrown_num += 1
-    if move_type_lower == "THROW":
-        new_lower_thrown_num += 1 
-    
-    return new_coord_dict, new_piece_dict, new_upper_thrown_num, new_lower_thrown_num
+    if lower_move[0] == "THROW":
+        new_lower_thrown_num += 1
+
+    undo_record = (touched_hexes, old_piece_lists, upper_thrown_num, lower_thrown_num)
+
+    return new_upper_thrown_num, new_lower_thrown_num, undo_record
+
+
+def undo_joint_move(undo_record, coord_dict, piece_dict):
+    # Restore coord_dict and piece_dict to how they were before the apply_joint_move call that
+    # returned undo_record. Returns the (upper_thrown_num, lower_thrown_num) from before the move
+
+    touched_hexes, old_piece_lists, upper_thrown_num, lower_thrown_num = undo_record
+
+    for coord, old_pieces in touched_hexes.items():
+        if old_pieces is None:
+            coord_dict.pop(coord, None)
+        else:
+            coord_dict[coord] = old_pieces
+
+    for (team, piece_type), old_coords in old_piece_lists.items():
+        piece_dict[team][piece_type] = old_coords
+
+    return upper_thrown_num, lower_thrown_num
 
 
 def deepCopy(list_dict):
@@ -357,60 +720,54 @@ def deepCopy(list_dict):
 
     return copy
 
+# Material summary of a position: how many pieces of each type ("r", "p", "s" order) each team has on
+# the board, the throw counts and hasInvincibleToken's result. A state's is worked out once, when the
+# state is created (see State_node), then gameEnded and test_pruning_three only look at it
+Material = namedtuple("Material", ["upper_counts", "lower_counts", "upper_on_board", "lower_on_board",
+                                   "upper_thrown_num", "lower_thrown_num", "invincible"])
+
+def materialSummary(piece_dict, upper_thrown_num, lower_thrown_num):
+
+    upper = piece_dict["upper"]
+    lower = piece_dict["lower"]
+
+    upper_counts = (len(upper["r"]), len(upper["p"]), len(upper["s"]))
+    lower_counts = (len(lower["r"]), len(lower["p"]), len(lower["s"]))
+
+    return Material(upper_counts, lower_counts, sum(upper_counts), sum(lower_counts),
+                    upper_thrown_num, lower_thrown_num,
+                    invincibleTokens(*upper_counts, *lower_counts, upper_thrown_num, lower_thrown_num))
+
 def hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num):
-    # Key loses to value
-    lose_dict = {"r": "p", "p": "s", "s": "r"}
-    
-    upper_invincible = False
-    lower_invincible = False
-    
-    upper_invincible_type = None
-    lower_invincible_type = None
-    
-    # Checking if upper has an invincible token
-    if lower_thrown_num == 9:
-        if piece_dict["upper"]["r"] != [] and piece_dict["lower"]["p"] == []:
-            upper_invincible = True
-            upper_invincible_type = "r"
-        elif piece_dict["upper"]["p"] != [] and piece_dict["lower"]["s"] == []:
-            upper_invincible = True
-            upper_invincible_type = "p"
-        elif piece_dict["upper"]["s"] != [] and piece_dict["lower"]["r"] == []:
-            upper_invincible = True
-            upper_invincible_type = "s"
-        else:
-            upper_invincible = False
-            
-    # Checking if lower has an invincible token
-    if upper_thrown_num == 9:
-        if piece_dict["lower"]["r"] != [] and piece_dict["upper"]["p"] == []:
-            lower_invincible = True
-            lower_invincible_type = "r"
-        elif piece_dict["lower"]["p"] != [] and piece_dict["upper"]["s"] == []:
-            lower_invincible = True
-            lower_invincible_type = "p"
-        elif piece_dict["lower"]["s"] != [] and piece_dict["upper"]["r"] == []:
-            lower_invincible = True
-            lower_invincible_type = "s"
-        else:
-            lower_invincible = False
-    
-    return upper_invincible, lower_invincible, upper_invincible_type, lower_invincible_type
-    
+    # (upper_invincible, lower_invincible, upper_invincible_type, lower_invincible_type), see
+    # bitboard.invincibleTokens
+    return materialSummary(piece_dict, upper_thrown_num, lower_thrown_num).invincible
+
 
 def gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, turn_num, debug=False):
+    return materialGameEnded(materialSummary(piece_dict, upper_thrown_num, lower_thrown_num), turn_num, debug,
+                             piece_dict)
+
+def materialGameEnded(material, turn_num, debug=False, piece_dict=None):
+    # gameEnded from the position's material summary (piece_dict is only printed if debug is set)
     
     # UPPER_WINS = 1
     # LOWER_WINS = -1
     # DRAW = 2
     # NOT_ENDED = 0
+
+    upper_on_board = material.upper_on_board
+    lower_on_board = material.lower_on_board
+
+    upper_thrown_num = material.upper_thrown_num
+    lower_thrown_num = material.lower_thrown_num
+
+    upper_invincible, lower_invincible = material.invincible[:2]
     
     # Condition 1
-    if lower_thrown_num == 9 and (
-        piece_dict["lower"]["r"] == [] and piece_dict["lower"]["p"] == [] and piece_dict["lower"]["s"] == []):
+    if lower_thrown_num == 9 and lower_on_board == 0:
         
-        if upper_thrown_num < 9 or not (
-        piece_dict["upper"]["r"] == [] and piece_dict["upper"]["p"] == [] and piece_dict["upper"]["s"] == []):
+        if upper_thrown_num < 9 or upper_on_board:
             if debug: print("Condition 1: upper wins")
             if debug: print(piece_dict)
             return UPPER_WINS
@@ -418,11 +775,9 @@ def gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, turn_num, debug=Fa
             if debug: print("Condition 1: draw")
             if debug: print(piece_dict)
             return DRAW
-    elif upper_thrown_num == 9 and (
-        piece_dict["upper"]["r"] == [] and piece_dict["upper"]["p"] == [] and piece_dict["upper"]["s"] == []):
+    elif upper_thrown_num == 9 and upper_on_board == 0:
         
-        if lower_thrown_num < 9 or not (
-        piece_dict["lower"]["r"] == [] and piece_dict["lower"]["p"] == [] and piece_dict["lower"]["s"] == []):
+        if lower_thrown_num < 9 or lower_on_board:
             if debug: print("Condition 1: lower wins")
             if debug: print(piece_dict)
             return LOWER_WINS
@@ -432,19 +787,17 @@ def gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, turn_num, debug=Fa
             return DRAW
     
     # Condition 2
-    elif hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num)[:2] == (True, True):
+    elif upper_invincible and lower_invincible:
         if debug: print("Condition 2: draw")
         if debug: print(piece_dict)
         return DRAW
     
     # Condition 3
-    elif hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num)[:2] == (True, False) and (
-        len(piece_dict["lower"]["r"]) + len(piece_dict["lower"]["p"]) + len(piece_dict["lower"]["s"]) == 1):
+    elif upper_invincible and lower_on_board == 1:
         if debug: print("Condition 3: upper wins")
         if debug: print(piece_dict)
         return UPPER_WINS
-    elif hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num)[:2] == (False, True) and (
-        len(piece_dict["upper"]["r"]) + len(piece_dict["upper"]["p"]) + len(piece_dict["upper"]["s"]) == 1):
+    elif lower_invincible and upper_on_board == 1:
         if debug: print("Condition 3: lower wins")
         return LOWER_WINS
     
@@ -463,18 +816,18 @@ def gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, turn_num, debug=Fa
 
 
 def manhattanDistance(c0, c1):
-    dx = c1[0] - c0[0]
-    dy = c1[1] - c0[1]
-
-    if np.sign(dx) == np.sign(dy):
-        return abs(dx + dy)
-    else:
-        return max(abs(dx), abs(dy))
+    # Hex distance between two tiles on the board (precomputed, see geometry.py)
+    return HEX_DISTANCE[c0][c1]
 
 ###########################################################################################
 #                                        CLASSES                                          #
 
 class State_node:
+        __slots__ = ("team", "coord_dict", "piece_dict", "upper_thrown_num", "lower_thrown_num",
+                     "primary_move_list", "parent_secondary_node", "node_depth",
+                     "score", "search_depth", "zobrist_key", "transposed_state", "evaluation_summary", "material",
+                     "board")
+
         def __init__(self, team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, primary_move_list, 
                      parent_secondary_node, node_depth):
             
@@ -491,9 +844,35 @@ class State_node:
             self.parent_secondary_node = parent_secondary_node
             
             self.node_depth = node_depth
+
+            # Heuristic score, set when the state is scored as it is created (see buildStateTree)
+            self.score = None
+
+            # How many plies below this state buildStateTree searches, and the state's Zobrist key
+            # (only set when searching with a transposition table)
+            self.search_depth = 0
+            self.zobrist_key = None
+
+            # Earlier state of the same tree with the same position and search_depth, which this state
+            # isn't expanded in place of and takes its scores from (only set when searching with a
+            # transposition table, see buildChildState)
+            self.transposed_state = None
+
+            # Evaluation summary (see incremental_evaluation.py), children of a state with one get theirs
+            # from it as they are created
+            self.evaluation_summary = None
+
+            # Material summary (see materialSummary) of the state's board as it is created
+            self.material = materialSummary(piece_dict, upper_thrown_num, lower_thrown_num)
+
+            # Compact copy of the board (a BitBoard) kept by leaf states instead of coord_dict/piece_dict
+            # when the tree is built without a heuristic_function (see buildStateTree)
+            self.board = None
         
         
 class Primary_move_node:
+        __slots__ = ("move", "secondary_move_list", "parent_state", "score_sum", "average_score")
+
         def __init__(self, move, secondary_move_list, parent_state):
             
             self.move = move
@@ -513,6 +892,8 @@ class Primary_move_node:
         
         
 class Secondary_move_node:
+        __slots__ = ("move", "state_node", "parent_move")
+
         def __init__(self, move, state_node, parent_move):
             
             self.move = move
@@ -565,7 +946,29 @@ def getPossibleMoves(state_node, team, include_throws=True):
     return all_possible_moves
     
             
-def buildStateTree(state_node, desired_depth, pruning_function, turn_num):
+def buildStateTree(state_node, desired_depth, pruning_function, turn_num, heuristic_function=None,
+                   transposition_table=None, leaf_batch=None, root_moves=None, search_stats=None,
+                   expanded_states=None):
+
+    # The search walks the tree on state_node's board, applying and undoing each joint move in place,
+    # instead of allocating a new board for every child. Only leaf states keep anything of their board:
+    # if heuristic_function is given, leaves are scored as they are created and keep just their score,
+    # otherwise they keep a compact BitBoard copy for calculateMoveScores to evaluate.
+
+    # If transposition_table is given, states whose score is already in the table (searched at least
+    # as deep) are not expanded or evaluated again, see calculateMoveScores for how scores are stored.
+    # Interior scores are only stored once the tree is scored, so states already expanded in this tree
+    # are kept in expanded_states (Zobrist key -> state, made here if None) and a state with the same
+    # position and search depth isn't expanded again either, it takes its scores from the first one
+    # (see transposed_state).
+
+    # If leaf_batch (a LeafBatch, see batch_evaluation.py) is given, leaves are added to it instead of
+    # being scored, leaf_batch.evaluate() then scores them all at once before calculateMoveScores.
+
+    # If root_moves (moves_upper, moves_lower) is given it is used for state_node's moves instead of
+    # pruning_function(state_node), e.g. to search only some of the root's primary moves.
+
+    # If search_stats (a SearchStats, see search_stats.py) is given, the search's statistics are added to it.
     
     team = state_node.team
     coord_dict = state_node.coord_dict
@@ -573,88 +976,322 @@ def buildStateTree(state_node, desired_depth, pruning_function, turn_num):
     upper_thrown_num = state_node.upper_thrown_num
     lower_thrown_num = state_node.lower_thrown_num
     parent_depth = state_node.node_depth
+
+    state_node.search_depth = desired_depth - parent_depth
+
+    if transposition_table is not None:
+        if state_node.zobrist_key is None:
+            state_node.zobrist_key = zobristKey(team, coord_dict, upper_thrown_num, lower_thrown_num)
+
+        if expanded_states is None:
+            expanded_states = {}
     
-    
-    #all_possible_moves_upper, all_possible_moves_lower = getPossibleMoves(state_node)
-    
+    if search_stats is not None:
+        pruning_start = time.perf_counter()
+
     # Do pruning
-    #moves_upper, moves_lower = pruning_function(state_node, all_possible_moves_upper, all_possible_moves_lower)
-    
-    moves_upper, moves_lower = pruning_function(state_node)
+    if root_moves is None:
+        moves_upper, moves_lower = pruning_function(state_node)
+    else:
+        moves_upper, moves_lower = root_moves
+
+    # Primary moves are the moves of state_node's team, secondary moves are the opponent's
+    if team == "upper":
+        primary_moves, secondary_moves = moves_upper, moves_lower
+    else:
+        primary_moves, secondary_moves = moves_lower, moves_upper
+
+    if search_stats is not None:
+        search_stats.pruning_time += time.perf_counter() - pruning_start
+        search_stats.addExpansion(len(primary_moves), len(secondary_moves))
     
-    if team == "lower":
-        for lower_move in moves_lower:
-            
-            secondary_move_list = []                                                    
-            new_primary_move_node = Primary_move_node(lower_move, secondary_move_list, state_node)
-            
+    for primary_move in primary_moves:
+
+        secondary_move_list = []
+        new_primary_move_node = Primary_move_node(primary_move, secondary_move_list, state_node)
+
+        state_node.primary_move_list.append(new_primary_move_node)
+
+        for secondary_move in secondary_moves:
+
+            if team == "upper":
+                upper_move, lower_move = primary_move, secondary_move
+            else:
+                upper_move, lower_move = secondary_move, primary_move
+
+            if search_stats is not None:
+                resolve_start = time.perf_counter()
+
+            # Apply the moves to this state's board in place, undone once the child is finished with
+            new_upper_thrown_num, new_lower_thrown_num, undo_record = apply_joint_move(
+                upper_move, lower_move, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num)
+
+            if search_stats is not None:
+                search_stats.resolve_time += time.perf_counter() - resolve_start
+
+            new_secondary_move_node = Secondary_move_node(secondary_move, None, new_primary_move_node)
+
+            new_primary_move_node.secondary_move_list.append(new_secondary_move_node)
+
+            # Create new state node
+
+            #Calculating new node depth
+
+            new_node_depth = parent_depth + 1
+
+            new_turn_num = turn_num + 1
+
+            new_state_node = buildChildState(
+                team, coord_dict, piece_dict, new_upper_thrown_num, new_lower_thrown_num, undo_record,
+                new_secondary_move_node, new_node_depth, desired_depth, pruning_function, new_turn_num,
+                heuristic_function, transposition_table, leaf_batch, search_stats, expanded_states)
+
+            new_secondary_move_node.state_node = new_state_node
+
+            if search_stats is not None:
+                resolve_start = time.perf_counter()
+
+            undo_joint_move(undo_record, coord_dict, piece_dict)
+
+            if search_stats is not None:
+                search_stats.resolve_time += time.perf_counter() - resolve_start
+
+
+def buildChildState(team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, undo_record,
+                    parent_secondary_node, node_depth, desired_depth, pruning_function, turn_num,
+                    heuristic_function, transposition_table, leaf_batch, search_stats=None, expanded_states=None):
+    # Create (and expand, unless it is a leaf) the state node for the board in coord_dict/piece_dict,
+    # which buildStateTree has just applied a joint move to in place (undo_record is from that move).
+    # expanded_states is as for buildStateTree, and must be given with a transposition_table
+
+    new_state_node = State_node(
+        team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num,
+        [], parent_secondary_node, node_depth)
+
+    if search_stats is not None:
+        # Every state of the tree is kept, so states are never released
+        search_stats.addState()
+
+    new_state_node.search_depth = desired_depth - node_depth
+
+    parent_state = parent_secondary_node.parent_move.parent_state
+
+    if parent_state.evaluation_summary is not None:
+        new_state_node.evaluation_summary = updateEvaluationSummary(
+            parent_state.evaluation_summary, undo_record, coord_dict, piece_dict)
+
+    if transposition_table is not None:
+        parent_key = parent_state.zobrist_key
+
+        new_state_node.zobrist_key = updateZobristKey(
+            parent_key, undo_record, coord_dict, upper_thrown_num, lower_thrown_num)
+
+        # Already scored somewhere else, no need to expand or evaluate this state
+        new_state_node.score = transposition_table.probe(new_state_node.zobrist_key, new_state_node.search_depth)
+
+        if new_state_node.score is None and node_depth < desired_depth:
+            # Or already expanded in this tree, and scored before this state by calculateMoveScores
+            expanded_state = expanded_states.get(new_state_node.zobrist_key)
+
+            if expanded_state is not None and expanded_state.search_depth == new_state_node.search_depth:
+                new_state_node.transposed_state = expanded_state
+
+        if search_stats is not None and (new_state_node.score is not None
+                                         or new_state_node.transposed_state is not None):
+            search_stats.transposition_hits += 1
+
+    if new_state_node.score is None and new_state_node.transposed_state is None and node_depth < desired_depth:
+        # Check to see if game has ended (if so don't expand)
+        if not materialGameEnded(new_state_node.material, node_depth):
+            buildStateTree(new_state_node, desired_depth, pruning_function=pruning_function, turn_num=turn_num,
+                           heuristic_function=heuristic_function, transposition_table=transposition_table,
+                           leaf_batch=leaf_batch, search_stats=search_stats, expanded_states=expanded_states)
+
+            if transposition_table is not None:
+                expanded_states[new_state_node.zobrist_key] = new_state_node
+        elif search_stats is not None:
+            search_stats.game_ended_cutoffs += 1
+
+    if (new_state_node.score is None and new_state_node.transposed_state is None
+            and new_state_node.primary_move_list == []):
+        # This is a leaf state
+
+        if leaf_batch is not None:
+            # Snapshot it while its board is still applied, scored by leaf_batch.evaluate()
+            leaf_batch.add(new_state_node)
+
+        elif heuristic_function is not None:
+            # Score it while its board is still applied
+            if search_stats is not None:
+                evaluation_start = time.perf_counter()
+
+            new_state_node.score = heuristic_function(new_state_node)
+
+            if search_stats is not None:
+                search_stats.evaluation_time += time.perf_counter() - evaluation_start
+                search_stats.leaves_evaluated += 1
+
+            if transposition_table is not None:
+                transposition_table.store(new_state_node.zobrist_key, new_state_node.search_depth,
+                                          new_state_node.score)
+        else:
+            new_state_node.board = fromBoardDicts(coord_dict, upper_thrown_num, lower_thrown_num)
+
+    # The board is shared with the parent and about to be undone
+    new_state_node.coord_dict = None
+    new_state_node.piece_dict = None
+
+    return new_state_node
+
+
+def descendStateTree(state_node, primary_move, secondary_move):
+    # The state below state_node (the root of a tree built by buildStateTree) reached by primary_move
+    # (state_node's team's move) and secondary_move, made the root of its own tree so the next search can
+    # extend it (see extendStateTree). None if that joint move wasn't searched or its state wasn't expanded
+
+    for primary_move_node in state_node.primary_move_list:
+        if primary_move_node.move != primary_move:
+            continue
+
+        for secondary_move_node in primary_move_node.secondary_move_list:
+            if secondary_move_node.move != secondary_move:
+                continue
+
+            child_state = secondary_move_node.state_node
+            if child_state.primary_move_list == []:
+                return None
+
+            child_state.parent_secondary_node = None
+            shiftNodeDepths(child_state, -child_state.node_depth)
+
+            return child_state
+
+    return None
+
+
+def shiftNodeDepths(state_node, shift):
+    # Add shift to the node_depth of every state in the tree below state_node (and its own)
+
+    state_node.node_depth += shift
+
+    for primary_move_node in state_node.primary_move_list:
+        for secondary_move_node in primary_move_node.secondary_move_list:
+            shiftNodeDepths(secondary_move_node.state_node, shift)
+
+
+def extendStateTree(state_node, desired_depth, pruning_function, turn_num, heuristic_function=None,
+                    transposition_table=None, leaf_batch=None, search_stats=None, expanded_states=None):
+
+    # Grow a tree built by an earlier buildStateTree (e.g. one from descendStateTree) so it is as
+    # buildStateTree(state_node, desired_depth, ...) would build it, ready for calculateMoveScores.
+    # States that were expanded keep their moves and are not pruned again, the leaves below them are
+    # built again with buildChildState, so they are expanded to desired_depth or scored as before.
+    # state_node's board must be in its coord_dict/piece_dict, the arguments are as for buildStateTree
+
+    team = state_node.team
+    coord_dict = state_node.coord_dict
+    piece_dict = state_node.piece_dict
+    upper_thrown_num = state_node.upper_thrown_num
+    lower_thrown_num = state_node.lower_thrown_num
+
+    state_node.search_depth = desired_depth - state_node.node_depth
+
+    if transposition_table is not None:
+        if state_node.zobrist_key is None:
+            state_node.zobrist_key = zobristKey(team, coord_dict, upper_thrown_num, lower_thrown_num)
+
+        if expanded_states is None:
+            expanded_states = {}
+
+    for primary_move_node in state_node.primary_move_list:
+
+        # Summed again by calculateMoveScores
+        primary_move_node.score_sum = 0
+
+        for secondary_move_node in primary_move_node.secondary_move_list:
+
+            if team == "upper":
+                upper_move, lower_move = primary_move_node.move, secondary_move_node.move
+            else:
+                upper_move, lower_move = secondary_move_node.move, primary_move_node.move
+
+            new_upper_thrown_num, new_lower_thrown_num, undo_record = apply_joint_move(
+                upper_move, lower_move, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num)
+
+            child_state = secondary_move_node.state_node
+
+            if child_state.primary_move_list != []:
+                child_state.coord_dict = coord_dict
+                child_state.piece_dict = piece_dict
+
+                extendStateTree(child_state, desired_depth, pruning_function, turn_num + 1, heuristic_function,
+                                transposition_table, leaf_batch, search_stats, expanded_states)
+
+                child_state.coord_dict = None
+                child_state.piece_dict = None
+
+                if transposition_table is not None:
+                    expanded_states.setdefault(child_state.zobrist_key, child_state)
+            else:
+                secondary_move_node.state_node = buildChildState(
+                    team, coord_dict, piece_dict, new_upper_thrown_num, new_lower_thrown_num, undo_record,
+                    secondary_move_node, child_state.node_depth, desired_depth, pruning_function, turn_num + 1,
+                    heuristic_function, transposition_table, leaf_batch, search_stats, expanded_states)
+
+            undo_joint_move(undo_record, coord_dict, piece_dict)
+
 
-            state_node.primary_move_list.append(new_primary_move_node)
-            
-            for upper_move in moves_upper:
-                
-                new_coord_dict, new_piece_dict, new_upper_thrown_num, new_lower_thrown_num = resolveMoves(
-                    upper_move, lower_move, coord_dict, upper_thrown_num, lower_thrown_num)
-                
-                new_secondary_move_node = Secondary_move_node(upper_move, None, new_primary_move_node)
-                
-                new_primary_move_node.secondary_move_list.append(new_secondary_move_node)
-                
-                # Create new state node
-                
-                #Calculating new node depth
-                
-                new_node_depth = parent_depth + 1
-                
-                new_turn_num = turn_num + 1
-                
-                new_state_node = State_node(
-                    team, new_coord_dict, new_piece_dict, new_upper_thrown_num, new_lower_thrown_num, 
-                    [], new_secondary_move_node, new_node_depth)
-    
-                new_secondary_move_node.state_node = new_state_node
-        
-                if new_node_depth < desired_depth:
-                    # Check to see if game has ended (if so don't expand)
-                    if not gameEnded(new_piece_dict, new_upper_thrown_num, new_lower_thrown_num, new_node_depth):
-                        buildStateTree(new_state_node, desired_depth, pruning_function=pruning_function, turn_num=new_turn_num)
-    # team is upper                      
-    else:
-        for upper_move in moves_upper:
-            
-            secondary_move_list = []                                                       
-            new_primary_move_node = Primary_move_node(upper_move, secondary_move_list, state_node)
-            
+def stateScore(state_node):
+    # Score of an expanded state once calculateMoveScores has run, the average of its primary moves'
+    # average scores
+    return sum(primary_move_node.average_score for primary_move_node in state_node.primary_move_list) / len(
+        state_node.primary_move_list)
+
+
+class PonderStopped(Exception):
+    pass
+
+
+def ponderSearch(state_node, turn_num, transposition_table, evaluation_cache, heuristic_function, stop_event,
+                 tablebase=None):
+    # The search Player.action would do from state_node (a state of the kept tree below the root, with its
+    # board in its coord_dict/piece_dict), made the root of its own tree, extended to depth 2 and scored.
+    # Gives up as soon as it sees stop_event set, between expansions, and returns whether it finished
+
+    def pruningFunction(pruned_state_node):
+        if stop_event.is_set():
+            raise PonderStopped()
+        return test_pruning_three(pruned_state_node)
+
+    state_node.parent_secondary_node = None
+    shiftNodeDepths(state_node, -state_node.node_depth)
+
+    leaf_batch = LeafBatch(evaluation_cache, tablebase)
+
+    try:
+        extendStateTree(state_node, desired_depth=2, pruning_function=pruningFunction, turn_num=turn_num,
+                        transposition_table=transposition_table, leaf_batch=leaf_batch)
+    except PonderStopped:
+        return False
+
+    if stop_event.is_set():
+        return False
+
+    leaf_batch.evaluate(transposition_table)
+
+    if stop_event.is_set():
+        return False
+
+    calculateMoveScores(state_node, heuristic_function=heuristic_function, transposition_table=transposition_table)
+
+    return True
+
+
+def loadLeafBoard(state_node):
+    # Give a leaf state built without a heuristic_function its coord_dict and piece_dict back
+    if state_node.coord_dict is None and state_node.board is not None:
+        state_node.coord_dict, state_node.piece_dict = toBoardDicts(state_node.board)[:2]
 
-            state_node.primary_move_list.append(new_primary_move_node)
-            
-            for lower_move in moves_lower:
-                
-                new_coord_dict, new_piece_dict, new_upper_thrown_num, new_lower_thrown_num = resolveMoves(
-                    upper_move, lower_move, coord_dict, upper_thrown_num, lower_thrown_num)
-                
-                new_secondary_move_node = Secondary_move_node(lower_move, None, new_primary_move_node)
-                
-                new_primary_move_node.secondary_move_list.append(new_secondary_move_node)
-                
-                # Create new state node
-                
-                #Calculating new node depth
-                
-                new_node_depth = parent_depth + 1
-                
-                new_turn_num = turn_num + 1
-                
-                new_state_node = State_node(
-                    team, new_coord_dict, new_piece_dict, new_upper_thrown_num, new_lower_thrown_num, 
-                    [], new_secondary_move_node, new_node_depth)
-    
-                new_secondary_move_node.state_node = new_state_node
-        
-                if new_node_depth < desired_depth:
-                    # Check to see if game has ended (if so don't expand)
-                    if not gameEnded(new_piece_dict, new_upper_thrown_num, new_lower_thrown_num, new_node_depth):
-                        buildStateTree(new_state_node, desired_depth, pruning_function=pruning_function, turn_num=new_turn_num)
 
 def getLeafStates(state_node):
     
@@ -670,7 +1307,7 @@ def getLeafStates(state_node):
             
     return leaf_nodes
 
-def calculateMoveScores(state_node, heuristic_function):
+def calculateMoveScores(state_node, heuristic_function, transposition_table=None, search_stats=None):
     # When this has been called, the tree has been built to the specified depth
     # Need to go down to the leaf primary_move_nodes, then look at each state_node below them,
     # if the state_node has no primary_move_nodes in its primary_move_list, then it is a
@@ -679,23 +1316,60 @@ def calculateMoveScores(state_node, heuristic_function):
     
     # If the state_node below is not a leaf node, then call calculateMoveScores with that
     # state_node as input
+
+    # If transposition_table is given, the score of every state (the heuristic value for a leaf,
+    # the average of its primary moves' average scores otherwise) is stored in it. If search_stats is
+    # given, the leaves evaluated here are added to it
+
+    if state_node.transposed_state is not None:
+        # Not expanded, the same state earlier in the tree has been scored already and its moves' scores
+        # are added to the parent as this state's would have been
+        transposed_state = state_node.transposed_state
+
+        for primary_move in transposed_state.primary_move_list:
+            state_node.parent_secondary_node.parent_move.score_sum += primary_move.average_score / len(transposed_state.primary_move_list)
+
+        return
     
     if state_node.primary_move_list == []:
         # This state is a leaf state
         
-        heuristic_value = heuristic_function(state_node)
+        if state_node.score is not None:
+            # Already scored when the tree was built (or found in the transposition table)
+            heuristic_value = state_node.score
+        else:
+            loadLeafBoard(state_node)
+
+            if search_stats is not None:
+                evaluation_start = time.perf_counter()
+
+            heuristic_value = heuristic_function(state_node)
+
+            if search_stats is not None:
+                search_stats.evaluation_time += time.perf_counter() - evaluation_start
+                search_stats.leaves_evaluated += 1
+
+            if state_node.board is not None:
+                # Only needed the board for the heuristic, keep the compact copy
+                state_node.coord_dict = None
+                state_node.piece_dict = None
+
+            if transposition_table is not None:
+                transposition_table.store(state_node.zobrist_key, state_node.search_depth, heuristic_value)
         
         # Add this heuristic value to the parent primary_mode_node
         
         state_node.parent_secondary_node.parent_move.score_sum += heuristic_value
         
     else:
+
+        state_score = 0
         
         for primary_move in state_node.primary_move_list:
             
             for secondary_move in primary_move.secondary_move_list:
                 
-                calculateMoveScores(secondary_move.state_node, heuristic_function)
+                calculateMoveScores(secondary_move.state_node, heuristic_function, transposition_table, search_stats)
                 
             # All heuristic values now calculated for current primary_move
             # Can now calculate the average for this primary_move and then add it
@@ -704,10 +1378,532 @@ def calculateMoveScores(state_node, heuristic_function):
 
             
             primary_move.average_score = primary_move.score_sum / len(primary_move.secondary_move_list)
+
+            state_score += primary_move.average_score / len(state_node.primary_move_list)
             
             if state_node.parent_secondary_node != None:
                 state_node.parent_secondary_node.parent_move.score_sum += primary_move.average_score / len(state_node.primary_move_list)
 
+        if transposition_table is not None:
+            transposition_table.store(state_node.zobrist_key, state_node.search_depth, state_score)
+
+
+def streamingSearch(state_node, desired_depth, pruning_function, heuristic_function, turn_num,
+                    transposition_table=None, deadline=None, search_stats=None):
+    # Depth-first alternative to buildStateTree + calculateMoveScores. Each child is expanded, scored
+    # and discarded before the next one, so only the states on the current path are kept in memory
+    # rather than the whole tree.
+
+    # Afterwards state_node.primary_move_list holds a Primary_move_node for each of state_node's moves,
+    # with the same average_score calculateMoveScores would give it (secondary moves are not kept),
+    # ready for getBestMove. Returns the score of state_node.
+
+    # If deadline (a time.monotonic() time) is given, SearchTimeout is raised once it has passed.
+    # state_node's board is left as it was, and its primary_move_list holds the primary moves that
+    # were fully searched before the deadline. search_stats works as in buildStateTree.
+
+    return streamStateScore(state_node, desired_depth, pruning_function, heuristic_function, turn_num,
+                            transposition_table, deadline, search_stats, keep_primary_moves=True)
+
+
+def streamStateScore(state_node, desired_depth, pruning_function, heuristic_function, turn_num,
+                     transposition_table, deadline=None, search_stats=None, keep_primary_moves=False,
+                     move_scores=None):
+    # Score of state_node searched to desired_depth, see streamingSearch. If move_scores (a list) is
+    # given, each primary move's share of the score (its average_score over the number of primary
+    # moves) is appended to it, so the state above can add them one at a time as calculateMoveScores does
+
+    team = state_node.team
+    coord_dict = state_node.coord_dict
+    piece_dict = state_node.piece_dict
+    upper_thrown_num = state_node.upper_thrown_num
+    lower_thrown_num = state_node.lower_thrown_num
+    new_node_depth = state_node.node_depth + 1
+
+    state_node.search_depth = desired_depth - state_node.node_depth
+
+    if transposition_table is not None and state_node.zobrist_key is None:
+        state_node.zobrist_key = zobristKey(team, coord_dict, upper_thrown_num, lower_thrown_num)
+
+    if search_stats is not None:
+        pruning_start = time.perf_counter()
+
+    moves_upper, moves_lower = pruning_function(state_node)
+
+    # Primary moves are the moves of state_node's team, secondary moves are the opponent's
+    if team == "upper":
+        primary_moves, secondary_moves = moves_upper, moves_lower
+    else:
+        primary_moves, secondary_moves = moves_lower, moves_upper
+
+    if search_stats is not None:
+        search_stats.pruning_time += time.perf_counter() - pruning_start
+        search_stats.addExpansion(len(primary_moves), len(secondary_moves))
+
+    state_score = 0
+
+    for primary_move in primary_moves:
+
+        score_sum = 0
+
+        for secondary_move in secondary_moves:
+
+            if deadline is not None and time.monotonic() >= deadline:
+                raise SearchTimeout()
+
+            if team == "upper":
+                upper_move, lower_move = primary_move, secondary_move
+            else:
+                upper_move, lower_move = secondary_move, primary_move
+
+            if search_stats is not None:
+                resolve_start = time.perf_counter()
+
+            new_upper_thrown_num, new_lower_thrown_num, undo_record = apply_joint_move(
+                upper_move, lower_move, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num)
+
+            if search_stats is not None:
+                search_stats.resolve_time += time.perf_counter() - resolve_start
+
+            child_state = State_node(team, coord_dict, piece_dict, new_upper_thrown_num, new_lower_thrown_num,
+                                     [], None, new_node_depth)
+
+            if search_stats is not None:
+                search_stats.addState()
+
+            child_state.search_depth = desired_depth - new_node_depth
+
+            if state_node.evaluation_summary is not None:
+                child_state.evaluation_summary = updateEvaluationSummary(
+                    state_node.evaluation_summary, undo_record, coord_dict, piece_dict)
+
+            child_score = None
+
+            # Primary move shares of the child's score, if it is expanded
+            child_move_scores = None
+
+            if transposition_table is not None:
+                child_state.zobrist_key = updateZobristKey(
+                    state_node.zobrist_key, undo_record, coord_dict, new_upper_thrown_num, new_lower_thrown_num)
+
+                child_score = transposition_table.probe(child_state.zobrist_key, child_state.search_depth)
+
+                if search_stats is not None and child_score is not None:
+                    search_stats.transposition_hits += 1
+
+            if child_score is None:
+
+                # Expand unless at the desired depth or the game has ended, otherwise this is a leaf
+                if new_node_depth < desired_depth and not materialGameEnded(
+                        child_state.material, new_node_depth):
+
+                    child_move_scores = []
+
+                    try:
+                        child_score = streamStateScore(child_state, desired_depth, pruning_function,
+                                                       heuristic_function, turn_num + 1, transposition_table,
+                                                       deadline, search_stats, move_scores=child_move_scores)
+                    except SearchTimeout:
+                        # Put the board back before passing the timeout up
+                        undo_joint_move(undo_record, coord_dict, piece_dict)
+                        raise
+                else:
+                    if search_stats is not None:
+                        if new_node_depth < desired_depth:
+                            search_stats.game_ended_cutoffs += 1
+                        evaluation_start = time.perf_counter()
+
+                    child_score = heuristic_function(child_state)
+
+                    if search_stats is not None:
+                        search_stats.evaluation_time += time.perf_counter() - evaluation_start
+                        search_stats.leaves_evaluated += 1
+
+                    if transposition_table is not None:
+                        transposition_table.store(child_state.zobrist_key, child_state.search_depth, child_score)
+
+            if search_stats is not None:
+                resolve_start = time.perf_counter()
+
+            undo_joint_move(undo_record, coord_dict, piece_dict)
+
+            if search_stats is not None:
+                search_stats.resolve_time += time.perf_counter() - resolve_start
+                search_stats.releaseState()
+
+            # Summed in the same order as calculateMoveScores, so both give the same floats
+            if child_move_scores is None:
+                score_sum += child_score
+            else:
+                for move_score in child_move_scores:
+                    score_sum += move_score
+
+        average_score = score_sum / len(secondary_moves)
+
+        state_score += average_score / len(primary_moves)
+
+        if move_scores is not None:
+            move_scores.append(average_score / len(primary_moves))
+
+        if keep_primary_moves:
+            primary_move_node = Primary_move_node(primary_move, [], state_node)
+            primary_move_node.score_sum = score_sum
+            primary_move_node.average_score = average_score
+
+            state_node.primary_move_list.append(primary_move_node)
+
+    if transposition_table is not None:
+        transposition_table.store(state_node.zobrist_key, state_node.search_depth, state_score)
+
+    return state_score
+
+
+def smabSearch(state_node, desired_depth, pruning_function, heuristic_function, turn_num,
+               transposition_table=None, deadline=None, search_stats=None):
+    # Simultaneous-move alternative to streamingSearch. Each state's pruned moves form a matrix game
+    # (rows are state_node's team's moves, columns the opponent's) and instead of averaging every cell,
+    # a state is worth the value of its best row, where a row is worth its worst cell for us (the
+    # pessimistic value of the matrix, as if we had to commit to our move first).
+
+    # That value is found with alpha-beta bounds: a row is abandoned as soon as one of its cells is no
+    # better than the best row found so far, and a state stops once a row reaches what the state above
+    # it could accept. Skipped cells are never resolved, so far fewer joint moves are applied than by
+    # streamingSearch at the same depth. Heuristic scores are from state_node's team's point of view,
+    # so the opponent is taken to be minimising them.
+
+    # Afterwards state_node.primary_move_list holds a Primary_move_node for each of state_node's moves.
+    # The average_score of a fully searched row is its value, an abandoned row (whose value is at most
+    # the best row's) gets -math.inf. Only exact values are stored in transposition_table, so it must
+    # not be shared with streamingSearch or calculateMoveScores. deadline and search_stats work as in
+    # streamingSearch.
+
+    return smabStateScore(state_node, desired_depth, pruning_function, heuristic_function, turn_num,
+                          transposition_table, deadline, search_stats, -math.inf, math.inf,
+                          keep_primary_moves=True)
+
+
+def smabStateScore(state_node, desired_depth, pruning_function, heuristic_function, turn_num,
+                   transposition_table, deadline, search_stats, alpha, beta, keep_primary_moves=False):
+    # Pessimistic value of state_node searched to desired_depth, exact if it is between alpha and beta,
+    # otherwise only a bound on the side it fell out of the window (see smabSearch)
+
+    team = state_node.team
+    coord_dict = state_node.coord_dict
+    piece_dict = state_node.piece_dict
+    upper_thrown_num = state_node.upper_thrown_num
+    lower_thrown_num = state_node.lower_thrown_num
+    new_node_depth = state_node.node_depth + 1
+
+    state_node.search_depth = desired_depth - state_node.node_depth
+
+    if transposition_table is not None and state_node.zobrist_key is None:
+        state_node.zobrist_key = zobristKey(team, coord_dict, upper_thrown_num, lower_thrown_num)
+
+    if search_stats is not None:
+        pruning_start = time.perf_counter()
+
+    moves_upper, moves_lower = pruning_function(state_node)
+
+    if team == "upper":
+        primary_moves, secondary_moves = moves_upper, moves_lower
+    else:
+        primary_moves, secondary_moves = moves_lower, moves_upper
+
+    if search_stats is not None:
+        search_stats.pruning_time += time.perf_counter() - pruning_start
+        search_stats.addExpansion(len(primary_moves), len(secondary_moves))
+
+    best_score = -math.inf
+
+    for primary_move in primary_moves:
+
+        # Value of this row so far (its worst cell), rows no better than best_score don't matter
+        row_score = math.inf
+        row_alpha = max(alpha, best_score)
+
+        for secondary_move in secondary_moves:
+
+            if deadline is not None and time.monotonic() >= deadline:
+                raise SearchTimeout()
+
+            if team == "upper":
+                upper_move, lower_move = primary_move, secondary_move
+            else:
+                upper_move, lower_move = secondary_move, primary_move
+
+            if search_stats is not None:
+                resolve_start = time.perf_counter()
+
+            new_upper_thrown_num, new_lower_thrown_num, undo_record = apply_joint_move(
+                upper_move, lower_move, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num)
+
+            if search_stats is not None:
+                search_stats.resolve_time += time.perf_counter() - resolve_start
+
+            child_state = State_node(team, coord_dict, piece_dict, new_upper_thrown_num, new_lower_thrown_num,
+                                     [], None, new_node_depth)
+
+            if search_stats is not None:
+                search_stats.addState()
+
+            child_state.search_depth = desired_depth - new_node_depth
+
+            if state_node.evaluation_summary is not None:
+                child_state.evaluation_summary = updateEvaluationSummary(
+                    state_node.evaluation_summary, undo_record, coord_dict, piece_dict)
+
+            child_score = None
+
+            if transposition_table is not None:
+                child_state.zobrist_key = updateZobristKey(
+                    state_node.zobrist_key, undo_record, coord_dict, new_upper_thrown_num, new_lower_thrown_num)
+
+                child_score = transposition_table.probe(child_state.zobrist_key, child_state.search_depth)
+
+                if search_stats is not None and child_score is not None:
+                    search_stats.transposition_hits += 1
+
+            if child_score is None:
+
+                if new_node_depth < desired_depth and not materialGameEnded(
+                        child_state.material, new_node_depth):
+
+                    # Only values between row_alpha and row_score can change this row
+                    try:
+                        child_score = smabStateScore(child_state, desired_depth, pruning_function,
+                                                     heuristic_function, turn_num + 1, transposition_table,
+                                                     deadline, search_stats, row_alpha, row_score)
+                    except SearchTimeout:
+                        undo_joint_move(undo_record, coord_dict, piece_dict)
+                        raise
+                else:
+                    if search_stats is not None:
+                        if new_node_depth < desired_depth:
+                            search_stats.game_ended_cutoffs += 1
+                        evaluation_start = time.perf_counter()
+
+                    child_score = heuristic_function(child_state)
+
+                    if search_stats is not None:
+                        search_stats.evaluation_time += time.perf_counter() - evaluation_start
+                        search_stats.leaves_evaluated += 1
+
+                    if transposition_table is not None:
+                        transposition_table.store(child_state.zobrist_key, child_state.search_depth, child_score)
+
+            if search_stats is not None:
+                resolve_start = time.perf_counter()
+
+            undo_joint_move(undo_record, coord_dict, piece_dict)
+
+            if search_stats is not None:
+                search_stats.resolve_time += time.perf_counter() - resolve_start
+                search_stats.releaseState()
+
+            if child_score < row_score:
+                row_score = child_score
+
+                if row_score <= row_alpha:
+                    # The rest of the row can only lower it further, it can't be the best row
+                    break
+
+        if keep_primary_moves:
+            primary_move_node = Primary_move_node(primary_move, [], state_node)
+            primary_move_node.average_score = row_score if row_score > row_alpha else -math.inf
+
+            state_node.primary_move_list.append(primary_move_node)
+
+        if row_score > best_score:
+            best_score = row_score
+
+            if best_score >= beta:
+                # The state above already has a better option than this state
+                break
+
+    if transposition_table is not None and alpha < best_score < beta:
+        transposition_table.store(state_node.zobrist_key, state_node.search_depth, best_score)
+
+    return best_score
+
+
+class SearchTimeout(Exception):
+    # Raised by streamingSearch when its deadline has passed
+    pass
+
+
+def iterativeDeepeningSearch(state_node, pruning_function, heuristic_function, turn_num, time_budget,
+                             max_depth=MAX_SEARCH_DEPTH, transposition_table=None, search_function=None,
+                             search_stats=None):
+    # Anytime search: search_function (streamingSearch if None, or smabSearch) to depth 1, 2, ... until
+    # time_budget seconds have passed (or max_depth is done), checking the deadline between every pair
+    # of joint moves.
+
+    # Returns (move, depth) where move is the best move of the deepest completed search and depth is
+    # that search's depth. If not even depth 1 finished, the best of the primary moves it did finish
+    # is returned with a depth of 0, or the first move of pruning_function if it finished none.
+
+    if search_function is None:
+        search_function = streamingSearch
+
+    deadline = time.monotonic() + time_budget
+
+    best_move = None
+    completed_depth = 0
+
+    for desired_depth in range(1, max_depth + 1):
+
+        search_root = State_node(state_node.team, state_node.coord_dict, state_node.piece_dict,
+                                 state_node.upper_thrown_num, state_node.lower_thrown_num, [], None,
+                                 state_node.node_depth)
+        search_root.evaluation_summary = state_node.evaluation_summary
+
+        try:
+            search_function(search_root, desired_depth + state_node.node_depth, pruning_function,
+                            heuristic_function, turn_num, transposition_table, deadline, search_stats)
+        except SearchTimeout:
+            if best_move is None and search_root.primary_move_list:
+                # Partial result of the current depth
+                best_move = getBestMove(search_root)
+            break
+
+        best_move = getBestMove(search_root)
+        completed_depth = desired_depth
+
+    if best_move is None:
+        moves_upper, moves_lower = pruning_function(state_node)
+        best_move = moves_upper[0] if state_node.team == "upper" else moves_lower[0]
+
+    return best_move, completed_depth
+
+
+# Search functions Player can choose between (see Player.__init__)
+SEARCH_ENGINES = {"average": streamingSearch, "smab": smabSearch}
+
+
+# Transposition table of a parallel search worker process
+_worker_transposition_table = None
+
+# Tablebases a parallel search worker process has opened, by path (kept open until the process exits)
+_worker_tablebases = {}
+
+
+def _initSearchWorker():
+    global _worker_transposition_table
+    _worker_transposition_table = TranspositionTable()
+
+
+def _warmUpSearchWorker():
+    # Trivial task, makes the pool start a worker process (and import this module in it) before searching
+    return None
+
+
+def createSearchPool(workers):
+    # ProcessPoolExecutor for parallelRootSearch with all of its worker processes already started
+
+    process_pool = ProcessPoolExecutor(max_workers=workers, initializer=_initSearchWorker)
+
+    for future in [process_pool.submit(_warmUpSearchWorker) for _ in range(workers)]:
+        future.result()
+
+    return process_pool
+
+
+def _searchPrimaryMove(board, team, turn_num, primary_move, secondary_moves, desired_depth, pruning_function,
+                       heuristic_function, seed, tablebase_path=None):
+    # Worker side of parallelRootSearch: build and score the subtree of one of the root's primary moves.
+    # board is the root's BitBoard as a plain tuple, returns the primary move's (score_sum, average_score)
+    # and the number of joint moves applied. The worker's random choices are seeded with seed
+
+    nodes_before = search_context.joint_moves_applied
+
+    random.seed(seed)
+
+    tablebase = None
+    if tablebase_path is not None:
+        if tablebase_path not in _worker_tablebases:
+            _worker_tablebases[tablebase_path] = loadTablebase(tablebase_path)
+        tablebase = _worker_tablebases[tablebase_path]
+
+        if heuristic_function is not None:
+            heuristic_function = tablebaseHeuristic(tablebase, heuristic_function)
+
+    coord_dict, piece_dict, upper_thrown_num, lower_thrown_num = toBoardDicts(BitBoard(*board))
+
+    root_state = State_node(team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, [], None, 0)
+
+    root_moves = ([primary_move], secondary_moves) if team == "upper" else (secondary_moves, [primary_move])
+
+    # Cleared for every primary move, so its score doesn't depend on which moves this worker searched before
+    _worker_transposition_table.clear()
+
+    # Leaves are scored as they are created by heuristic_function, or all at once afterwards
+    leaf_batch = LeafBatch(tablebase=tablebase) if heuristic_function is None else None
+
+    buildStateTree(root_state, desired_depth, pruning_function=pruning_function, turn_num=turn_num,
+                   heuristic_function=heuristic_function, transposition_table=_worker_transposition_table,
+                   leaf_batch=leaf_batch, root_moves=root_moves)
+
+    if leaf_batch is not None:
+        leaf_batch.evaluate(_worker_transposition_table)
+
+    # Score the children rather than root_state, so the root's partial score isn't stored in the table
+    primary_move_node = root_state.primary_move_list[0]
+
+    for secondary_move in primary_move_node.secondary_move_list:
+        calculateMoveScores(secondary_move.state_node,
+                            test_board_heuristic_three if heuristic_function is None else heuristic_function,
+                            _worker_transposition_table)
+
+    primary_move_node.average_score = primary_move_node.score_sum / len(primary_move_node.secondary_move_list)
+
+    return (primary_move_node.score_sum, primary_move_node.average_score,
+            search_context.joint_moves_applied - nodes_before)
+
+
+def parallelRootSearch(state_node, desired_depth, pruning_function, turn_num, process_pool,
+                       heuristic_function=None, tablebase_path=None):
+    # Parallel version of buildStateTree + calculateMoveScores for the root state_node. The root's
+    # primary moves are searched one per task by process_pool (see createSearchPool), and
+    # state_node.primary_move_list is filled with their scores, ready for getBestMove. The board is sent
+    # to the workers as a BitBoard. Returns the number of joint moves the workers applied.
+
+    # The workers search with pruning_function and score leaves with heuristic_function, or batched with
+    # test_board_heuristic_three (see batch_evaluation.py) if it is None. Both are sent to the worker
+    # processes, so they must be picklable (module level functions, not e.g. an EvaluationCache).
+    # If tablebase_path is given, the workers open that tablebase and score the leaves it has a forced win
+    # for with it (see LeafBatch).
+    # Each primary move's search is seeded from this thread's generator (see SearchContext), so the
+    # results follow random.seed whichever worker searches which move
+
+    moves_upper, moves_lower = pruning_function(state_node)
+
+    if state_node.team == "upper":
+        primary_moves, secondary_moves = moves_upper, moves_lower
+    else:
+        primary_moves, secondary_moves = moves_lower, moves_upper
+
+    board = tuple(fromBoardDicts(state_node.coord_dict, state_node.upper_thrown_num, state_node.lower_thrown_num))
+
+    seeds = [search_context.rng.getrandbits(64) for _ in primary_moves]
+
+    futures = [process_pool.submit(_searchPrimaryMove, board, state_node.team, turn_num, primary_move,
+                                   secondary_moves, desired_depth, pruning_function, heuristic_function, seed,
+                                   tablebase_path)
+               for primary_move, seed in zip(primary_moves, seeds)]
+
+    nodes = 0
+
+    for primary_move, future in zip(primary_moves, futures):
+
+        primary_move_node = Primary_move_node(primary_move, [], state_node)
+        primary_move_node.score_sum, primary_move_node.average_score, move_nodes = future.result()
+
+        state_node.primary_move_list.append(primary_move_node)
+
+        nodes += move_nodes
+
+    return nodes
+
 
 def getBestMove(state_node, higher_score_is_better=True, randomly_choose_tie=True):
     
@@ -746,7 +1942,7 @@ def getBestMove(state_node, higher_score_is_better=True, randomly_choose_tie=Tru
     
     if randomly_choose_tie:
         if len(current_best_moves) > 1:
-            random.shuffle(current_best_moves)
+            search_context.rng.shuffle(current_best_moves)
 
     return current_best_moves[0]
         
@@ -771,7 +1967,7 @@ def starting_move_generator_smart(team, last_enemy_move, turn) -> tuple:
     # if first turn get random piece
     if turn == 1:
         pieces = ["r", "p", "s"]
-        random.shuffle(pieces)
+        search_context.rng.shuffle(pieces)
         counter = pieces.pop(0)
     elif last_enemy_move[1] == "r":
         counter = "p"
@@ -804,7 +2000,7 @@ def starting_move_generator_smart(team, last_enemy_move, turn) -> tuple:
             row = -1
     # If turn = 1, get random tile and throw
     if turn == 1:
-        random.shuffle(rows[0])
+        search_context.rng.shuffle(rows[0])
         tile = rows[0].pop(0)
         move = (("THROW", counter, tile))
     # Get "line opposite enemy piece" to throw to
@@ -922,6 +2118,10 @@ def get_close_pieces_prey_num(team, piece_dict, num) -> list:
         for piece in piece_dict["upper"]:
             for coords in piece_dict["upper"][piece]:
                 upper_piece_list.append((piece, coords))
+        # Distance from each of our pieces to its closest prey
+        prey_distances = []
+        for piece in piece_dict["upper"]:
+            prey_distances.extend(distanceReductions(piece_dict["upper"][piece], piece_dict["lower"][get_prey(piece)])[0])
         # Loop until we have enough pieces
         while True:
             closeness += 1
@@ -937,20 +2137,10 @@ def get_close_pieces_prey_num(team, piece_dict, num) -> list:
             # Check each of our pieces for closeness to a "prey" piece
             for piece in upper_piece_list:
                 pos += 1
-                if piece[0] == "r":
-                    prey = "s"
-                elif piece[0] == "p":
-                    prey = "r"
-                else:
-                    prey = "p"
-                # If prey list is empty, return
-                if len(piece_dict["lower"][prey]) == 0:
-                    continue
-                for enemycoords in piece_dict["lower"][prey]:
-                    if manhattanDistance(piece[1], enemycoords) <= closeness:
-                        current_add.append(piece)
-                        current_add_pos.append(pos)
-                        break
+                # Pieces with no prey have a distance of NO_DISTANCE so are never added
+                if prey_distances[pos] <= closeness:
+                    current_add.append(piece)
+                    current_add_pos.append(pos)
             # Add pieces to list. If we have enough break, if too many add at random
             # Reverse pos_list so that we don't mess up popping added values
             if len(current_add) < amount_needed:
@@ -959,13 +2149,14 @@ def get_close_pieces_prey_num(team, piece_dict, num) -> list:
                 current_add_pos.reverse()
                 for piece_position in current_add_pos:
                     upper_piece_list.pop(piece_position)
+                    prey_distances.pop(piece_position)
             # If we have exactly enough, just add and break out of loop
             elif len(current_add) == amount_needed:
                 upper_piece_return_list.extend(current_add)
                 break
             # If we have too many pieces choose at random, then break out of loop
             else:
-                random.shuffle(current_add)
+                search_context.rng.shuffle(current_add)
                 random_add_slice = current_add[0:amount_needed-1]
                 upper_piece_return_list.extend(random_add_slice)
                 break
@@ -980,6 +2171,10 @@ def get_close_pieces_prey_num(team, piece_dict, num) -> list:
         for piece in piece_dict["lower"]:
             for coords in piece_dict["lower"][piece]:
                 lower_piece_list.append((piece, coords))
+        # Distance from each of our pieces to its closest prey
+        prey_distances = []
+        for piece in piece_dict["lower"]:
+            prey_distances.extend(distanceReductions(piece_dict["lower"][piece], piece_dict["upper"][get_prey(piece)])[0])
         # Loop until we have enough pieces
         while True:
             closeness += 1
@@ -995,20 +2190,10 @@ def get_close_pieces_prey_num(team, piece_dict, num) -> list:
             # Check each of our pieces for closeness to a "prey" piece
             for piece in lower_piece_list:
                 pos += 1
-                if piece[0] == "r":
-                    prey = "s"
-                elif piece[0] == "p":
-                    prey = "r"
-                else:
-                    prey = "p"
-                # If prey list is empty, return
-                if len(piece_dict["upper"][prey]) == 0:
-                    continue
-                for enemycoords in piece_dict["upper"][prey]:
-                    if manhattanDistance(piece[1], enemycoords) <= closeness:
-                        current_add.append(piece)
-                        current_add_pos.append(pos)
-                        break
+                # Pieces with no prey have a distance of NO_DISTANCE so are never added
+                if prey_distances[pos] <= closeness:
+                    current_add.append(piece)
+                    current_add_pos.append(pos)
             # Add pieces to list. If we have enough break, if too many add at random
             # Reverse pos_list so that we don't mess up popping added values
             if len(current_add) < amount_needed:
@@ -1017,13 +2202,14 @@ def get_close_pieces_prey_num(team, piece_dict, num) -> list:
                 current_add_pos.reverse()
                 for piece_position in current_add_pos:
                     lower_piece_list.pop(piece_position)
+                    prey_distances.pop(piece_position)
             # If we have exactly enough, just add and break out of loop
             elif len(current_add) == amount_needed:
                 lower_piece_return_list.extend(current_add)
                 break
             # If we have too many pieces choose at random, then break out of loop
             else:
-                random.shuffle(current_add)
+                search_context.rng.shuffle(current_add)
                 random_add_slice = current_add[0:amount_needed - 1]
                 lower_piece_return_list.extend(random_add_slice)
                 break
@@ -1043,26 +2229,15 @@ def get_aggressive_moves(team, piece_dict, pieces_to_move, coord_dict) -> list:
     for piece in pieces_to_move:
         # Get current distance
         prey = get_prey(piece)
-        prey_dist = 99
-        for preycoords in piece_dict[opponent][prey]:
-            if manhattanDistance(piece[1], preycoords) < prey_dist:
-                prey_dist = manhattanDistance(piece[1], preycoords)
         # Get list of possible moves
         possible_moves = getValidMovesForPiece(piece[1], coord_dict, team)
-        bad_moves = []
-        # Check each move to see if it is a bad move
-        for move in possible_moves:
-            new_prey_dist = 99
-            for preycoords in piece_dict[opponent][prey]:
-                # Move[2] has destination
-                if manhattanDistance(move[2], preycoords) < new_prey_dist:
-                    new_prey_dist = manhattanDistance(move[2], preycoords)
-            if new_prey_dist > prey_dist:
-                bad_moves.append(move)
-        # Remove the bad moves then add remaining moves to move_list
-        for bad_move in bad_moves:
-            possible_moves.remove(bad_move)
-        move_list.extend(possible_moves)
+        # Distance to closest prey now, followed by the distance after each move (move[2] has destination)
+        prey_dists = distanceReductions([piece[1]] + [move[2] for move in possible_moves],
+                                        piece_dict[opponent][prey])[0]
+        prey_dist = prey_dists[0]
+        # Only keep the moves that don't take the piece further away from prey
+        move_list.extend([move for move, new_prey_dist in zip(possible_moves, prey_dists[1:])
+                          if new_prey_dist <= prey_dist])
     return move_list
 
 # Function to get prey piece, avoid typing 100 times
@@ -1082,6 +2257,7 @@ def get_prey(piece):
 # Finally, if we have less than 6 good moves to move, forcibly add throws (airdrop and smart furthest row)
 # Up to maximum of 6
 def test_pruning_three (state_node):
+    # TODO: return move codes, see the TODO of moves.py
     
     upper_throws = state_node.upper_thrown_num
     lower_throws = state_node.lower_thrown_num
@@ -1093,8 +2269,7 @@ def test_pruning_three (state_node):
     
 
     # Checking to see if one team has an invincible piece
-    upper_invincible, lower_invincible, upper_invincible_type, lower_invincible_type = hasInvincibleToken(
-        piece_dict, upper_throws, lower_throws)
+    upper_invincible, lower_invincible, upper_invincible_type, lower_invincible_type = state_node.material.invincible
     
     
     # Deal with upper
@@ -1124,7 +2299,7 @@ def test_pruning_three (state_node):
             throw_danger_moves = get_throws_airdrop(upper_throws, "upper", piece_dict)
             moves_required = moves_allowed - len(upper_moves)
             if moves_required < len(throw_danger_moves):
-                random.shuffle(throw_danger_moves)
+                search_context.rng.shuffle(throw_danger_moves)
                 throw_danger_moves = throw_danger_moves[:moves_required]
             upper_moves.extend(throw_danger_moves)
         #If we STILL don't have enough moves, try to make up difference with random furthest row throws
@@ -1161,7 +2336,7 @@ def test_pruning_three (state_node):
             throw_danger_moves = get_throws_airdrop(lower_throws, "lower", piece_dict)
             moves_required = moves_allowed - len(lower_moves)
             if moves_required < len(throw_danger_moves):
-                random.shuffle(throw_danger_moves)
+                search_context.rng.shuffle(throw_danger_moves)
                 throw_danger_moves = throw_danger_moves[:moves_required]
             lower_moves.extend(throw_danger_moves)
         #If we STILL don't have enough moves, try to make up difference with random furthest row throws
@@ -1172,23 +2347,23 @@ def test_pruning_three (state_node):
     #If upper still doesn't have enough moves, pad them with random moves
     if len(upper_moves) < moves_allowed:
         all_possible_upper_moves = getPossibleMoves(state_node, "upper")
-        random.shuffle(all_possible_upper_moves)
+        search_context.rng.shuffle(all_possible_upper_moves)
 
         upper_moves += all_possible_upper_moves[:moves_allowed - len(upper_moves)]
     
     #If lower still doesn't have enough moves, pad them with random moves
     if len(lower_moves) < moves_allowed:
         all_possible_lower_moves = getPossibleMoves(state_node, "lower")
-        random.shuffle(all_possible_lower_moves)
+        search_context.rng.shuffle(all_possible_lower_moves)
 
         lower_moves += all_possible_lower_moves[:moves_allowed - len(lower_moves)]
             
     # trim list to n moves
     if len(upper_moves) > moves_allowed:
-        random.shuffle(upper_moves)
+        search_context.rng.shuffle(upper_moves)
         upper_moves = upper_moves[:moves_allowed]
     if len(lower_moves) > moves_allowed:
-        random.shuffle(lower_moves)
+        search_context.rng.shuffle(lower_moves)
         lower_moves = lower_moves[:moves_allowed]
     return upper_moves, lower_moves
 
@@ -1236,7 +2411,7 @@ def get_throws_furthest_row_smart(throws, team, piece_dict, moves_num) -> list:
             moves.append(("THROW", piece, tile))
     # get right number of moves
     if len(moves) > moves_num:
-        random.shuffle(moves)
+        search_context.rng.shuffle(moves)
         selected_moves = moves[:moves_num]
         return selected_moves
     else:
@@ -1295,24 +2470,15 @@ def runAwayMoves(state_node, team, moves_allowed):
         
         prey_moves = getValidMovesForPiece(prey_coord, coord_dict, team)
         
-        for prey_move in prey_moves:
-            
-            # find the minimum distance between prey and their predator 
-    
-            prey_end_coord = prey_move[-1]
-        
-            minimum_distance = 1000
-        
-            for predator_coord in piece_dict[opposite_team[team]][predator_piece_type]:
+        # find the minimum distance between prey and their predator after each move
 
-                distance = manhattanDistance(prey_end_coord, predator_coord)
-    
-                if distance < minimum_distance:
-                    minimum_distance = distance
-                
-            # Now know new minimum distance for this prey piece after this move
-            
-            move_scores.append((minimum_distance, prey_move))
+        prey_end_coords = [prey_move[-1] for prey_move in prey_moves]
+
+        minimum_distances = distanceReductions(prey_end_coords, piece_dict[opposite_team[team]][predator_piece_type])[0]
+
+        # Now know new minimum distance for this prey piece after each move
+
+        move_scores.extend(zip(minimum_distances, prey_moves))
         
     # Now move_scores holds all possible moves for the most in danger prey pieces and the resulting distance
     # between themselves and the nearest predator piece
@@ -1359,9 +2525,7 @@ def get_proximty_prey_score(team, piece_dict):
                 prey = "r"
             else:
                 prey = "p"
-            for coords in piece_dict["upper"][piece]:
-                for preycoords in piece_dict["lower"][prey]:
-                    score += max(3 - manhattanDistance(coords, preycoords), 0)
+            score += sum(distanceReductions(piece_dict["upper"][piece], piece_dict["lower"][prey], proximity=True)[1])
     # If team is not upper, team is lower
     else:
         for piece in piece_dict["lower"]:
@@ -1372,9 +2536,7 @@ def get_proximty_prey_score(team, piece_dict):
                 prey = "r"
             else:
                 prey = "p"
-            for coords in piece_dict["lower"][piece]:
-                for preycoords in piece_dict["upper"][prey]:
-                    score += max(3 - manhattanDistance(coords, preycoords), 0)
+            score += sum(distanceReductions(piece_dict["lower"][piece], piece_dict["upper"][prey], proximity=True)[1])
     return score
 
 
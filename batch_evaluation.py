@@ -0,0 +1,241 @@
+from itertools import chain
+
+import numpy as np
+
+from geometry import CELLS, PROXIMITY_MATRIX
+from bitboard import toBoardDicts, fromBoardDicts
+from incremental_evaluation import summaryHeuristic
+from tablebase import tablebaseScore
+
+
+# Batched, vectorised version of test_board_heuristic_three (Tronity.py).
+#
+# Leaf states are added to a LeafBatch as the tree is built, which takes a snapshot of each
+# leaf (throw counts and the cell index of every piece) into dense arrays. evaluate then
+# computes the heuristic for all leaves at once with NumPy and writes each score back to its
+# state node. The scores are exactly the same as calling test_board_heuristic_three on each leaf.
+# Leaves that already have an evaluation summary (see incremental_evaluation.py) are scored from it
+# as they are added instead, and so are leaves in an endgame tablebase (see tablebase.py) that a team
+# can force a win from, with the table's exact score.
+#
+# A position reached by more than one leaf of a search is only snapshotted and scored once: leaves
+# are keyed by their evaluation cache key (or Zobrist key, if they have one), and a leaf with the key
+# of a leaf already added just takes that leaf's score.
+
+# Most pieces of one team and type that can be on the board
+MAX_TOKENS = 9
+
+# Cell index used to pad the piece arrays, its row and column of the proximity matrix are 0
+PAD_CELL = len(CELLS)
+
+PADDED_PROXIMITY_MATRIX = np.zeros((PAD_CELL + 1, PAD_CELL + 1), dtype=PROXIMITY_MATRIX.dtype)
+PADDED_PROXIMITY_MATRIX[:PAD_CELL, :PAD_CELL] = PROXIMITY_MATRIX
+
+# Cell index of (r, q) at COORD_TO_CELL[(r + 4) * 9 + q + 4]
+COORD_TO_CELL = np.full(81, PAD_CELL, dtype=np.int64)
+COORD_TO_CELL[[(r + 4) * 9 + q + 4 for r, q in CELLS]] = np.arange(len(CELLS))
+
+# Index of the prey of each piece type, in ("r", "p", "s") order
+PREY_INDEX = [2, 0, 1]
+
+
+class LeafBatch:
+
+    def __init__(self, evaluation_cache=None, tablebase=None):
+
+        # If given (an EvaluationCache, see evaluation_cache.py), leaves whose score is cached are
+        # scored as they are added, and the rest are cached by evaluate
+        self.evaluation_cache = evaluation_cache
+
+        # If given (a Tablebase), leaves it has a forced win for are scored with tablebaseScore as they are
+        # added. Those scores aren't the heuristic's, so they aren't cached
+        self.tablebase = tablebase
+
+        # Cache key of each leaf, if there is an evaluation_cache
+        self.cache_keys = []
+
+        self.state_nodes = []
+
+        # Key of each leaf in state_nodes -> its index, and (state node, index) of the leaves added with
+        # the key of one of them
+        self.rows = {}
+        self.duplicates = []
+
+        # Leaves scored from their evaluation summary or the tablebase as they were added
+        self.scored_state_nodes = []
+
+        # Six piece lists per leaf: upper r, p, s then lower r, p, s
+        self.piece_lists = []
+
+        # One row per leaf: (upper_thrown_num, lower_thrown_num, 1 if team is "upper" else 0)
+        self.throws = []
+
+    def __len__(self):
+        # Leaves scored, each position once
+        return len(self.state_nodes) + len(self.scored_state_nodes)
+
+    def add(self, state_node):
+        # Snapshot the leaf, its board must be available (applied, or kept as a BitBoard).
+        # apply_joint_move never modifies a piece list in place, so keeping the lists themselves is
+        # enough, they are turned into cell indices for every leaf at once by evaluate
+
+        # Only positions where both teams have thrown everything can be in the table
+        if self.tablebase is not None and state_node.upper_thrown_num == 9 and state_node.lower_thrown_num == 9:
+            board = state_node.board
+            if board is None:
+                board = fromBoardDicts(state_node.coord_dict, state_node.upper_thrown_num,
+                                       state_node.lower_thrown_num)
+
+            score = tablebaseScore(self.tablebase, board, state_node.team)
+
+            if score is not None:
+                state_node.score = score
+                self.scored_state_nodes.append(state_node)
+                return
+
+        if self.evaluation_cache is not None:
+            key = self.evaluation_cache.key(state_node)
+        else:
+            key = state_node.zobrist_key
+
+        if key is not None:
+            row = self.rows.get(key)
+
+            if row is not None:
+                self.duplicates.append((state_node, row))
+                return
+
+        if self.evaluation_cache is not None:
+            score = self.evaluation_cache.lookup(key)
+
+            if score is not None:
+                state_node.score = score
+                return
+
+        if state_node.evaluation_summary is not None:
+            state_node.score = summaryHeuristic(state_node.team, state_node.evaluation_summary,
+                                                state_node.upper_thrown_num, state_node.lower_thrown_num)
+
+            self.scored_state_nodes.append(state_node)
+
+            if self.evaluation_cache is not None:
+                self.evaluation_cache.store(key, state_node.score)
+            return
+
+        if self.evaluation_cache is not None:
+            self.cache_keys.append(key)
+
+        if key is not None:
+            self.rows[key] = len(self.state_nodes)
+
+        piece_dict = state_node.piece_dict
+        if piece_dict is None:
+            piece_dict = toBoardDicts(state_node.board)[1]
+
+        upper = piece_dict["upper"]
+        lower = piece_dict["lower"]
+
+        self.state_nodes.append(state_node)
+        self.piece_lists += (upper["r"], upper["p"], upper["s"], lower["r"], lower["p"], lower["s"])
+        self.throws.append((state_node.upper_thrown_num, state_node.lower_thrown_num, state_node.team == "upper"))
+
+    def cellArray(self):
+        # (leaves, 2 teams, 3 piece types, MAX_TOKENS) array of the cell index of every piece, padded
+        # with PAD_CELL
+
+        lengths = np.fromiter(map(len, self.piece_lists), dtype=np.int64, count=len(self.piece_lists))
+
+        cells = np.full((len(self.piece_lists), MAX_TOKENS), PAD_CELL, dtype=np.int64)
+
+        total = int(lengths.sum())
+        if total:
+            coords = np.array(list(chain.from_iterable(self.piece_lists)), dtype=np.int64).reshape(total, 2)
+
+            # Which list each coord came from and its position in that list
+            list_index = np.repeat(np.arange(len(lengths)), lengths)
+            position = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+            cells[list_index, position] = COORD_TO_CELL[(coords[:, 0] + 4) * 9 + coords[:, 1] + 4]
+
+        return cells.reshape(-1, 2, 3, MAX_TOKENS)
+
+    def evaluate(self, transposition_table=None):
+        # Score every leaf added so far, set each state node's score and return the scores (one per
+        # position, of the leaves that weren't scored as they were added).
+        # If transposition_table is given the scores are stored in it as well
+
+        if transposition_table is not None:
+            for state_node in self.scored_state_nodes:
+                transposition_table.store(state_node.zobrist_key, state_node.search_depth, state_node.score)
+
+        if not self.state_nodes:
+            return []
+
+        cells = self.cellArray()
+        throws = np.array(self.throws, dtype=np.int64)
+
+        upper_is_team = throws[:, 2] == 1
+
+        # Arrange everything from the point of view of each leaf's team
+        own_cells = np.where(upper_is_team[:, None, None], cells[:, 0], cells[:, 1])
+        enemy_cells = np.where(upper_is_team[:, None, None], cells[:, 1], cells[:, 0])
+
+        own_throws = np.where(upper_is_team, throws[:, 0], throws[:, 1])
+        enemy_throws = np.where(upper_is_team, throws[:, 1], throws[:, 0])
+
+        own_on_board = (own_cells != PAD_CELL).sum(axis=(1, 2))
+        enemy_on_board = (enemy_cells != PAD_CELL).sum(axis=(1, 2))
+
+        # enemy_pieces_captured
+        captured = 4 * (enemy_throws - enemy_on_board)
+
+        # get_proximty_prey_score, every own piece against every enemy piece of its prey type
+        prey_cells = enemy_cells[:, PREY_INDEX, :]
+        board_score = PADDED_PROXIMITY_MATRIX[own_cells[:, :, :, None], prey_cells[:, :, None, :]].sum(axis=(1, 2, 3))
+
+        # board_throw_ratio
+        own_count = (9 - own_throws + own_on_board).astype(np.float64)
+        enemy_count = (9 - enemy_throws + enemy_on_board).astype(np.float64)
+        own_count[own_count == 0] = 0.5
+        enemy_count[enemy_count == 0] = 0.5
+
+        scores = (own_count / enemy_count * (captured + board_score)).tolist()
+
+        for state_node, score in zip(self.state_nodes, scores):
+            state_node.score = score
+
+            if transposition_table is not None:
+                transposition_table.store(state_node.zobrist_key, state_node.search_depth, score)
+
+        for state_node, row in self.duplicates:
+            state_node.score = scores[row]
+
+            if transposition_table is not None:
+                transposition_table.store(state_node.zobrist_key, state_node.search_depth, state_node.score)
+
+        if self.evaluation_cache is not None:
+            for key, score in zip(self.cache_keys, scores):
+                self.evaluation_cache.store(key, score)
+
+        return scores
+
+
+def evaluateLeavesBatched(state_node, transposition_table=None):
+    # Score all the unscored leaves of an already built tree at once (same scores as running
+    # test_board_heuristic_three on each), ready for calculateMoveScores
+
+    leaf_batch = LeafBatch()
+
+    states = [state_node]
+    while states:
+        state = states.pop()
+
+        if state.primary_move_list == []:
+            if state.score is None and state.transposed_state is None:
+                leaf_batch.add(state)
+        else:
+            for primary_move in state.primary_move_list:
+                for secondary_move in primary_move.secondary_move_list:
+                    states.append(secondary_move.state_node)
+
+    return leaf_batch.evaluate(transposition_table)
@@ -0,0 +1,366 @@
+"""
+Vectorised simulator for many games at once.
+
+Holds a batch of games as NumPy arrays and plays one joint move in every game per step, with the
+same rules as bitboard.resolveMoves and bitboard.gameEnded. For example, random playouts from the
+empty board:
+
+    python batch_simulator.py --games 4096 --seed 0
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from geometry import CELLS, CELL_INDEX, NEIGHBOURS, SWING_MOVES, ROW_COORDS
+from bitboard import BitBoard, CELL_SHIFT, NIBBLE, EMPTY_BITBOARD, invincibleTokens
+from bitboard import UPPER_WINS, LOWER_WINS, DRAW, NOT_ENDED
+from moves import encodeMove, SLIDE_CODES, SWING_CODES
+
+
+# A batch of B games is a (B, 2, 3, 61) array of token counts (team, symbol in BitBoard order, hex),
+# a (B, 2) array of throw counts and a (B,) array of turn numbers. Moves are the 16 bit codes of
+# moves.py, one per game.
+#
+# Every move any token can make is numbered, throws first (one per symbol and hex), then the slides
+# and swings from each hex, and legalMoves gives a (B, MOVE_SLOTS) mask of them. randomMoves doesn't
+# build the mask, it only looks at the moves of occupied hexes. Games that have ended are left as they
+# are by step.
+
+CELL_COUNT = len(CELLS)
+
+# Extra columns of the occupancy arrays, one always empty (for missing pivots) and one always occupied
+PAD_CELL = CELL_COUNT
+ALWAYS_CELL = CELL_COUNT + 1
+
+UPPER = 0
+LOWER = 1
+
+# Row index (as in ROW_COORDS, upper's first throw row is 0) of each hex
+CELL_ROW = np.zeros(CELL_COUNT, dtype=np.int64)
+for _row_index, _row in enumerate(ROW_COORDS):
+    CELL_ROW[[CELL_INDEX[cell] for cell in _row]] = _row_index
+
+
+def _buildMoveSlots():
+    # (codes, throw symbols, throw rows, slide froms, swing froms, swing pivots) of every move slot
+
+    codes = []
+    throw_symbols = []
+    throw_rows = []
+
+    for cell in CELLS:
+        for symbol_index, symbol in enumerate("rps"):
+            codes.append(encodeMove(("THROW", symbol, cell)))
+            throw_symbols.append(symbol_index)
+            throw_rows.append(CELL_ROW[CELL_INDEX[cell]])
+
+    slide_froms = []
+    for cell in CELLS:
+        for tile in NEIGHBOURS[cell]:
+            codes.append(encodeMove(("SLIDE", cell, tile)))
+            slide_froms.append(CELL_INDEX[cell])
+
+    swing_froms = []
+    swing_pivots = []
+    for cell in CELLS:
+        for tile, pivots in SWING_MOVES[cell]:
+            codes.append(encodeMove(("SWING", cell, tile)))
+            swing_froms.append(CELL_INDEX[cell])
+            swing_pivots.append([CELL_INDEX[pivot] for pivot in pivots] + [PAD_CELL] * (2 - len(pivots)))
+
+    return (np.array(codes, dtype=np.int64), np.array(throw_symbols), np.array(throw_rows),
+            np.array(slide_froms), np.array(swing_froms), np.array(swing_pivots))
+
+(SLOT_CODES, THROW_SYMBOLS, THROW_ROWS, SLIDE_FROMS, SWING_FROMS, SWING_PIVOTS) = _buildMoveSlots()
+
+MOVE_SLOTS = len(SLOT_CODES)
+
+
+def _buildRandomMoveTables():
+    # THROW_CODES[team] -> every throw, those team can make first (upper's rows from row 4 down, lower's
+    # from row -4 up), THROW_COUNTS[team][thrown_num] -> how many of them team can make.
+    # PIECE_MOVE_CODES[cell] -> codes of the slides and swings from cell (-1 padded to 18), and
+    # PIECE_MOVE_PIVOTS[cell] -> for each, two occupancy columns at least one of which must be occupied
+
+    throw_codes = {}
+    throw_counts = {}
+
+    for team, rows in ((UPPER, ROW_COORDS), (LOWER, ROW_COORDS[::-1])):
+        throw_codes[team] = np.array([encodeMove(("THROW", symbol, cell)) for row in rows for cell in row
+                                      for symbol in "rps"], dtype=np.int64)
+        throw_counts[team] = np.array([3 * sum(map(len, rows[:thrown_num + 1])) for thrown_num in range(9)] + [0])
+
+    piece_move_codes = np.full((CELL_COUNT, 18), -1, dtype=np.int64)
+    piece_move_pivots = np.full((CELL_COUNT, 18, 2), PAD_CELL, dtype=np.int64)
+
+    for index in range(CELL_COUNT):
+        moves = [(code, (ALWAYS_CELL,)) for code in SLIDE_CODES[index]] + list(SWING_CODES[index])
+
+        for slot, (code, pivots) in enumerate(moves):
+            piece_move_codes[index, slot] = code
+            piece_move_pivots[index, slot, :len(pivots)] = pivots
+
+    return throw_codes, throw_counts, piece_move_codes, piece_move_pivots
+
+THROW_CODES, THROW_COUNTS, PIECE_MOVE_CODES, PIECE_MOVE_PIVOTS = _buildRandomMoveTables()
+
+
+def _buildInvincibleTable():
+    # INVINCIBLE[upper thrown all, lower thrown all, symbols] -> (upper_invincible, lower_invincible) from
+    # bitboard.invincibleTokens, where bit i of symbols is set if the game has tokens of BitBoard field i
+
+    invincible = np.zeros((2, 2, 64, 2), dtype=bool)
+
+    for upper_done in (0, 1):
+        for lower_done in (0, 1):
+            for symbols in range(64):
+                present = [(symbols >> kind) & 1 for kind in range(6)]
+                invincible[upper_done, lower_done, symbols] = invincibleTokens(
+                    *present, 9 * upper_done, 9 * lower_done)[:2]
+
+    return invincible
+
+INVINCIBLE = _buildInvincibleTable()
+
+# Bit of each BitBoard field in INVINCIBLE's symbols index, by (team, symbol)
+SYMBOL_BITS = (1 << np.arange(6)).reshape(2, 3)
+
+
+class BatchSimulator:
+
+    def __init__(self, boards, turn_num=1):
+        # boards is a list of BitBoards, turn_num the turn number of every game
+
+        size = len(boards)
+
+        self.counts = np.zeros((size, 2, 3, CELL_COUNT), dtype=np.int8)
+        self.thrown = np.zeros((size, 2), dtype=np.int64)
+        self.turn_num = np.full(size, turn_num, dtype=np.int64)
+
+        for game, board in enumerate(boards):
+            for kind in range(6):
+                mask = board[kind]
+                if mask:
+                    self.counts[game, kind // 3, kind % 3] = [(mask >> CELL_SHIFT[cell]) & NIBBLE for cell in CELLS]
+
+            self.thrown[game] = board.upper_thrown_num, board.lower_thrown_num
+
+        # Result of every game, NOT_ENDED until it ends
+        self.results = self.gameEnded()
+
+    def __len__(self):
+        return len(self.turn_num)
+
+    def toBoards(self):
+        # The games as BitBoards
+
+        shifts = np.array([CELL_SHIFT[cell] for cell in CELLS], dtype=object)
+
+        boards = []
+        for game in range(len(self)):
+            masks = [int((self.counts[game, kind // 3, kind % 3].astype(object) << shifts).sum()) for kind in range(6)]
+            boards.append(BitBoard(*masks, int(self.thrown[game, UPPER]), int(self.thrown[game, LOWER])))
+
+        return boards
+
+    def active(self):
+        # Indices of the games that haven't ended
+        return np.flatnonzero(self.results == NOT_ENDED)
+
+    def legalMoves(self, team, games):
+        # (len(games), MOVE_SLOTS) mask of the moves team can make in each of games. team is UPPER or LOWER
+
+        occupied = np.zeros((len(games), CELL_COUNT + 1), dtype=bool)
+        occupied[:, :CELL_COUNT] = self.counts[games, team].any(axis=1)
+
+        thrown = self.thrown[games, team][:, None]
+
+        if team == UPPER:
+            throw_rows = THROW_ROWS[None, :] <= thrown
+        else:
+            throw_rows = THROW_ROWS[None, :] >= 8 - thrown
+
+        slides = occupied[:, SLIDE_FROMS]
+        swings = occupied[:, SWING_FROMS] & (occupied[:, SWING_PIVOTS[:, 0]] | occupied[:, SWING_PIVOTS[:, 1]])
+
+        return np.concatenate(((thrown < 9) & throw_rows, slides, swings), axis=1)
+
+    def randomMoves(self, team, games, rng):
+        # Code of a uniformly random legal move for team in each of games (one of the moves legalMoves
+        # allows), rng is a np.random.Generator
+
+        occupied = np.zeros((len(games), CELL_COUNT + 2), dtype=bool)
+        occupied[:, :CELL_COUNT] = self.counts[games, team].any(axis=1)
+        occupied[:, ALWAYS_CELL] = True
+
+        throw_counts = THROW_COUNTS[team][self.thrown[games, team]]
+
+        # Legal slides and swings of every occupied hex, in game order
+        piece_games, piece_cells = np.nonzero(occupied[:, :CELL_COUNT])
+        legal = occupied[piece_games[:, None, None], PIECE_MOVE_PIVOTS[piece_cells]].any(axis=2)
+
+        move_counts = np.bincount(piece_games, weights=legal.sum(axis=1), minlength=len(games)).astype(np.int64)
+
+        # The k-th legal move of each game (throws first), k uniform below its number of legal moves
+        picks = (rng.random(len(games)) * (throw_counts + move_counts)).astype(np.int64)
+
+        codes = THROW_CODES[team][np.minimum(picks, len(THROW_CODES[team]) - 1)]
+
+        moved = picks >= throw_counts
+        if moved.any():
+            candidates = np.flatnonzero(legal)
+            first_candidates = np.cumsum(move_counts) - move_counts
+
+            chosen = candidates[first_candidates[moved] + picks[moved] - throw_counts[moved]]
+            codes[moved] = PIECE_MOVE_CODES[piece_cells[chosen // 18], chosen % 18]
+
+        return codes
+
+    def step(self, upper_codes, lower_codes, games=None):
+        # Play the joint move (upper_codes[i], lower_codes[i]) in games[i] for every i, then resolve
+        # battles, count the turn and update results. games defaults to every game that hasn't ended
+
+        if games is None:
+            games = self.active()
+
+        to_cells = []
+
+        for team, codes in ((UPPER, upper_codes), (LOWER, lower_codes)):
+
+            codes = np.asarray(codes, dtype=np.int64)
+
+            move_types = codes >> 14
+            to_cell = codes & 63
+            from_cell = (codes >> 6) & 63
+
+            # Throws
+            throws = move_types == 0
+            throw_games = games[throws]
+            self.counts[throw_games, team, (codes[throws] >> 12) & 3, to_cell[throws]] += 1
+            self.thrown[throw_games, team] += 1
+
+            # Slides and swings move one token of the symbol on the from hex (hexes hold one symbol per team)
+            moves = ~throws
+            move_games = games[moves]
+            symbols = self.counts[move_games, team, :, from_cell[moves]].argmax(axis=1)
+
+            if (self.counts[move_games, team, symbols, from_cell[moves]] == 0).any():
+                raise ValueError('moves of:', team, 'include a move from a hex without a token of the team')
+
+            self.counts[move_games, team, symbols, from_cell[moves]] -= 1
+            self.counts[move_games, team, symbols, to_cell[moves]] += 1
+
+            to_cells.append(to_cell)
+
+        # Battles on both moves' to hexes: paper beats rock, scissors beat paper, rock beats scissors,
+        # all three together defeat each other
+        for to_cell in to_cells:
+
+            present = self.counts[games, :, :, to_cell].any(axis=1)
+            rock, paper, scissors = present[:, 0], present[:, 1], present[:, 2]
+
+            defeated = np.stack((rock & paper, paper & scissors, scissors & rock), axis=1)
+
+            battle_games, battle_symbols = np.nonzero(defeated)
+            self.counts[games[battle_games], :, battle_symbols, to_cell[battle_games]] = 0
+
+        self.turn_num[games] += 1
+        self.results[games] = self.gameEnded(games)
+
+    def gameEnded(self, games=None):
+        # bitboard.gameEnded of each of games (default all)
+
+        if games is None:
+            games = np.arange(len(self))
+
+        counts = self.counts[games]
+        upper_thrown = self.thrown[games, UPPER]
+        lower_thrown = self.thrown[games, LOWER]
+
+        tokens = counts.sum(axis=3, dtype=np.int64)
+        symbols = tokens > 0
+        upper_tokens = tokens[:, UPPER].sum(axis=1)
+        lower_tokens = tokens[:, LOWER].sum(axis=1)
+
+        results = np.full(len(games), NOT_ENDED, dtype=np.int64)
+        undecided = np.ones(len(games), dtype=bool)
+
+        def decide(condition, result):
+            condition = condition & undecided
+            results[condition] = result
+            undecided[condition] = False
+
+        # Condition 1, a team has no tokens left on the board or to throw
+        lower_out = (lower_thrown == 9) & (lower_tokens == 0)
+        upper_out = (upper_thrown == 9) & (upper_tokens == 0)
+        upper_can_play = (upper_thrown < 9) | (upper_tokens > 0)
+        lower_can_play = (lower_thrown < 9) | (lower_tokens > 0)
+
+        decide(lower_out & upper_can_play, UPPER_WINS)
+        decide(lower_out, DRAW)
+        decide(upper_out & lower_can_play, LOWER_WINS)
+        decide(upper_out, DRAW)
+
+        # Invincible tokens, a symbol whose predator the other team has none of (and can't throw)
+        invincible = INVINCIBLE[(upper_thrown == 9).astype(np.int64), (lower_thrown == 9).astype(np.int64),
+                                (symbols * SYMBOL_BITS).sum(axis=(1, 2))]
+        upper_invincible, lower_invincible = invincible[:, 0], invincible[:, 1]
+
+        # Condition 2
+        decide(upper_invincible & lower_invincible, DRAW)
+
+        # Condition 3
+        decide(upper_invincible & (lower_tokens == 1), UPPER_WINS)
+        decide(lower_invincible & (upper_tokens == 1), LOWER_WINS)
+
+        # Condition 5
+        decide(self.turn_num[games] >= 360, DRAW)
+
+        return results
+
+    def playRandom(self, rng, max_turns=None):
+        # Play uniformly random joint moves in every game until they have all ended (or max_turns joint
+        # moves were played), returns the number of joint moves played over all games
+
+        joint_moves = 0
+        turns = 0
+
+        while max_turns is None or turns < max_turns:
+
+            games = self.active()
+            if len(games) == 0:
+                break
+
+            self.step(self.randomMoves(UPPER, games, rng), self.randomMoves(LOWER, games, rng), games)
+
+            joint_moves += len(games)
+            turns += 1
+
+        return joint_moves
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Play random games with the batch simulator.")
+    parser.add_argument("--games", type=int, default=4096, help="games played at once (default 4096)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random moves")
+    args = parser.parse_args()
+
+    simulator = BatchSimulator([EMPTY_BITBOARD] * args.games)
+
+    start = time.perf_counter()
+    joint_moves = simulator.playRandom(np.random.default_rng(args.seed))
+    seconds = time.perf_counter() - start
+
+    results = {name: int((simulator.results == result).sum())
+               for name, result in (("upper", UPPER_WINS), ("lower", LOWER_WINS), ("draw", DRAW))}
+
+    print("{} games, {} joint moves in {:.1f}s ({:,.0f} per second), results {}".format(
+        args.games, joint_moves, seconds, joint_moves / seconds, results), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
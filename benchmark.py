@@ -0,0 +1,258 @@
+"""
+Microbenchmarks for the hot paths of Tronity.py.
+
+Times each benchmark over a fixed corpus of mid and late game positions, with the random module
+seeded before each timed run, and reports operations per second (and nodes per second for searches).
+Every timed run starts cold, on states and players made for it. Only functions the baseline already
+had are used, so the same file can be run against any revision. Run it before and after a change to
+compare:
+
+    python benchmark.py --json before.json
+    python benchmark.py --json after.json --compare before.json
+"""
+
+import argparse
+import json
+import random
+import time
+
+from Tronity import Player, State_node, getValidMovesForPiece, getPossibleMoves, resolveMoves
+from Tronity import test_pruning_three, test_board_heuristic_three, getEmptyBoardConfigs
+
+
+# (hex -> pieces on it, upper_thrown_num, lower_thrown_num, turn_num), taken from self-play games
+CORPUS = [
+    ({(4, -2): "R", (-4, 2): "p", (3, -2): "S", (-3, 1): "p", (-2, 0): "r", (0, -1): "s", (1, -2): "r",
+      (0, 0): "P"}, 5, 5, 8),
+    ({(4, -2): "R", (-4, 2): "p", (3, -2): "S", (1, -2): "r", (0, 0): "p", (1, -1): "P", (-1, 0): "s"},
+     7, 6, 14),
+    ({(4, -3): "R", (-4, 4): "s", (3, 0): "R", (-3, 0): "S", (2, -3): "S", (1, 0): "r", (-1, -2): "r",
+      (0, 0): "P", (-3, 2): "S", (-1, 0): "s"}, 8, 7, 10),
+    ({(-4, 4): "s", (3, 0): "R", (-3, 0): "S", (2, -3): "S", (-1, -2): "r", (-3, 2): "S", (1, -2): "R",
+      (0, -3): "P", (1, -3): "s"}, 8, 7, 18),
+    ({(-3, 0): "P", (2, -3): "r", (-4, 3): "s", (0, -2): "R", (3, -1): "R", (-2, 2): "r"}, 9, 9, 26),
+    ({(4, -3): "R", (-4, 0): "p", (3, -4): "r", (0, -3): "R", (-2, -1): "pP", (0, -4): "s",
+      (2, -4): "P"}, 8, 7, 12),
+    ({(-4, 0): "p", (-2, -1): "p", (4, -4): "R", (3, -1): "P", (1, -4): "p", (1, -3): "P", (0, -3): "s"},
+     9, 9, 24),
+    ({(-4, 0): "p", (-2, -1): "p", (4, -3): "R", (1, -3): "p", (-1, 2): "P", (0, 3): "s"}, 9, 9, 36),
+]
+
+SEED = 30024
+
+# Joint moves per position timed by the resolveMoves benchmark
+RESOLVE_MOVES_PER_POSITION = 200
+
+
+def loadPosition(position):
+    # CORPUS entry -> (coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, turn_num)
+
+    hexes, upper_thrown_num, lower_thrown_num, turn_num = position
+
+    coord_dict, piece_dict = getEmptyBoardConfigs()
+
+    for coord, pieces in hexes.items():
+        coord_dict[coord] = list(pieces)
+
+        for piece in pieces:
+            piece_dict["upper" if piece.isupper() else "lower"][piece.lower()].append(coord)
+
+    return coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, turn_num
+
+
+def rootStates(position):
+    # A root State_node for each team
+    coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, _ = loadPosition(position)
+    return [State_node(team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, [], None, 0)
+            for team in ("upper", "lower")]
+
+
+# Each benchmark is a setup function, called outside of the timing with the corpus before every timed
+# run, that returns a function to time. The timed function returns (operations, nodes), nodes is None if
+# not a search (or the revision's Player doesn't count them).
+
+def benchResolveMoves(corpus):
+
+    cases = []
+    for position in corpus:
+        coord_dict, _, upper_thrown_num, lower_thrown_num, _ = loadPosition(position)
+        upper_state, lower_state = rootStates(position)
+
+        joint_moves = [(upper_move, lower_move) for upper_move in getPossibleMoves(upper_state, "upper")
+                       for lower_move in getPossibleMoves(lower_state, "lower")]
+        random.Random(SEED).shuffle(joint_moves)
+
+        for upper_move, lower_move in joint_moves[:RESOLVE_MOVES_PER_POSITION]:
+            cases.append((upper_move, lower_move, coord_dict, upper_thrown_num, lower_thrown_num))
+
+    def run():
+        for case in cases:
+            resolveMoves(*case)
+        return len(cases), None
+
+    return run
+
+
+def benchGetValidMovesForPiece(corpus):
+
+    cases = []
+    for position in corpus:
+        coord_dict, piece_dict = loadPosition(position)[:2]
+        for team, pieces in piece_dict.items():
+            for coords in pieces.values():
+                cases += [(coord, coord_dict, team) for coord in coords]
+
+    def run():
+        for case in cases:
+            getValidMovesForPiece(*case)
+        return len(cases), None
+
+    return run
+
+
+def benchGetPossibleMoves(corpus):
+
+    states = [state for position in corpus for state in rootStates(position)]
+
+    def run():
+        for state in states:
+            getPossibleMoves(state, state.team)
+        return len(states), None
+
+    return run
+
+
+def benchPruning(corpus):
+
+    states = [state for position in corpus for state in rootStates(position)]
+
+    def run():
+        for state in states:
+            test_pruning_three(state)
+        return len(states), None
+
+    return run
+
+
+def benchHeuristic(corpus):
+
+    states = [state for position in corpus for state in rootStates(position)]
+
+    def run():
+        for state in states:
+            test_board_heuristic_three(state)
+        return len(states), None
+
+    return run
+
+
+def benchPlayerAction(corpus):
+
+    # Fresh players for every run, so nothing is found in a transposition table or cache from a previous one
+    players = []
+    for position in corpus:
+        for team in ("upper", "lower"):
+            player = Player(team)
+            player.coord_dict, player.piece_dict, player.upper_thrown_num, player.lower_thrown_num, \
+                player.turn_num = loadPosition(position)
+            players.append(player)
+
+    def run():
+        nodes = 0
+        for player in players:
+            player.action()
+
+            # Only counted by revisions that have Player.last_search_nodes
+            player_nodes = getattr(player, "last_search_nodes", None)
+            nodes = None if nodes is None or player_nodes is None else nodes + player_nodes
+
+        return len(players), nodes
+
+    return run
+
+
+BENCHMARKS = {
+    "resolveMoves": benchResolveMoves,
+    "getValidMovesForPiece": benchGetValidMovesForPiece,
+    "getPossibleMoves": benchGetPossibleMoves,
+    "test_pruning_three": benchPruning,
+    "test_board_heuristic_three": benchHeuristic,
+    "Player.action": benchPlayerAction,
+}
+
+
+def runBenchmark(setup, rounds, min_time):
+    # Best of rounds rounds, each repeating the benchmark until it has run for min_time seconds.
+    # Returns {"ops_per_second": ..., "nodes_per_second": ...} (nodes_per_second only for searches)
+
+    best = None
+
+    for _ in range(rounds):
+
+        operations = 0
+        nodes = None
+        elapsed = 0.0
+
+        while elapsed < min_time:
+            # Set up again for every run, so no run is warmed up by the one before it
+            run = setup(CORPUS)
+            random.seed(SEED)
+
+            start = time.perf_counter()
+            run_operations, run_nodes = run()
+            elapsed += time.perf_counter() - start
+
+            operations += run_operations
+            if run_nodes is not None:
+                nodes = (nodes or 0) + run_nodes
+
+        result = {"ops_per_second": operations / elapsed}
+        if nodes is not None:
+            result["nodes_per_second"] = nodes / elapsed
+
+        if best is None or result["ops_per_second"] > best["ops_per_second"]:
+            best = result
+
+    return best
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of Tronity.py.")
+    parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK",
+                        help="benchmarks to run, any of {} (default: all)".format(", ".join(BENCHMARKS)))
+    parser.add_argument("--rounds", type=int, default=3, help="rounds per benchmark, the best is reported")
+    parser.add_argument("--min-time", type=float, default=0.5, help="minimum seconds per round")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of another revision to compare against")
+    args = parser.parse_args()
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark {}".format(name))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+
+    results = {}
+
+    for name in args.benchmarks or BENCHMARKS:
+        result = runBenchmark(BENCHMARKS[name], args.rounds, args.min_time)
+        results[name] = result
+
+        line = "{:<28}{:>14,.1f} ops/s".format(name, result["ops_per_second"])
+        if "nodes_per_second" in result:
+            line += "{:>14,.0f} nodes/s".format(result["nodes_per_second"])
+        if previous and name in previous:
+            line += "   x{:.2f}".format(result["ops_per_second"] / previous[name]["ops_per_second"])
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+from array import array
+from collections import defaultdict as dd
+from collections import namedtuple
+
+from geometry import CELLS, NEIGHBOURS, SWING_MOVES
+from moves import THROW, THROW_MOVES, THROW_CODES, SLIDE_CODES, SWING_CODES, DECODED_MOVES, encodeMove
+
+
+# Compact alternative to the coord_dict/piece_dict board representation.
+#
+# Every one of the 61 hexes gets a 4 bit slot (a "nibble") in an integer, and there is one
+# integer for each (team, symbol) pair. The nibble holds how many tokens of that team and
+# symbol are on the hex, so stacks of the same symbol (e.g. two upper rocks on one hex)
+# are kept exactly like the lists in coord_dict. A nibble is non-zero iff that token type
+# is present, so occupancy checks and battles are just shifts, ands and ors.
+#
+# Hexes are numbered as in geometry.py. Moves can be given as tuples or as the codes of moves.py
+# (getPossibleMoveCodes, resolveMoveCodes), which is what the searches on BitBoards use.
+
+BITS_PER_CELL = 4
+NIBBLE = (1 << BITS_PER_CELL) - 1
+
+# Shift of the nibble for each hex
+CELL_SHIFT = {cell: BITS_PER_CELL * index for index, cell in enumerate(CELLS)}
+
+# Lowest bit of every nibble on the board
+LOW_BITS = sum(1 << (BITS_PER_CELL * index) for index in range(len(CELLS)))
+
+# Index into a BitBoard for each team's rock, the paper and scissors follow it
+TEAM_OFFSET = {"upper": 0, "lower": 3}
+
+SYMBOLS = ("r", "p", "s")
+SYMBOL_INDEX = {"r": 0, "p": 1, "s": 2}
+
+BitBoard = namedtuple("BitBoard", ["upper_r", "upper_p", "upper_s",
+                                   "lower_r", "lower_p", "lower_s",
+                                   "upper_thrown_num", "lower_thrown_num"])
+
+EMPTY_BITBOARD = BitBoard(0, 0, 0, 0, 0, 0, 0, 0)
+
+# Same values as Tronity.py
+UPPER_WINS = 1
+LOWER_WINS = -1
+DRAW = 2
+NOT_ENDED = 0
+
+
+def _buildSwingMasks():
+    # For each swing target store a mask with the nibbles of every hex it can be swung around
+    return {cell: tuple((tile, sum(NIBBLE << CELL_SHIFT[pivot] for pivot in pivots))
+                        for tile, pivots in SWING_MOVES[cell])
+            for cell in CELLS}
+
+SWING_MASKS = _buildSwingMasks()
+
+# SWING_CODE_MASKS[cell index] -> (code, pivot mask) of every swing from that hex (SWING_CODES order)
+SWING_CODE_MASKS = tuple(tuple((code, sum(NIBBLE << (BITS_PER_CELL * pivot) for pivot in pivots))
+                               for code, pivots in swings)
+                         for swings in SWING_CODES)
+
+
+def fromBoardDicts(coord_dict, upper_thrown_num, lower_thrown_num):
+    # Build a BitBoard from the coord_dict representation used by Tronity.py
+
+    masks = [0, 0, 0, 0, 0, 0]
+
+    for coord, pieces in coord_dict.items():
+        for piece in pieces:
+            if piece in ["R", "P", "S"]:
+                masks[SYMBOL_INDEX[piece.lower()]] += 1 << CELL_SHIFT[coord]
+            elif piece in ["r", "p", "s"]:
+                masks[3 + SYMBOL_INDEX[piece]] += 1 << CELL_SHIFT[coord]
+            else:
+                raise ValueError('piece value of:', piece, 'is not upper or lower!')
+
+    return BitBoard(*masks, upper_thrown_num, lower_thrown_num)
+
+
+def toBoardDicts(board):
+    # Inverse of fromBoardDicts, returns (coord_dict, piece_dict, upper_thrown_num, lower_thrown_num)
+
+    piece_dict = {"upper": {"r": [], "p": [], "s": []},
+                  "lower": {"r": [], "p": [], "s": []}}
+
+    coord_dict = dd(list)
+
+    for team, offset in TEAM_OFFSET.items():
+        for symbol_index, symbol in enumerate(SYMBOLS):
+            mask = board[offset + symbol_index]
+            piece = symbol.upper() if team == "upper" else symbol
+
+            for cell in CELLS:
+                count = (mask >> CELL_SHIFT[cell]) & NIBBLE
+
+                if count:
+                    coord_dict[cell] += [piece] * count
+                    piece_dict[team][symbol] += [cell] * count
+
+    return coord_dict, piece_dict, board.upper_thrown_num, board.lower_thrown_num
+
+
+def tokenCount(mask):
+    # Total number of tokens stored in a mask (sum of all of its nibbles)
+    return ((mask & LOW_BITS).bit_count() + ((mask >> 1) & LOW_BITS).bit_count() * 2 +
+            ((mask >> 2) & LOW_BITS).bit_count() * 4 + ((mask >> 3) & LOW_BITS).bit_count() * 8)
+
+
+def teamOccupancy(board, team):
+    # Mask with a non-zero nibble on every hex holding at least one token of team
+    offset = TEAM_OFFSET[team]
+    return board[offset] | board[offset + 1] | board[offset + 2]
+
+
+def occupiedCellIndices(mask):
+    # Indices of the hexes with a non-zero nibble in mask, in CELLS order
+    present = (mask | (mask >> 1) | (mask >> 2) | (mask >> 3)) & LOW_BITS
+
+    indices = []
+    while present:
+        low_bit = present & -present
+        indices.append((low_bit.bit_length() - 1) // BITS_PER_CELL)
+        present ^= low_bit
+
+    return indices
+
+
+def occupiedCells(mask):
+    # Hexes with a non-zero nibble in mask, in CELLS order
+    return [CELLS[index] for index in occupiedCellIndices(mask)]
+
+
+def getValidMovesForPiece(from_pos, board, piece_team):
+
+    # Same moves, in the same order, as Tronity.getValidMovesForPiece
+
+    occupancy = teamOccupancy(board, piece_team)
+
+    # Check that there is a piece of piece_team in from_pos
+    if from_pos not in CELL_SHIFT or not (occupancy >> CELL_SHIFT[from_pos]) & NIBBLE:
+        return []
+
+    valid_moves = [("SLIDE", from_pos, tile) for tile in NEIGHBOURS[from_pos]]
+
+    # A swing is valid if any hex between from_pos and the target holds a friendly piece
+    for tile, pivot_mask in SWING_MASKS[from_pos]:
+        if occupancy & pivot_mask:
+            valid_moves.append(("SWING", from_pos, tile))
+
+    return valid_moves
+
+
+def getPossibleMoveCodes(board, team, include_throws=True):
+    # Every move team can make as an array("H") of move codes, throws first then the moves of each
+    # occupied hex (in CELLS order). The same moves as Tronity.getPossibleMoves, but each hex's moves
+    # appear once however many tokens it holds
+
+    occupancy = teamOccupancy(board, team)
+
+    if include_throws:
+        possible_moves = array("H", THROW_CODES[team][board[6 + TEAM_OFFSET[team] // 3]])
+    else:
+        possible_moves = array("H")
+
+    for index in occupiedCellIndices(occupancy):
+        possible_moves += SLIDE_CODES[index]
+
+        for code, pivot_mask in SWING_CODE_MASKS[index]:
+            if occupancy & pivot_mask:
+                possible_moves.append(code)
+
+    return possible_moves
+
+
+def getPossibleMoves(board, team, include_throws=True):
+    # getPossibleMoveCodes as a list of move tuples
+    return [DECODED_MOVES[code] for code in getPossibleMoveCodes(board, team, include_throws)]
+
+
+def resolveMoves(upper_move, lower_move, board):
+    # Equivalent of Tronity.resolveMoves, returns the new BitBoard (including throw counts)
+    return resolveMoveCodes(encodeMove(upper_move), encodeMove(lower_move), board)
+
+
+def resolveMoveCodes(upper_code, lower_code, board):
+    # resolveMoves for move codes
+
+    masks = list(board)
+
+    for offset, code in ((0, upper_code), (3, lower_code)):
+
+        to_shift = BITS_PER_CELL * (code & 63)
+
+        if code >> 14 == THROW:
+            masks[offset + ((code >> 12) & 3)] += 1 << to_shift
+            masks[6 + offset // 3] += 1
+
+        else:
+            from_shift = BITS_PER_CELL * ((code >> 6) & 63)
+
+            # Find which of this team's symbols is sitting on the from hex
+            for index in range(offset, offset + 3):
+                if (masks[index] >> from_shift) & NIBBLE:
+                    break
+            else:
+                raise ValueError('no', "upper" if offset == 0 else "lower", 'piece at', CELLS[(code >> 6) & 63])
+
+            masks[index] += (1 << to_shift) - (1 << from_shift)
+
+    # Go through each to hex and remove pieces according to the rules (see Tronity.resolveMoves)
+
+    for shift in {BITS_PER_CELL * (upper_code & 63), BITS_PER_CELL * (lower_code & 63)}:
+
+        rock_present = ((masks[0] | masks[3]) >> shift) & NIBBLE
+        paper_present = ((masks[1] | masks[4]) >> shift) & NIBBLE
+        scissors_present = ((masks[2] | masks[5]) >> shift) & NIBBLE
+
+        if rock_present and paper_present and scissors_present:
+            defeated = (0, 1, 2)
+        elif rock_present and scissors_present:
+            defeated = (2,)
+        elif scissors_present and paper_present:
+            defeated = (1,)
+        elif paper_present and rock_present:
+            defeated = (0,)
+        else:
+            continue
+
+        clear = ~(NIBBLE << shift)
+        for symbol_index in defeated:
+            masks[symbol_index] &= clear
+            masks[3 + symbol_index] &= clear
+
+    return BitBoard(*masks)
+
+
+def invincibleTokens(upper_r, upper_p, upper_s, lower_r, lower_p, lower_s, upper_thrown_num, lower_thrown_num):
+    # (upper_invincible, lower_invincible, upper_invincible_type, lower_invincible_type), a team has an
+    # invincible token if the other team has thrown all its tokens and has none of the type that beats it.
+    # The tokens of each team and type are anything that is true if there are any on the board (a BitBoard's
+    # masks, counts), so this is the one implementation for BitBoards, Tronity's material summaries and the
+    # batch simulator's table
+
+    upper_invincible = False
+    lower_invincible = False
+
+    upper_invincible_type = None
+    lower_invincible_type = None
+
+    # Checking if upper has an invincible token
+    if lower_thrown_num == 9:
+        if upper_r and not lower_p:
+            upper_invincible, upper_invincible_type = True, "r"
+        elif upper_p and not lower_s:
+            upper_invincible, upper_invincible_type = True, "p"
+        elif upper_s and not lower_r:
+            upper_invincible, upper_invincible_type = True, "s"
+
+    # Checking if lower has an invincible token
+    if upper_thrown_num == 9:
+        if lower_r and not upper_p:
+            lower_invincible, lower_invincible_type = True, "r"
+        elif lower_p and not upper_s:
+            lower_invincible, lower_invincible_type = True, "p"
+        elif lower_s and not upper_r:
+            lower_invincible, lower_invincible_type = True, "s"
+
+    return upper_invincible, lower_invincible, upper_invincible_type, lower_invincible_type
+
+
+def hasInvincibleToken(board):
+    # Same result as Tronity.hasInvincibleToken
+    return invincibleTokens(*board)
+
+
+def gameEnded(board, turn_num):
+    # Same result as Tronity.gameEnded
+
+    upper_present = board.upper_r | board.upper_p | board.upper_s
+    lower_present = board.lower_r | board.lower_p | board.lower_s
+
+    upper_thrown_num = board.upper_thrown_num
+    lower_thrown_num = board.lower_thrown_num
+
+    # Condition 1
+    if lower_thrown_num == 9 and not lower_present:
+        if upper_thrown_num < 9 or upper_present:
+            return UPPER_WINS
+        return DRAW
+
+    if upper_thrown_num == 9 and not upper_present:
+        if lower_thrown_num < 9 or lower_present:
+            return LOWER_WINS
+        return DRAW
+
+    upper_invincible, lower_invincible = hasInvincibleToken(board)[:2]
+
+    # Condition 2
+    if upper_invincible and lower_invincible:
+        return DRAW
+
+    # Condition 3
+    if upper_invincible and tokenCount(board.lower_r) + tokenCount(board.lower_p) + tokenCount(board.lower_s) == 1:
+        return UPPER_WINS
+    if lower_invincible and tokenCount(board.upper_r) + tokenCount(board.upper_p) + tokenCount(board.upper_s) == 1:
+        return LOWER_WINS
+
+    # Condition 5
+    if turn_num >= 360:
+        return DRAW
+
+    return NOT_ENDED
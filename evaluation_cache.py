@@ -0,0 +1,105 @@
+from collections import OrderedDict
+
+from transposition import zobristKey
+from bitboard import toBoardDicts
+from symmetry import canonicalKey
+
+
+# Bounded cache of heuristic scores, for heuristic functions that only depend on the position
+# (team, pieces and throw counts), like test_board_heuristic_three.
+#
+# An EvaluationCache wraps a heuristic function and is called in its place, and can also be given to
+# a LeafBatch (batch_evaluation.py) so batched leaves are looked up before being scored. Positions are
+# keyed by their Zobrist key (see transposition.py), which only depends on how many of each piece are
+# on each hex, so the same position reached with its piece lists in a different order shares an entry.
+# The least recently used entry is dropped once there are max_entries, and the cache is kept between
+# turns, so leaves that come up again next turn aren't scored again.
+#
+# Within one batched search the LeafBatch scores a position reached by more than one leaf once, before
+# looking it up here, so the cache's hits are positions scored by earlier searches (a fraction of a
+# percent of the leaves of Player's depth 2 searches, which hardly overlap from one turn to the next).
+#
+# With symmetric=True positions are keyed by their canonical key instead (see symmetry.py), so
+# mirrored and team swapped positions share an entry. This is only right for heuristics that score
+# them the same, as test_board_heuristic_three does, and the canonical key is hashed from scratch for
+# every leaf (about twice the time test_board_heuristic_three takes).
+
+DEFAULT_MAX_ENTRIES = 1 << 16
+
+
+class EvaluationCache:
+
+    def __init__(self, heuristic_function, max_entries=DEFAULT_MAX_ENTRIES, symmetric=False):
+
+        if max_entries < 1:
+            raise ValueError('max_entries of:', max_entries, 'is not at least 1')
+
+        self.heuristic_function = heuristic_function
+        self.max_entries = max_entries
+        self.symmetric = symmetric
+
+        # Zobrist key -> score, least recently used first
+        self.scores = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __call__(self, state_node):
+
+        key = self.key(state_node)
+        score = self.lookup(key)
+
+        if score is None:
+            score = self.heuristic_function(state_node)
+            self.store(key, score)
+
+        return score
+
+    def key(self, state_node):
+        # Cache key of state_node's position, its Zobrist key (canonical key if symmetric)
+
+        if state_node.zobrist_key is not None and not self.symmetric:
+            return state_node.zobrist_key
+
+        coord_dict = state_node.coord_dict
+        if coord_dict is None:
+            coord_dict = toBoardDicts(state_node.board)[0]
+
+        if self.symmetric:
+            return canonicalKey(state_node.team, coord_dict, state_node.upper_thrown_num,
+                                state_node.lower_thrown_num)[0]
+
+        return zobristKey(state_node.team, coord_dict, state_node.upper_thrown_num, state_node.lower_thrown_num)
+
+    def lookup(self, key):
+        # Cached score for key, or None
+
+        score = self.scores.get(key)
+
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.scores.move_to_end(key)
+
+        return score
+
+    def store(self, key, score):
+
+        self.scores[key] = score
+
+        if len(self.scores) > self.max_entries:
+            self.scores.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self.scores.clear()
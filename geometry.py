@@ -0,0 +1,121 @@
+import numpy as np
+
+
+# Hex geometry tables for the 61 hexes of the board, built once at import time so that
+# move generation is a table lookup instead of tuple arithmetic and bounds checks.
+#
+# Hexes are numbered in the same order as print_board in util.py (r ascending, then q).
+
+BOARD_RANGE = range(-4, +4+1)
+
+# Directions for tiles a distance of 1 away
+ONE_TILE_DIRECTIONS = ((-1, 0), (-1,1), (0,-1), (0,1), (1,-1), (1,0))
+
+# Directions for tiles a distance of 2 away
+TWO_TILE_DIRECTIONS = ((-2, 0), (-2,2), (0,-2), (0,2), (2,-2), (2,0),
+                       (2,-1), (1,1), (-1,2), (-2,1), (-1,-1), (1,-2))
+
+CELLS = tuple((r, q) for r in BOARD_RANGE for q in BOARD_RANGE if -r-q in BOARD_RANGE)
+
+CELL_INDEX = {cell: index for index, cell in enumerate(CELLS)}
+
+# Row membership, ROW_CELLS[r] holds the hexes of row r (q ascending)
+ROW_CELLS = {r: tuple(cell for cell in CELLS if cell[0] == r) for r in BOARD_RANGE}
+
+# Rows in the order upper throws into them (row 4 first), as used by getThrowMoves
+ROW_COORDS = tuple(ROW_CELLS[r] for r in reversed(BOARD_RANGE))
+
+
+def _buildMoveTables():
+
+    neighbours = {}
+    swing_moves = {}
+
+    for cell in CELLS:
+        adjacent_tiles = tuple((cell[0] + dr, cell[1] + dq) for dr, dq in ONE_TILE_DIRECTIONS
+                               if (cell[0] + dr, cell[1] + dq) in CELL_INDEX)
+
+        neighbours[cell] = adjacent_tiles
+
+    for cell in CELLS:
+
+        # Every swing target in TWO_TILE_DIRECTIONS order with the hexes it can be swung around
+        moves = []
+        for dr, dq in TWO_TILE_DIRECTIONS:
+            tile = (cell[0] + dr, cell[1] + dq)
+            if tile not in CELL_INDEX:
+                continue
+
+            pivots = tuple(pivot for pivot in neighbours[cell] if tile in neighbours[pivot])
+            moves.append((tile, pivots))
+
+        swing_moves[cell] = tuple(moves)
+
+    return neighbours, swing_moves
+
+# NEIGHBOURS[cell] -> in bounds hexes adjacent to cell (ONE_TILE_DIRECTIONS order)
+# SWING_MOVES[cell] -> ((target, pivots), ...) for every swing target (TWO_TILE_DIRECTIONS order)
+NEIGHBOURS, SWING_MOVES = _buildMoveTables()
+
+
+def _hexDistance(c0, c1):
+    dx = c1[0] - c0[0]
+    dy = c1[1] - c0[1]
+
+    return (abs(dx) + abs(dy) + abs(dx + dy)) // 2
+
+# CELL_DISTANCE[i][j] -> distance between CELLS[i] and CELLS[j]
+CELL_DISTANCE = tuple(tuple(_hexDistance(c0, c1) for c1 in CELLS) for c0 in CELLS)
+
+# HEX_DISTANCE[c0][c1] -> the same distance keyed by coordinates
+HEX_DISTANCE = {c0: {c1: CELL_DISTANCE[i][j] for j, c1 in enumerate(CELLS)} for i, c0 in enumerate(CELLS)}
+
+DISTANCE_MATRIX = np.array(CELL_DISTANCE, dtype=np.int64)
+
+# Proximity score between two hexes, adjacent worth 2 and 2 tiles away worth 1 (see get_proximty_prey_score)
+PROXIMITY_MATRIX = np.maximum(3 - DISTANCE_MATRIX, 0)
+
+# HEX_PROXIMITY[c0][c1] -> the same proximity score keyed by coordinates
+HEX_PROXIMITY = {c0: {c1: max(3 - distance, 0) for c1, distance in row.items()} for c0, row in HEX_DISTANCE.items()}
+
+# Returned as the minimum distance when there is nothing to measure the distance to
+NO_DISTANCE = 99
+
+# Below this many (from, to) pairs plain table lookups beat the NumPy call overhead
+VECTORISE_MIN_PAIRS = 256
+
+
+def cellIndices(coords):
+    # Convert a list of (r, q) coordinates to a list of cell indices
+    return [CELL_INDEX[coord] for coord in coords]
+
+
+def distanceReductions(from_coords, to_coords, proximity=False):
+    # Distances from every hex in from_coords to every hex in to_coords, reduced over to_coords.
+    # Returns (minimum distances, sums of distances), lists with one entry per hex in from_coords.
+    # With proximity=True the proximity scores (PROXIMITY_MATRIX) are reduced instead
+
+    if len(to_coords) == 0:
+        return [NO_DISTANCE] * len(from_coords), [0] * len(from_coords)
+
+    if len(from_coords) * len(to_coords) < VECTORISE_MIN_PAIRS:
+
+        table = HEX_PROXIMITY if proximity else HEX_DISTANCE
+
+        minimums = []
+        sums = []
+
+        for coord in from_coords:
+            row = table[coord]
+            distances = [row[to_coord] for to_coord in to_coords]
+
+            minimums.append(min(distances))
+            sums.append(sum(distances))
+
+        return minimums, sums
+
+    matrix = PROXIMITY_MATRIX if proximity else DISTANCE_MATRIX
+
+    block = matrix[np.ix_(cellIndices(from_coords), cellIndices(to_coords))]
+
+    return block.min(axis=1).tolist(), block.sum(axis=1).tolist()
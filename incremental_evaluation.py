@@ -0,0 +1,173 @@
+from geometry import HEX_PROXIMITY
+
+
+# Incrementally updated version of test_board_heuristic_three (Tronity.py).
+#
+# A position's evaluation summary is the tuple (upper_proximity, lower_proximity, upper_on_board,
+# lower_on_board), where upper_proximity is get_proximty_prey_score for upper (every upper piece
+# against every lower piece of its prey type) and lower_proximity the same for lower. The rest of the
+# heuristic only needs the throw counts, so summaryHeuristic scores a position from its summary in
+# constant time, exactly as test_board_heuristic_three would.
+#
+# Like Zobrist keys (transposition.py), summaries can be updated from the undo records of
+# apply_joint_move: only the pieces on the hexes touched by the move are scored again, against the
+# pieces of their prey and predator types, instead of every pair of pieces. A summary is a tuple kept
+# by its state node, so undoing the move just goes back to the parent's summary. The searches keep
+# their states' summaries up to date from the root's (if it has one, see State_node).
+#
+# With the at most 18 tokens of a game the update costs about as much as evaluationSummary from
+# scratch, which is already about twice as fast as test_board_heuristic_three, so by default only the
+# leaves get a summary (incrementalHeuristic) and updating them is left to Player's
+# incremental_evaluation option.
+
+PREY = {"r": "s", "p": "r", "s": "p"}
+PREDATOR = {"r": "p", "p": "s", "s": "r"}
+
+# PIECE_PAIRS[piece] -> (the other team, the other team's piece type paired with piece in
+# upper_proximity, the type paired with it in lower_proximity, whether piece is lower's)
+PIECE_PAIRS = {**{piece_type: ("upper", PREDATOR[piece_type], PREY[piece_type], True) for piece_type in "rps"},
+               **{piece_type.upper(): ("lower", PREY[piece_type], PREDATOR[piece_type], False)
+                  for piece_type in "rps"}}
+
+
+def evaluationSummary(piece_dict):
+    # Summary of a whole position from scratch
+
+    upper = piece_dict["upper"]
+    lower = piece_dict["lower"]
+
+    upper_proximity = 0
+    lower_proximity = 0
+
+    for piece_type in "rps":
+        prey_type = PREY[piece_type]
+
+        for coord in upper[piece_type]:
+            proximities = HEX_PROXIMITY[coord]
+            for prey_coord in lower[prey_type]:
+                upper_proximity += proximities[prey_coord]
+
+        for coord in lower[piece_type]:
+            proximities = HEX_PROXIMITY[coord]
+            for prey_coord in upper[prey_type]:
+                lower_proximity += proximities[prey_coord]
+
+    upper_on_board = len(upper["r"]) + len(upper["p"]) + len(upper["s"])
+    lower_on_board = len(lower["r"]) + len(lower["p"]) + len(lower["s"])
+
+    return upper_proximity, lower_proximity, upper_on_board, lower_on_board
+
+
+def _changedPairsProximity(changed_pieces):
+    # (upper proximity, lower proximity) of the pairs of two of changed_pieces ((coord, piece) pairs)
+
+    upper_proximity = 0
+    lower_proximity = 0
+
+    for coord, piece in changed_pieces:
+        if piece not in PREY:
+            continue
+
+        proximities = HEX_PROXIMITY[coord]
+        prey, predator = PREY[piece].upper(), PREDATOR[piece].upper()
+
+        for other_coord, other_piece in changed_pieces:
+            if other_piece == prey:
+                lower_proximity += proximities[other_coord]
+            elif other_piece == predator:
+                upper_proximity += proximities[other_coord]
+
+    return upper_proximity, lower_proximity
+
+
+def updateEvaluationSummary(summary, undo_record, coord_dict, piece_dict):
+    # Summary of the position after apply_joint_move, given the summary from before it. undo_record is
+    # the record apply_joint_move returned, coord_dict and piece_dict are the position after the move
+
+    touched_hexes, old_piece_lists, _, _ = undo_record
+
+    upper_proximity, lower_proximity, upper_on_board, lower_on_board = summary
+
+    # Piece lists from before the move
+    old_piece_dict = {"upper": piece_dict["upper"].copy(), "lower": piece_dict["lower"].copy()}
+    for (team, piece_type), coords in old_piece_lists.items():
+        old_piece_dict[team][piece_type] = coords
+
+    # The pieces on the touched hexes are taken off the board they were on and put on the new one. Each
+    # piece's pairs are taken off (or added) with it, so pairs of two of them are counted twice
+    removed = []
+    added = []
+
+    for coord, old_pieces in touched_hexes.items():
+        new_pieces = coord_dict.get(coord)
+
+        if old_pieces == new_pieces:
+            continue
+
+        proximity = HEX_PROXIMITY[coord].__getitem__
+
+        if old_pieces:
+            for piece in old_pieces:
+                removed.append((coord, piece))
+
+                other_team, upper_type, lower_type, is_lower = PIECE_PAIRS[piece]
+                other_pieces = old_piece_dict[other_team]
+
+                upper_proximity -= sum(map(proximity, other_pieces[upper_type]))
+                lower_proximity -= sum(map(proximity, other_pieces[lower_type]))
+
+                if is_lower:
+                    lower_on_board -= 1
+                else:
+                    upper_on_board -= 1
+
+        if new_pieces:
+            for piece in new_pieces:
+                added.append((coord, piece))
+
+                other_team, upper_type, lower_type, is_lower = PIECE_PAIRS[piece]
+                other_pieces = piece_dict[other_team]
+
+                upper_proximity += sum(map(proximity, other_pieces[upper_type]))
+                lower_proximity += sum(map(proximity, other_pieces[lower_type]))
+
+                if is_lower:
+                    lower_on_board += 1
+                else:
+                    upper_on_board += 1
+
+    removed_upper, removed_lower = _changedPairsProximity(removed)
+    added_upper, added_lower = _changedPairsProximity(added)
+
+    return (upper_proximity + removed_upper - added_upper, lower_proximity + removed_lower - added_lower,
+            upper_on_board, lower_on_board)
+
+
+def summaryHeuristic(team, summary, upper_thrown_num, lower_thrown_num):
+    # test_board_heuristic_three of the position with this summary
+
+    upper_proximity, lower_proximity, upper_on_board, lower_on_board = summary
+
+    # board_throw_ratio's piece counts
+    upper_count = 9 - upper_thrown_num + upper_on_board
+    lower_count = 9 - lower_thrown_num + lower_on_board
+
+    if upper_count == 0:
+        upper_count = 0.5
+    if lower_count == 0:
+        lower_count = 0.5
+
+    if team == "upper":
+        return upper_count / lower_count * (4 * (lower_thrown_num - lower_on_board) + upper_proximity)
+
+    return lower_count / upper_count * (4 * (upper_thrown_num - upper_on_board) + lower_proximity)
+
+
+def incrementalHeuristic(state_node):
+    # test_board_heuristic_three, from state_node's evaluation summary if it has one
+
+    summary = state_node.evaluation_summary
+    if summary is None:
+        summary = evaluationSummary(state_node.piece_dict)
+
+    return summaryHeuristic(state_node.team, summary, state_node.upper_thrown_num, state_node.lower_thrown_num)
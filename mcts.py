@@ -0,0 +1,255 @@
+import math
+import random
+import time
+from array import array
+
+from bitboard import getPossibleMoveCodes, resolveMoveCodes, gameEnded, tokenCount
+from bitboard import BITS_PER_CELL, NIBBLE
+from bitboard import UPPER_WINS, LOWER_WINS, DRAW, NOT_ENDED
+from moves import THROW, encodeMove, decodeMove
+
+
+# Decoupled UCT Monte Carlo tree search for the simultaneous moves of RoPaSci 360, on BitBoards.
+#
+# Every node keeps separate bandit statistics for upper and for lower: each player picks its own
+# move with UCB1 from its own visit counts and total rewards, as if the other player's choice were
+# part of the environment, and the pair of moves selects (or creates) the child. From a new child a
+# playout is run to the end of the game or to a capped depth, and the reward is backed up along the
+# path. Rewards are from upper's point of view, 1 for a win, 0 for a loss and 0.5 for a draw, lower's
+# statistics use 1 - reward.
+#
+# Moves are move codes (see moves.py) everywhere below mctsSearch, which takes and returns move tuples.
+
+# Exploration constant of UCB1
+EXPLORATION = math.sqrt(2)
+
+# Joint moves played by a playout before it is scored with playoutValue
+MAX_PLAYOUT_DEPTH = 20
+
+# Iterations run when neither a time budget nor an iteration count is given
+DEFAULT_ITERATIONS = 1000
+
+# Playout policies, "capture" plays a capturing move whenever it has one, "random" never looks
+PLAYOUT_POLICIES = ("random", "capture")
+
+# Index of the prey of each symbol in a BitBoard team ("r", "p", "s" order)
+PREY_INDEX = (2, 0, 1)
+
+RESULT_REWARDS = {UPPER_WINS: 1.0, LOWER_WINS: 0.0, DRAW: 0.5}
+
+
+class MCTS_node:
+    __slots__ = ("board", "turn_num", "result", "upper_moves", "lower_moves", "upper_visits", "upper_totals",
+                 "lower_visits", "lower_totals", "upper_untried", "lower_untried", "visits", "children")
+
+    def __init__(self, board, turn_num, rng, upper_moves=None, lower_moves=None):
+
+        self.board = board
+        self.turn_num = turn_num
+
+        self.result = gameEnded(board, turn_num)
+
+        if upper_moves is None:
+            upper_moves = getPossibleMoveCodes(board, "upper")
+        if lower_moves is None:
+            lower_moves = getPossibleMoveCodes(board, "lower")
+
+        self.upper_moves = upper_moves
+        self.lower_moves = lower_moves
+
+        # Per move bandit statistics of each player
+        self.upper_visits = [0] * len(upper_moves)
+        self.upper_totals = [0.0] * len(upper_moves)
+        self.lower_visits = [0] * len(lower_moves)
+        self.lower_totals = [0.0] * len(lower_moves)
+
+        # Move indices not tried yet, in random order (each is tried once before UCB1 is used)
+        self.upper_untried = list(range(len(upper_moves)))
+        self.lower_untried = list(range(len(lower_moves)))
+        rng.shuffle(self.upper_untried)
+        rng.shuffle(self.lower_untried)
+
+        self.visits = 0
+
+        # (upper move index, lower move index) -> child MCTS_node
+        self.children = {}
+
+
+def selectMove(visits, totals, untried, node_visits, exploration):
+    # Index of the move to play with UCB1
+
+    if untried:
+        return untried.pop()
+
+    log_visits = math.log(node_visits)
+
+    best_index = 0
+    best_value = -math.inf
+
+    for index, move_visits in enumerate(visits):
+        value = totals[index] / move_visits + exploration * math.sqrt(log_visits / move_visits)
+        if value > best_value:
+            best_index, best_value = index, value
+
+    return best_index
+
+
+def playoutValue(board):
+    # Reward of an unfinished game at the end of a playout, upper's share of the tokens left to play
+    # (on the board or still to be thrown)
+
+    upper_tokens = 9 - board.upper_thrown_num + tokenCount(board.upper_r) + tokenCount(board.upper_p) + \
+                   tokenCount(board.upper_s)
+    lower_tokens = 9 - board.lower_thrown_num + tokenCount(board.lower_r) + tokenCount(board.lower_p) + \
+                   tokenCount(board.lower_s)
+
+    if upper_tokens + lower_tokens == 0:
+        return 0.5
+
+    return upper_tokens / (upper_tokens + lower_tokens)
+
+
+def capturingMoves(moves, board, team):
+    # Move codes in moves that land on a hex holding the opponent's prey of the moving token
+
+    offset, enemy_offset = (0, 3) if team == "upper" else (3, 0)
+
+    captures = array("H")
+
+    for move in moves:
+        to_shift = BITS_PER_CELL * (move & 63)
+
+        if move >> 14 == THROW:
+            symbol_index = (move >> 12) & 3
+        else:
+            from_shift = BITS_PER_CELL * ((move >> 6) & 63)
+            for symbol_index in range(3):
+                if (board[offset + symbol_index] >> from_shift) & NIBBLE:
+                    break
+
+        if (board[enemy_offset + PREY_INDEX[symbol_index]] >> to_shift) & NIBBLE:
+            captures.append(move)
+
+    return captures
+
+
+def playout(board, turn_num, rng, max_depth=MAX_PLAYOUT_DEPTH, policy="random"):
+    # Play random joint moves from board until the game ends or max_depth joint moves were played,
+    # returns the reward for upper
+
+    for _ in range(max_depth):
+
+        result = gameEnded(board, turn_num)
+        if result != NOT_ENDED:
+            return RESULT_REWARDS[result]
+
+        upper_moves = getPossibleMoveCodes(board, "upper")
+        lower_moves = getPossibleMoveCodes(board, "lower")
+
+        if policy == "capture":
+            upper_moves = capturingMoves(upper_moves, board, "upper") or upper_moves
+            lower_moves = capturingMoves(lower_moves, board, "lower") or lower_moves
+
+        board = resolveMoveCodes(rng.choice(upper_moves), rng.choice(lower_moves), board)
+        turn_num += 1
+
+    result = gameEnded(board, turn_num)
+    if result != NOT_ENDED:
+        return RESULT_REWARDS[result]
+
+    return playoutValue(board)
+
+
+def mctsSearch(board, team, turn_num, time_budget=None, iterations=None, upper_moves=None, lower_moves=None,
+               max_playout_depth=MAX_PLAYOUT_DEPTH, policy="random", exploration=EXPLORATION, rng=None):
+    # Decoupled UCT search from board for team, turn_num is the turn about to be played. Runs until
+    # time_budget seconds have passed or iterations iterations are done (whichever comes first, or
+    # DEFAULT_ITERATIONS if neither is given). upper_moves/lower_moves restrict the moves tried at
+    # the root (e.g. to those of a pruning function), by default every legal move is tried.
+
+    # Returns (move, stats), move is team's most visited root move and stats is a dict with the
+    # iterations run, the time taken and the playouts per second.
+
+    # Random choices are made with rng (a random.Random), the random module's own generator if None, so
+    # random.seed makes searches with a fixed number of iterations repeatable.
+
+    if policy not in PLAYOUT_POLICIES:
+        raise ValueError('policy of:', policy, 'is not one of', PLAYOUT_POLICIES)
+
+    if rng is None:
+        rng = random
+
+    if time_budget is None and iterations is None:
+        iterations = DEFAULT_ITERATIONS
+
+    start = time.monotonic()
+    deadline = None if time_budget is None else start + time_budget
+
+    if upper_moves is not None:
+        upper_moves = array("H", map(encodeMove, upper_moves))
+    if lower_moves is not None:
+        lower_moves = array("H", map(encodeMove, lower_moves))
+
+    root = MCTS_node(board, turn_num, rng, upper_moves, lower_moves)
+
+    iterations_run = 0
+
+    while (iterations is None or iterations_run < iterations) and \
+            (deadline is None or time.monotonic() < deadline):
+
+        # Selection, each player picks its own move until a new joint move (or the end of the game)
+        path = []
+        node = root
+
+        while node.result == NOT_ENDED:
+
+            upper_index = selectMove(node.upper_visits, node.upper_totals, node.upper_untried, node.visits,
+                                     exploration)
+            lower_index = selectMove(node.lower_visits, node.lower_totals, node.lower_untried, node.visits,
+                                     exploration)
+
+            path.append((node, upper_index, lower_index))
+
+            child = node.children.get((upper_index, lower_index))
+
+            if child is None:
+                # Expansion and playout
+                child_board = resolveMoveCodes(node.upper_moves[upper_index], node.lower_moves[lower_index],
+                                               node.board)
+                child = MCTS_node(child_board, node.turn_num + 1, rng)
+                node.children[(upper_index, lower_index)] = child
+                node = child
+                break
+
+            node = child
+
+        if node.result != NOT_ENDED:
+            reward = RESULT_REWARDS[node.result]
+        else:
+            reward = playout(node.board, node.turn_num, rng, max_playout_depth, policy)
+
+        node.visits += 1
+
+        # Backpropagation, to both players' statistics
+        for path_node, upper_index, lower_index in path:
+            path_node.visits += 1
+            path_node.upper_visits[upper_index] += 1
+            path_node.upper_totals[upper_index] += reward
+            path_node.lower_visits[lower_index] += 1
+            path_node.lower_totals[lower_index] += 1 - reward
+
+        iterations_run += 1
+
+    elapsed = time.monotonic() - start
+
+    if team == "upper":
+        moves, visits = root.upper_moves, root.upper_visits
+    else:
+        moves, visits = root.lower_moves, root.lower_visits
+
+    move = decodeMove(moves[max(range(len(moves)), key=visits.__getitem__)])
+
+    stats = {"iterations": iterations_run, "seconds": elapsed,
+             "playouts_per_second": iterations_run / elapsed if elapsed > 0 else 0.0}
+
+    return move, stats
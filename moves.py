@@ -0,0 +1,98 @@
+from array import array
+from itertools import chain
+
+from geometry import CELLS, CELL_INDEX, NEIGHBOURS, SWING_MOVES, ROW_COORDS
+
+
+# Integer encoding of moves.
+#
+# Player.action and Player.update use move tuples, ("THROW", symbol, to) and ("SLIDE" or "SWING", from,
+# to), and so does everything in Tronity.py that works on coord_dict/piece_dict: the tree searches, the
+# pruning functions and apply_joint_move/resolveMoves (the pruning functions read the tuples' fields
+# throughout, and search trees and pondering look moves up by their tuples). Only the BitBoard engines
+# (bitboard.py, mcts.py, tablebase.py, batch_simulator.py) and the opening book use 16 bit codes:
+#
+#     2 bits move type | 2 bits thrown symbol | 6 bits from hex | 6 bits to hex
+#
+# with hexes numbered as in geometry.py (the from hex of a throw is 0), and keep lists of moves as
+# array("H") buffers. encodeMove and decodeMove convert between the two where a move crosses over.
+#
+# TODO: use codes in Tronity.py's searches as well, converting only in Player.action and Player.update.
+# Not done yet, it needs (in this order, each step keeping the seeded search tests' exact scores):
+#   1. apply_joint_move, undo_joint_move and resolveMoves taking codes (THROW_CODES, SLIDE_CODES and
+#      SWING_CODES replace getThrowMoves and getValidMovesForPiece)
+#   2. test_pruning_three and its helpers returning array("H") codes, in the same order so their random
+#      choices are the same (they read move[0], move[1] and move[2] throughout)
+#   3. the move nodes, descendStateTree, pondering and getBestMove keeping codes, and parallelRootSearch
+#      sending codes to its workers
+#   4. Player.action decoding its chosen move, Player.update encoding the joint move played, and the
+#      opening book, tablebaseMove and mctsSearch handing their codes over without decoding them
+
+MOVE_TYPES = ("THROW", "SLIDE", "SWING")
+THROW_SYMBOLS = ("r", "p", "s")
+
+# Move type of a code, code >> 14
+THROW = 0
+SLIDE = 1
+SWING = 2
+
+
+def encodeMove(move):
+    # ("THROW", symbol, to) / ("SLIDE" or "SWING", from, to) -> 16 bit int
+
+    move_type = MOVE_TYPES.index(move[0])
+
+    if move_type == THROW:
+        symbol, from_cell = THROW_SYMBOLS.index(move[1]), 0
+    else:
+        symbol, from_cell = 0, CELL_INDEX[move[1]]
+
+    return (move_type << 14) | (symbol << 12) | (from_cell << 6) | CELL_INDEX[move[2]]
+
+
+def _decodeMove(code):
+
+    move_type = code >> 14
+    to_pos = CELLS[code & 63]
+
+    if move_type == THROW:
+        return ("THROW", THROW_SYMBOLS[(code >> 12) & 3], to_pos)
+
+    return (MOVE_TYPES[move_type], CELLS[(code >> 6) & 63], to_pos)
+
+
+def _buildMoveTables():
+    # THROW_MOVES[team][thrown_num] -> the throws team can make, in Tronity.getThrowMoves order (row by
+    # row in ROW_COORDS order), THROW_CODES[team][thrown_num] -> their codes.
+    # SLIDE_CODES[cell index] -> codes of the slides from that hex (NEIGHBOURS order),
+    # SWING_CODES[cell index] -> (code, pivot cell indices) of the swings from it (SWING_MOVES order)
+
+    def throws(rows):
+        return tuple(("THROW", symbol, coord) for row in rows for coord in row for symbol in THROW_SYMBOLS)
+
+    throw_moves = {"upper": tuple(throws(ROW_COORDS[:thrown_num + 1]) for thrown_num in range(9)) + ((),),
+                   "lower": tuple(throws(ROW_COORDS[8 - thrown_num:]) for thrown_num in range(9)) + ((),)}
+
+    throw_codes = {team: tuple(array("H", map(encodeMove, moves)) for moves in team_moves)
+                   for team, team_moves in throw_moves.items()}
+
+    slide_codes = tuple(array("H", (encodeMove(("SLIDE", cell, tile)) for tile in NEIGHBOURS[cell]))
+                        for cell in CELLS)
+
+    swing_codes = tuple(tuple((encodeMove(("SWING", cell, tile)), tuple(CELL_INDEX[pivot] for pivot in pivots))
+                              for tile, pivots in SWING_MOVES[cell])
+                        for cell in CELLS)
+
+    return throw_moves, throw_codes, slide_codes, swing_codes
+
+THROW_MOVES, THROW_CODES, SLIDE_CODES, SWING_CODES = _buildMoveTables()
+
+# Code -> move tuple, for every move there is
+DECODED_MOVES = {code: _decodeMove(code)
+                 for code in chain(THROW_CODES["upper"][8], chain.from_iterable(SLIDE_CODES),
+                                   (code for swings in SWING_CODES for code, _ in swings))}
+
+
+def decodeMove(code):
+    # Inverse of encodeMove
+    return DECODED_MOVES[code]
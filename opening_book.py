@@ -0,0 +1,183 @@
+import argparse
+import os
+import random
+import struct
+import sys
+from array import array
+
+from moves import encodeMove, decodeMove
+from transposition import zobristKey
+from symmetry import canonicalKey, transformMove
+
+
+# Opening book, the moves to play in early positions worked out offline by a deeper search than
+# Player.action can afford.
+#
+# The book maps a position's canonical key (see symmetry.py, it includes the team to move) to a move
+# code (see moves.py), so mirrored and team swapped positions share one entry. Moves are stored for
+# the position's canonical transform and mapped back when looked up. On disk it is a header followed
+# by the sorted keys (unsigned 64-bit) and then the moves (unsigned 16-bit), little-endian. It is
+# loaded into a dict, so lookups are O(1).
+#
+# Books are made by following our book move and every reply the pruning function gives the opponent,
+# from the empty board for the given number of turns, for both teams:
+#
+#     python opening_book.py --turns 3 --depth 3 --output opening_book.bin
+
+BOOK_MAGIC = b"RPSBOOK2"
+
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+# Turns Player looks moves up in the book for, the turns opening_book.bin was generated for
+BOOK_TURNS = 3
+
+
+class OpeningBook:
+
+    def __init__(self, entries=None):
+        # Canonical key -> encoded move (for the canonical transform of the position)
+        self.entries = {} if entries is None else entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, team, coord_dict, upper_thrown_num, lower_thrown_num):
+        # Book move for team in this position, or None if the position isn't in the book
+        key, transform = canonicalKey(team, coord_dict, upper_thrown_num, lower_thrown_num)
+        code = self.entries.get(key)
+        return None if code is None else transformMove(transform, decodeMove(code))
+
+    def add(self, team, coord_dict, upper_thrown_num, lower_thrown_num, move):
+        key, transform = canonicalKey(team, coord_dict, upper_thrown_num, lower_thrown_num)
+        self.entries[key] = encodeMove(transformMove(transform, move))
+
+
+def writeOpeningBook(opening_book, path):
+
+    keys = array("Q", sorted(opening_book.entries))
+    moves = array("H", (opening_book.entries[key] for key in keys))
+
+    if sys.byteorder != "little":
+        keys.byteswap()
+        moves.byteswap()
+
+    with open(path, "wb") as file:
+        file.write(BOOK_MAGIC + struct.pack("<I", len(keys)))
+        file.write(keys.tobytes())
+        file.write(moves.tobytes())
+
+
+def loadOpeningBook(path=DEFAULT_BOOK_PATH):
+    # OpeningBook read from path, or None if there is no file at path
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as file:
+        data = file.read()
+
+    if data[:len(BOOK_MAGIC)] != BOOK_MAGIC:
+        raise ValueError('file of:', path, 'is not an opening book')
+
+    count, = struct.unpack_from("<I", data, len(BOOK_MAGIC))
+    keys_start = len(BOOK_MAGIC) + 4
+    moves_start = keys_start + 8 * count
+
+    keys = array("Q", data[keys_start:moves_start])
+    moves = array("H", data[moves_start:moves_start + 2 * count])
+
+    if sys.byteorder != "little":
+        keys.byteswap()
+        moves.byteswap()
+
+    return OpeningBook(dict(zip(keys, moves)))
+
+
+def generateOpeningBook(turns, depth, seed=0, log=None):
+    # Search every position reachable in the first turns turns by playing the book move against each
+    # of the opponent's pruned replies, depth plies deep, and return the OpeningBook of the best moves.
+    # log, if given, is called with a message after each position
+
+    # Imported here because Tronity.py imports this module
+    from Tronity import State_node, getEmptyBoardConfigs, resolveMoves, streamingSearch, getBestMove
+    from Tronity import test_pruning_three, test_board_heuristic_three
+    from transposition import TranspositionTable
+
+    random.seed(seed)
+
+    opening_book = OpeningBook()
+    transposition_table = TranspositionTable()
+
+    for team in ("upper", "lower"):
+
+        coord_dict, piece_dict = getEmptyBoardConfigs()
+        positions = [(coord_dict, piece_dict, 0, 0)]
+
+        for turn_num in range(1, turns + 1):
+
+            next_positions = []
+
+            # Zobrist keys of the positions of this turn already expanded
+            expanded = set()
+
+            for coord_dict, piece_dict, upper_thrown_num, lower_thrown_num in positions:
+
+                position_key = zobristKey(team, coord_dict, upper_thrown_num, lower_thrown_num)
+                if position_key in expanded:
+                    # Reached by another line
+                    continue
+                expanded.add(position_key)
+
+                root_state = State_node(team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, [],
+                                        None, 0)
+
+                # Only searched if it isn't a transform of a position already in the book
+                move = opening_book.lookup(team, coord_dict, upper_thrown_num, lower_thrown_num)
+
+                if move is None:
+                    transposition_table.new_search()
+
+                    streamingSearch(root_state, depth, test_pruning_three, test_board_heuristic_three, turn_num,
+                                    transposition_table)
+                    move = getBestMove(root_state, randomly_choose_tie=False)
+
+                    opening_book.add(team, coord_dict, upper_thrown_num, lower_thrown_num, move)
+
+                    if log is not None:
+                        log("{} turn {}: {} ({} positions)".format(team, turn_num, move, len(opening_book)))
+
+                if turn_num == turns:
+                    continue
+
+                moves_upper, moves_lower = test_pruning_three(root_state)
+
+                for reply in (moves_lower if team == "upper" else moves_upper):
+                    upper_move, lower_move = (move, reply) if team == "upper" else (reply, move)
+
+                    next_positions.append(resolveMoves(upper_move, lower_move, coord_dict, upper_thrown_num,
+                                                       lower_thrown_num))
+
+            positions = next_positions
+
+    return opening_book
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Generate an opening book.")
+    parser.add_argument("--turns", type=int, default=3, help="turns covered by the book (default 3)")
+    parser.add_argument("--depth", type=int, default=3, help="search depth of each book move (default 3)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the pruning function's random choices")
+    parser.add_argument("--output", default=DEFAULT_BOOK_PATH, help="book file to write")
+    args = parser.parse_args()
+
+    opening_book = generateOpeningBook(args.turns, args.depth, args.seed,
+                                       log=lambda message: print(message, file=sys.stderr))
+
+    writeOpeningBook(opening_book, args.output)
+
+    print("{} positions written to {}".format(len(opening_book), args.output), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import time
+
+
+# Statistics of one search, filled in by the search functions of Tronity.py when they are given a
+# SearchStats (search_stats=None, the default, skips all of it).
+
+class SearchStats:
+    __slots__ = ("nodes_expanded", "leaves_evaluated", "game_ended_cutoffs", "transposition_hits",
+                 "primary_moves", "secondary_moves", "live_states", "peak_states",
+                 "pruning_time", "resolve_time", "evaluation_time", "scoring_time", "total_time", "start_time")
+
+    def __init__(self):
+
+        # States whose moves were generated (with the pruning function)
+        self.nodes_expanded = 0
+
+        # States scored with the heuristic function
+        self.leaves_evaluated = 0
+
+        # States not expanded because the game had ended
+        self.game_ended_cutoffs = 0
+
+        # States whose score was found in the transposition table, or that take their scores from the same
+        # state earlier in the tree (see State_node.transposed_state)
+        self.transposition_hits = 0
+
+        # Moves kept by the pruning function over all expanded states (see the branching properties)
+        self.primary_moves = 0
+        self.secondary_moves = 0
+
+        # State nodes alive during the search (buildStateTree keeps every state, streaming searches only
+        # those on the current path), and the most that were alive at once
+        self.live_states = 1
+        self.peak_states = 1
+
+        # Seconds spent in the pruning function, applying and undoing joint moves, evaluating leaves,
+        # calculating move scores from an already built tree, and in the whole search
+        self.pruning_time = 0.0
+        self.resolve_time = 0.0
+        self.evaluation_time = 0.0
+        self.scoring_time = 0.0
+        self.total_time = 0.0
+
+        self.start_time = time.perf_counter()
+
+    def addExpansion(self, primary_move_count, secondary_move_count):
+        self.nodes_expanded += 1
+        self.primary_moves += primary_move_count
+        self.secondary_moves += secondary_move_count
+
+    def addState(self):
+        self.live_states += 1
+        if self.live_states > self.peak_states:
+            self.peak_states = self.live_states
+
+    def releaseState(self):
+        self.live_states -= 1
+
+    def finish(self):
+        # Call once the search is done to set total_time
+        self.total_time = time.perf_counter() - self.start_time
+
+    @property
+    def primary_branching(self):
+        # Average number of primary moves (the searching team's) kept per expanded state
+        return self.primary_moves / self.nodes_expanded if self.nodes_expanded else 0.0
+
+    @property
+    def secondary_branching(self):
+        # Average number of secondary moves (the opponent's) kept per expanded state
+        return self.secondary_moves / self.nodes_expanded if self.nodes_expanded else 0.0
+
+    def asDict(self):
+        # Plain dict of the statistics, e.g. for logging as JSON
+        return {"nodes_expanded": self.nodes_expanded, "leaves_evaluated": self.leaves_evaluated,
+                "game_ended_cutoffs": self.game_ended_cutoffs, "transposition_hits": self.transposition_hits,
+                "peak_states": self.peak_states, "primary_branching": self.primary_branching,
+                "secondary_branching": self.secondary_branching, "pruning_time": self.pruning_time,
+                "resolve_time": self.resolve_time, "evaluation_time": self.evaluation_time,
+                "scoring_time": self.scoring_time, "total_time": self.total_time}
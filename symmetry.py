@@ -0,0 +1,94 @@
+from collections import defaultdict as dd
+
+from geometry import CELLS
+from transposition import hexKey, ZOBRIST_UPPER_THROWN, ZOBRIST_LOWER_THROWN, ZOBRIST_TEAM
+
+
+# Symmetries of the game, used to store one entry per class of equivalent positions.
+#
+# Reflecting every row, (r, q) -> (r, -r-q), keeps each hex in its row, so it keeps both teams'
+# throwing rows and maps every move to a move. Rotating the board half a turn, (r, q) -> (-r, -q),
+# while swapping the teams (the case of every piece, the throw counts and the team to move) maps
+# upper's throwing rows onto lower's. Together with their combination and the identity these are the
+# 4 transforms, numbered by the MIRROR and SWAP bits. Each is its own inverse, so a move is mapped
+# back from a transformed position with the same transform.
+#
+# A position's canonical key is the smallest Zobrist key (see transposition.py) of its 4 transforms,
+# and its canonical transform is the one that gives it.
+
+IDENTITY = 0
+MIRROR = 1
+SWAP = 2
+
+TRANSFORMS = (IDENTITY, MIRROR, SWAP, MIRROR | SWAP)
+
+OTHER_TEAM = {"upper": "lower", "lower": "upper"}
+
+
+def transformCell(cell, transform):
+
+    r, q = cell
+
+    if transform & MIRROR:
+        q = -r - q
+    if transform & SWAP:
+        r, q = -r, -q
+
+    return (r, q)
+
+
+# CELL_TRANSFORMS[transform][cell] -> transformed cell
+CELL_TRANSFORMS = tuple({cell: transformCell(cell, transform) for cell in CELLS} for transform in TRANSFORMS)
+
+
+def transformPosition(transform, team, coord_dict, upper_thrown_num, lower_thrown_num):
+    # (team, coord_dict, upper_thrown_num, lower_thrown_num) of the transformed position, coord_dict is
+    # not modified
+
+    cell_map = CELL_TRANSFORMS[transform]
+    new_coord_dict = dd(list)
+
+    for coord, pieces in coord_dict.items():
+        if pieces:
+            if transform & SWAP:
+                pieces = [piece.swapcase() for piece in pieces]
+            new_coord_dict[cell_map[coord]] = list(pieces)
+
+    if transform & SWAP:
+        return OTHER_TEAM[team], new_coord_dict, lower_thrown_num, upper_thrown_num
+
+    return team, new_coord_dict, upper_thrown_num, lower_thrown_num
+
+
+def transformMove(transform, move):
+    # Move in the transformed position, and the move back from it (transforms are their own inverse)
+
+    cell_map = CELL_TRANSFORMS[transform]
+
+    if move[0] == "THROW":
+        return ("THROW", move[1], cell_map[move[2]])
+
+    return (move[0], cell_map[move[1]], cell_map[move[2]])
+
+
+def canonicalKey(team, coord_dict, upper_thrown_num, lower_thrown_num):
+    # (canonical key, canonical transform) of the position, positions that are transforms of each other
+    # have the same canonical key
+
+    key = ZOBRIST_TEAM[team] ^ ZOBRIST_UPPER_THROWN[upper_thrown_num] ^ ZOBRIST_LOWER_THROWN[lower_thrown_num]
+    swapped_key = (ZOBRIST_TEAM[OTHER_TEAM[team]] ^ ZOBRIST_UPPER_THROWN[lower_thrown_num] ^
+                   ZOBRIST_LOWER_THROWN[upper_thrown_num])
+
+    keys = [key, key, swapped_key, swapped_key]
+
+    for coord, pieces in coord_dict.items():
+        if pieces:
+            swapped_pieces = [piece.swapcase() for piece in pieces]
+
+            for transform in TRANSFORMS:
+                keys[transform] ^= hexKey(CELL_TRANSFORMS[transform][coord],
+                                          swapped_pieces if transform & SWAP else pieces)
+
+    key = min(keys)
+
+    return key, keys.index(key)
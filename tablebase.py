@@ -0,0 +1,366 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from itertools import combinations_with_replacement
+from math import comb
+
+import numpy as np
+
+from geometry import CELLS, CELL_INDEX
+from bitboard import BitBoard, CELL_SHIFT, NIBBLE, occupiedCells, getPossibleMoveCodes, resolveMoveCodes, gameEnded
+from bitboard import fromBoardDicts
+from bitboard import UPPER_WINS, LOWER_WINS, DRAW, NOT_ENDED
+from moves import decodeMove
+
+
+# Endgame tablebase for positions where both teams have thrown all 9 tokens and at most max_tokens
+# tokens are left on the board.
+#
+# Every such position has an entry with its result and the number of joint moves to it. A position
+# is an upper win if upper has a move that wins (or leads to a position that is an upper win)
+# whatever lower plays, and the same for lower, so a win can be forced even by a team that has to
+# show its move first. Positions where neither team can force a win are draws. Distances ignore the
+# 360 turn limit.
+#
+# Results are found by retrograde analysis: ended positions are scored by gameEnded, then every sweep
+# over the positions that haven't ended finds those won in one more joint move, until a sweep finds
+# none. Sweeps work on a flat array of the child index of every joint move, with NumPy.
+#
+# A position's index is the rank of the multiset of its tokens (each token is one of 6 kinds (team,
+# symbol) on one of 61 hexes), which numbers the positions with k tokens 0, 1, ... with no gaps, after
+# the positions with fewer tokens. The table is stored as one 16 bit entry per index, after a header,
+# and is memory-mapped when probed. With max_tokens=3 the table has 8.3 million entries (16MB), of
+# which about 670 thousand are positions that haven't ended, generating it takes about 10 minutes.
+#
+#     python tablebase.py --max-tokens 3
+
+TABLEBASE_MAGIC = b"RPSTB001"
+
+DEFAULT_TABLEBASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase.bin")
+
+DEFAULT_MAX_TOKENS = 3
+
+# Number of token kinds (team and symbol, in BitBoard order) times the number of hexes
+TOKEN_IDS = 6 * len(CELLS)
+
+# Entry layout: result code in the top 2 bits, distance in the other 14
+RESULT_SHIFT = 14
+DISTANCE_MASK = (1 << RESULT_SHIFT) - 1
+
+# Result codes, 0 is used for entries that aren't positions (e.g. two symbols on one hex)
+NO_POSITION = 0
+RESULT_CODES = {UPPER_WINS: 1, LOWER_WINS: 2, DRAW: 3}
+CODE_RESULTS = {code: result for result, code in RESULT_CODES.items()}
+
+# Score given by tablebaseHeuristic to a forced win (less the distance to it)
+TABLEBASE_WIN_SCORE = 500
+
+
+def tableBases(max_tokens):
+    # bases[k] -> index of the first position with k tokens (the last entry is the table size)
+    bases = [0]
+    for token_count in range(max_tokens + 1):
+        bases.append(bases[-1] + comb(TOKEN_IDS + token_count - 1, token_count))
+    return bases
+
+
+def tokenIds(board):
+    # Sorted token ids of board, a token of kind m (BitBoard field) on CELLS[c] has id m * 61 + c
+
+    token_ids = []
+
+    for kind in range(6):
+        mask = board[kind]
+        for cell in occupiedCells(mask):
+            token_ids += [kind * len(CELLS) + CELL_INDEX[cell]] * ((mask >> CELL_SHIFT[cell]) & NIBBLE)
+
+    return token_ids
+
+
+def positionIndex(token_ids, bases):
+    # Rank of the multiset of sorted token ids (combinatorial number system), after smaller positions
+    index = bases[len(token_ids)]
+    for i, token_id in enumerate(token_ids):
+        index += comb(token_id + i, i + 1)
+    return index
+
+
+def boardFromTokenIds(token_ids):
+    # BitBoard (both teams have thrown 9) of the token ids, or None if a hex holds two different symbols
+
+    masks = [0, 0, 0, 0, 0, 0]
+    symbols = {}
+
+    for token_id in token_ids:
+        kind, cell = divmod(token_id, len(CELLS))
+
+        if symbols.setdefault(cell, kind % 3) != kind % 3:
+            return None
+
+        masks[kind] += 1 << CELL_SHIFT[CELLS[cell]]
+
+    return BitBoard(*masks, 9, 9)
+
+
+class Tablebase:
+
+    def __init__(self, path=DEFAULT_TABLEBASE_PATH):
+
+        self.path = path
+
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_size = len(TABLEBASE_MAGIC) + 8
+
+        if self.map[:len(TABLEBASE_MAGIC)] != TABLEBASE_MAGIC:
+            raise ValueError('file of:', path, 'is not a tablebase')
+
+        self.max_tokens, entry_count = struct.unpack_from("<II", self.map, len(TABLEBASE_MAGIC))
+        self.bases = tableBases(self.max_tokens)
+
+        self.entries = memoryview(self.map)[header_size:header_size + 2 * entry_count].cast("H")
+
+    def covers(self, board):
+        # True if board's position is in the table
+        return (board.upper_thrown_num == 9 and board.lower_thrown_num == 9 and
+                len(tokenIds(board)) <= self.max_tokens)
+
+    def probe(self, board):
+        # (result, distance) for board, result is UPPER_WINS, LOWER_WINS or DRAW.
+        # None if the position isn't in the table
+
+        if board.upper_thrown_num != 9 or board.lower_thrown_num != 9:
+            return None
+
+        token_ids = tokenIds(board)
+        if len(token_ids) > self.max_tokens:
+            return None
+
+        entry = self.entries[positionIndex(token_ids, self.bases)]
+        if entry >> RESULT_SHIFT == NO_POSITION:
+            return None
+
+        return CODE_RESULTS[entry >> RESULT_SHIFT], entry & DISTANCE_MASK
+
+    def close(self):
+        self.entries.release()
+        self.map.close()
+        self.file.close()
+
+
+def loadTablebase(path=DEFAULT_TABLEBASE_PATH):
+    # Tablebase at path, or None if there is no file there
+    return Tablebase(path) if os.path.exists(path) else None
+
+
+def tablebaseMove(tablebase, board, team):
+    # Move that forces the quickest win for team from board, or None if team can't force a win
+
+    win = UPPER_WINS if team == "upper" else LOWER_WINS
+
+    best_move = None
+    best_distance = None
+
+    replies = getPossibleMoveCodes(board, "lower" if team == "upper" else "upper")
+
+    for move in getPossibleMoveCodes(board, team):
+
+        worst_distance = 0
+
+        for reply in replies:
+            upper_move, lower_move = (move, reply) if team == "upper" else (reply, move)
+
+            result = tablebase.probe(resolveMoveCodes(upper_move, lower_move, board))
+
+            if result is None or result[0] != win:
+                break
+            worst_distance = max(worst_distance, result[1])
+        else:
+            if best_distance is None or worst_distance < best_distance:
+                best_move, best_distance = move, worst_distance
+
+    return None if best_move is None else decodeMove(best_move)
+
+
+def tablebaseScore(tablebase, board, team):
+    # Exact score for team of board if it is in the table and a team can force a win from it
+    # (TABLEBASE_WIN_SCORE less the distance, negated for a loss), None otherwise
+
+    result = tablebase.probe(board)
+
+    if result is None or result[0] == DRAW:
+        return None
+
+    score = TABLEBASE_WIN_SCORE - result[1]
+    return score if (result[0] == UPPER_WINS) == (team == "upper") else -score
+
+
+def tablebaseHeuristic(tablebase, heuristic_function):
+    # Heuristic function that scores positions in the table that a team can force a win from with
+    # tablebaseScore, and everything else with heuristic_function
+
+    def heuristic(state_node):
+
+        # Only positions where both teams have thrown everything can be in the table
+        if state_node.upper_thrown_num == 9 and state_node.lower_thrown_num == 9:
+            board = state_node.board
+            if board is None:
+                board = fromBoardDicts(state_node.coord_dict, state_node.upper_thrown_num,
+                                       state_node.lower_thrown_num)
+
+            score = tablebaseScore(tablebase, board, state_node.team)
+            if score is not None:
+                return score
+
+        return heuristic_function(state_node)
+
+    return heuristic
+
+
+def generateTablebase(max_tokens=DEFAULT_MAX_TOKENS, log=None):
+    # Retrograde analysis of every position with up to max_tokens tokens, returns the entries as an
+    # array("H"). log, if given, is called with progress messages
+
+    def report(message):
+        if log is not None:
+            log(message)
+
+    bases = tableBases(max_tokens)
+    codes = np.zeros(bases[-1], dtype=np.uint8)
+    distances = np.zeros(bases[-1], dtype=np.uint16)
+
+    # Score every ended position, keep the others
+    positions = []
+    boards = []
+
+    for token_count in range(max_tokens + 1):
+        for token_ids in combinations_with_replacement(range(TOKEN_IDS), token_count):
+
+            board = boardFromTokenIds(token_ids)
+            if board is None:
+                continue
+
+            index = positionIndex(token_ids, bases)
+            result = gameEnded(board, 0)
+
+            if result == NOT_ENDED:
+                positions.append(index)
+                boards.append(board)
+            else:
+                codes[index] = RESULT_CODES[result]
+
+        report("{} tokens: {} positions not ended".format(token_count, len(positions)))
+
+    # Child index of every joint move, both in (position, upper move, lower move) order and in
+    # (position, lower move, upper move) order, with the start of each row of each order
+    children = array("i")
+    children_by_lower = array("i")
+    upper_rows = array("q")
+    lower_rows = array("q")
+    position_upper_rows = array("q")
+    position_lower_rows = array("q")
+
+    start = time.perf_counter()
+
+    for position_number, board in enumerate(boards):
+
+        upper_moves = getPossibleMoveCodes(board, "upper", include_throws=False)
+        lower_moves = getPossibleMoveCodes(board, "lower", include_throws=False)
+
+        matrix = [[positionIndex(tokenIds(resolveMoveCodes(upper_move, lower_move, board)), bases)
+                   for lower_move in lower_moves] for upper_move in upper_moves]
+
+        position_upper_rows.append(len(upper_rows))
+        for row in matrix:
+            upper_rows.append(len(children))
+            children.extend(row)
+
+        position_lower_rows.append(len(lower_rows))
+        for column in zip(*matrix):
+            lower_rows.append(len(children_by_lower))
+            children_by_lower.extend(column)
+
+        if position_number % 50000 == 0:
+            report("children of {}/{} positions ({:.0f}s)".format(position_number, len(boards),
+                                                                  time.perf_counter() - start))
+
+    positions = np.array(positions, dtype=np.int64)
+    children = np.frombuffer(children, dtype=np.int32)
+    children_by_lower = np.frombuffer(children_by_lower, dtype=np.int32)
+    upper_rows = np.frombuffer(upper_rows, dtype=np.int64)
+    lower_rows = np.frombuffer(lower_rows, dtype=np.int64)
+    position_upper_rows = np.frombuffer(position_upper_rows, dtype=np.int64)
+    position_lower_rows = np.frombuffer(position_lower_rows, dtype=np.int64)
+
+    no_distance = np.iinfo(np.uint16).max
+
+    def forcedWins(child_list, rows, position_rows, win_code):
+        # For each position, the distance of the quickest win the team choosing rows can force with the
+        # results known so far (no_distance if none)
+        won = codes[child_list] == win_code
+        row_won = np.logical_and.reduceat(won, rows)
+        row_distance = np.maximum.reduceat(np.where(won, distances[child_list], 0), rows)
+        return np.minimum.reduceat(np.where(row_won, row_distance, no_distance), position_rows)
+
+    distance = 0
+    while True:
+        distance += 1
+
+        # Both teams' wins use the results from before this sweep, so every win found is distance moves long
+        upper_wins = forcedWins(children, upper_rows, position_upper_rows, RESULT_CODES[UPPER_WINS])
+        lower_wins = forcedWins(children_by_lower, lower_rows, position_lower_rows, RESULT_CODES[LOWER_WINS])
+
+        unresolved = codes[positions] == NO_POSITION
+        new_upper = unresolved & (upper_wins != no_distance)
+        new_lower = unresolved & (lower_wins != no_distance) & ~new_upper
+
+        codes[positions[new_upper]] = RESULT_CODES[UPPER_WINS]
+        distances[positions[new_upper]] = upper_wins[new_upper] + 1
+        codes[positions[new_lower]] = RESULT_CODES[LOWER_WINS]
+        distances[positions[new_lower]] = lower_wins[new_lower] + 1
+
+        report("sweep {}: {} upper wins, {} lower wins".format(distance, int(new_upper.sum()),
+                                                               int(new_lower.sum())))
+
+        if not new_upper.any() and not new_lower.any():
+            break
+
+    # Nobody can force a win from the rest
+    codes[positions[codes[positions] == NO_POSITION]] = RESULT_CODES[DRAW]
+
+    entries = (codes.astype(np.uint16) << RESULT_SHIFT) | distances
+    return array("H", entries.tobytes())
+
+
+def writeTablebase(entries, max_tokens, path):
+
+    if sys.byteorder != "little":
+        entries.byteswap()
+
+    with open(path, "wb") as file:
+        file.write(TABLEBASE_MAGIC + struct.pack("<II", max_tokens, len(entries)))
+        file.write(entries.tobytes())
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Generate an endgame tablebase.")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS,
+                        help="most tokens on the board (default {})".format(DEFAULT_MAX_TOKENS))
+    parser.add_argument("--output", default=DEFAULT_TABLEBASE_PATH, help="tablebase file to write")
+    args = parser.parse_args()
+
+    entries = generateTablebase(args.max_tokens, log=lambda message: print(message, file=sys.stderr))
+
+    writeTablebase(entries, args.max_tokens, args.output)
+
+    print("{} entries written to {}".format(len(entries), args.output), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+from collections import defaultdict as dd
+import numpy as np
+
+
+# The baseline engine's (before the BitBoard, geometry tables and incremental search changes)
+# move generation, move resolution, end of game checks, heuristic and move scoring, copied unchanged
+# from Tronity.py, for the tests to check the current engine against.
+
+# Directions for tiles a distance of 1 away
+ONE_TILE_DIRECTIONS = ((-1, 0), (-1,1), (0,-1), (0,1), (1,-1), (1,0))
+
+# Directions for tiles a distance of 2 away
+TWO_TILE_DIRECTIONS = ((-2, 0), (-2,2), (0,-2), (0,2), (2,-2), (2,0),
+                       (2,-1), (1,1), (-1,2), (-2,1), (-1,-1), (1,-2))
+
+UPPER_WINS = 1
+LOWER_WINS = -1
+DRAW = 2
+NOT_ENDED = 0
+
+
+def tuple_addition(tuple1, tuple2):
+    return tuple(map(lambda i, j: i + j, tuple1, tuple2))
+
+
+def outOfBounds(pos):
+    # Returns true if position given is out of bounds
+    x = pos[0]
+    y = pos[1]
+    return (abs(-x - y) > 4) or (abs(x) > 4 or abs(y) > 4)
+
+
+def validMove(piece_team, move_type, from_pos, to_pos, coord_dict):
+
+    # Need to add throw move functionality
+    # Need to have #throws_had as input
+
+    # piece_team specifies if you are playing as "upper" or "lower"
+
+    # Check if starting or finishing positions is out of bounds
+    if outOfBounds(from_pos) or outOfBounds(to_pos):
+        return False
+
+    # Check that there is anything in from_pos
+    if not from_pos in coord_dict:
+        return False
+
+    if piece_team == "upper":
+        # Check that there is an upper piece in from_pos
+        if not ("R" in coord_dict[from_pos] or "P" in coord_dict[from_pos] or "S" in coord_dict[from_pos]):
+            return False
+    elif piece_team == "lower":
+        if not ("r" in coord_dict[from_pos] or "p" in coord_dict[from_pos] or "s" in coord_dict[from_pos]):
+            return False
+
+    adjacent_tiles = [tuple_addition(i, from_pos) for i in ONE_TILE_DIRECTIONS]
+
+    if move_type == "SLIDE":
+
+        if to_pos in adjacent_tiles:
+            return True
+        else:
+            return False
+
+    elif move_type == "SWING":
+
+        # Check if from_pos is adjacent to to_pos, if it is, the move is invalid
+        if to_pos in adjacent_tiles:
+            # It is adjacent
+            return False
+
+        # Look at all tiles one distance away from from_pos
+        for adjacent_tile in adjacent_tiles:
+            # Check if adjacent tile is adjacent to to_pos
+            # If there is also an upper in that position then the move is valid
+
+
+            if to_pos in [tuple_addition(i, adjacent_tile) for i in ONE_TILE_DIRECTIONS]:
+                # The current adjacent_tile is adjacent to both from_pos and to_pos
+
+                # Check that there is a friendly piece to swing around
+                if piece_team == "upper":
+                    if adjacent_tile in coord_dict and ("R" in coord_dict[adjacent_tile] or "P" in coord_dict[adjacent_tile] or "S" in coord_dict[adjacent_tile]):
+                        # There is an upper piece adjacent to both from_pos and to_pos
+                        return True
+                if piece_team == "lower":
+                    if adjacent_tile in coord_dict and ("r" in coord_dict[adjacent_tile] or "p" in coord_dict[adjacent_tile] or "s" in coord_dict[adjacent_tile]):
+                        # There is a lower piece adjacent to both from_pos and to_pos
+                        return True
+
+        # If all adjacent upper pieces have been checked and none of them are adjacent to to_pos
+        # then the move is invalid
+        return False
+
+    else:
+        raise ValueError('move_type is invalid! It must only be "SLIDE" or "SWING"')
+
+
+# Need to know how many throws have been had to get valid throws
+# and if we are calculating for lower or upper (to know which side)
+def getValidMovesForPiece(from_pos, coord_dict, piece_team):
+
+    # piece_team is either "upper" or "lower"
+    # piece_type is one of: "r", "p", "s"
+
+    # Need throw moves
+
+    valid_moves = []
+
+    # First check the 6 possible SLIDE moves
+
+    adjacent_tiles = [tuple_addition(i, from_pos) for i in ONE_TILE_DIRECTIONS]
+
+    for adjacent_tile in adjacent_tiles:
+        if validMove(piece_team, "SLIDE", from_pos, adjacent_tile, coord_dict):
+            valid_moves.append(("SLIDE", from_pos, adjacent_tile))
+
+    # Secondly check the 12 SWING moves
+
+    two_tiles_away = [tuple_addition(i, from_pos) for i in TWO_TILE_DIRECTIONS]
+
+    for tile in two_tiles_away:
+        if validMove(piece_team, "SWING", from_pos, tile, coord_dict):
+            valid_moves.append(("SWING", from_pos, tile))
+
+    return valid_moves
+
+
+def getThrowMoves(thrown_num, team):
+    
+    ROW_COORDS = [[(4, -4), (4, -3), (4, -2), (4, -1), (4, 0)],
+                  [(3, -4), (3, -3), (3, -2), (3, -1), (3, 0), (3, 1)],
+                  [(2, -4), (2, -3), (2, -2), (2, -1), (2, 0), (2, 1), (2, 2)],
+                  [(1, -4), (1, -3), (1, -2), (1, -1), (1, 0), (1, 1), (1, 2), (1, 3)],
+                  [(0, -4), (0, -3), (0, -2), (0, -1), (0, 0), (0, 1), (0, 2), (0, 3), (0, 4)],
+                  [(-1, -3), (-1, -2), (-1, -1), (-1, 0), (-1, 1), (-1, 2), (-1, 3), (-1, 4)],
+                  [(-2, -2), (-2, -1), (-2, 0), (-2, 1), (-2, 2), (-2, 3), (-2, 4)],
+                  [(-3, -1), (-3, 0), (-3, 1), (-3, 2), (-3, 3), (-3, 4)],
+                  [(-4, 0), (-4, 1), (-4, 2), (-4, 3), (-4, 4)]]
+
+    throws = []
+
+    if team == "upper":
+        if thrown_num < 9:
+            for row_index in range(thrown_num+1):
+                for coord in ROW_COORDS[row_index]:
+                    throws += [("THROW", "r", coord), ("THROW", "p", coord), ("THROW", "s", coord)]
+    else:
+        # Deal with lower throws
+        if thrown_num < 9:
+            for row_index in range(8 - thrown_num, 9):
+                for coord in ROW_COORDS[row_index]:
+                    throws += [("THROW", "r", coord), ("THROW", "p", coord), ("THROW", "s", coord)]
+
+    return throws
+
+
+def resolveMoves(upper_move, lower_move, coord_dict, upper_thrown_num, lower_thrown_num):
+    # Given list of moves (one for each upper piece) and coord_dict
+    # Create new coord_dict, where the pieces are deleted from each from_pos and added to each to_pos
+    # Go through each to_pos key in coord_dict and apply the rules
+    # Create a new piece_dict, including the pieces that are still alive
+
+    # return new coord_dict and piece_dict
+
+    new_coord_dict = deepCopy(coord_dict)
+
+    new_piece_dict = {"upper": {"r": [], "p": [], "s": []},
+                      "lower": {"r": [], "p": [], "s": []}}
+
+    # Deal with upper 
+    move_type_upper = upper_move[0]
+    
+    if move_type_upper in ["SLIDE", "SWING"]:
+
+        from_pos = upper_move[1]
+        to_pos = upper_move[2]
+
+        # Looking at the first element of the list for position (from_pos), it could be a LOWER piece, but it must be
+        # the same type as the UPPER which is at the same position
+
+        piece_type = new_coord_dict[from_pos][0].upper()
+
+        new_coord_dict[from_pos].remove(piece_type)
+
+        # Check if that tile is empty now
+
+        if new_coord_dict[from_pos] == []:
+            del new_coord_dict[from_pos]
+
+        # Add the same type of piece to the to_coord
+
+        new_coord_dict[to_pos].append(piece_type)
+        
+    else:
+        # This is a THROW, just need to add the piece to the new coord dict
+        to_pos = upper_move[2]
+        piece_type = upper_move[1].upper()
+        new_coord_dict[to_pos].append(piece_type)
+
+
+    # Deal with lower 
+    move_type_lower = lower_move[0]
+    
+    if move_type_lower in ["SLIDE", "SWING"]:
+
+        from_pos = lower_move[1]
+        to_pos = lower_move[2]
+
+        # Looking at the first element of the list for position (from_pos), it could be an UPPER piece, but it must be
+        # the same type as the LOWER which is at the same position
+
+        piece_type = new_coord_dict[from_pos][0].lower()
+
+        new_coord_dict[from_pos].remove(piece_type)
+
+        # Check if that tile is empty now
+
+        if new_coord_dict[from_pos] == []:
+            del new_coord_dict[from_pos]
+
+        # Add the same type of piece to the to_coord
+
+        new_coord_dict[to_pos].append(piece_type)
+        
+    else:
+        # This is a THROW, just need to add the piece to the new coord dict
+        to_pos = lower_move[2]
+        piece_type = lower_move[1].lower()
+        new_coord_dict[to_pos].append(piece_type)
+
+
+    # Go through each to_coord and remove pieces according to the rules
+
+    # Rules:
+        # If the hex is occupied by one or more tokens with each symbol, all of the tokens are defeated.
+        # If the hex is occupied by a Rock token, all Scissors tokens there are defeated.
+        # If the hex is occupied by a Scissors token, all Paper tokens there are defeated.
+        # If the hex is occupied by a Paper token, all Rock tokens there are defeated.
+
+    for move in list(set([upper_move, lower_move])):
+
+        to_pos = move[-1]
+
+        pieces = new_coord_dict[to_pos]
+
+        rock_present = ("R" in pieces or "r" in pieces)
+        paper_present = ("P" in pieces or "p" in pieces)
+        scissors_present = ("S" in pieces or "s" in pieces)
+
+        if rock_present and paper_present and scissors_present:
+            del new_coord_dict[to_pos]
+
+        elif rock_present and scissors_present:
+            new_coord_dict[to_pos] = [piece for piece in pieces if piece not in ["S", "s"]]
+
+        elif scissors_present and paper_present:
+            new_coord_dict[to_pos] = [piece for piece in pieces if piece not in ["P", "p"]]
+
+        elif paper_present and rock_present:
+            new_coord_dict[to_pos] = [piece for piece in pieces if piece not in ["R", "r"]]
+
+    # Create new_piece_dict from new_coord_dict:
+
+    for coord, pieces in new_coord_dict.items():
+        for piece in pieces:
+
+            if piece in ["R", "P", "S"]:
+                new_piece_dict["upper"][piece.lower()].append(coord)
+
+            elif piece in ["r", "p", "s"]:
+                new_piece_dict["lower"][piece.lower()].append(coord)
+            else:
+                raise ValueError('piece value of:', piece, 'is not upper or lower!')
+
+    new_upper_thrown_num = upper_thrown_num
+    new_lower_thrown_num = lower_thrown_num
+    
+    if move_type_upper == "THROW":
+        new_upper_thrown_num += 1
+    if move_type_lower == "THROW":
+        new_lower_thrown_num += 1 
+    
+    return new_coord_dict, new_piece_dict, new_upper_thrown_num, new_lower_thrown_num
+
+
+def deepCopy(list_dict):
+
+    copy = dd(list)
+
+    for key, value in list_dict.items():
+        copy[key] = value.copy()
+
+    return copy
+
+
+def hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num):
+    # Key loses to value
+    lose_dict = {"r": "p", "p": "s", "s": "r"}
+    
+    upper_invincible = False
+    lower_invincible = False
+    
+    upper_invincible_type = None
+    lower_invincible_type = None
+    
+    # Checking if upper has an invincible token
+    if lower_thrown_num == 9:
+        if piece_dict["upper"]["r"] != [] and piece_dict["lower"]["p"] == []:
+            upper_invincible = True
+            upper_invincible_type = "r"
+        elif piece_dict["upper"]["p"] != [] and piece_dict["lower"]["s"] == []:
+            upper_invincible = True
+            upper_invincible_type = "p"
+        elif piece_dict["upper"]["s"] != [] and piece_dict["lower"]["r"] == []:
+            upper_invincible = True
+            upper_invincible_type = "s"
+        else:
+            upper_invincible = False
+            
+    # Checking if lower has an invincible token
+    if upper_thrown_num == 9:
+        if piece_dict["lower"]["r"] != [] and piece_dict["upper"]["p"] == []:
+            lower_invincible = True
+            lower_invincible_type = "r"
+        elif piece_dict["lower"]["p"] != [] and piece_dict["upper"]["s"] == []:
+            lower_invincible = True
+            lower_invincible_type = "p"
+        elif piece_dict["lower"]["s"] != [] and piece_dict["upper"]["r"] == []:
+            lower_invincible = True
+            lower_invincible_type = "s"
+        else:
+            lower_invincible = False
+    
+    return upper_invincible, lower_invincible, upper_invincible_type, lower_invincible_type
+
+
+def gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, turn_num, debug=False):
+    
+    # UPPER_WINS = 1
+    # LOWER_WINS = -1
+    # DRAW = 2
+    # NOT_ENDED = 0
+    
+    # Condition 1
+    if lower_thrown_num == 9 and (
+        piece_dict["lower"]["r"] == [] and piece_dict["lower"]["p"] == [] and piece_dict["lower"]["s"] == []):
+        
+        if upper_thrown_num < 9 or not (
+        piece_dict["upper"]["r"] == [] and piece_dict["upper"]["p"] == [] and piece_dict["upper"]["s"] == []):
+            if debug: print("Condition 1: upper wins")
+            if debug: print(piece_dict)
+            return UPPER_WINS
+        else:
+            if debug: print("Condition 1: draw")
+            if debug: print(piece_dict)
+            return DRAW
+    elif upper_thrown_num == 9 and (
+        piece_dict["upper"]["r"] == [] and piece_dict["upper"]["p"] == [] and piece_dict["upper"]["s"] == []):
+        
+        if lower_thrown_num < 9 or not (
+        piece_dict["lower"]["r"] == [] and piece_dict["lower"]["p"] == [] and piece_dict["lower"]["s"] == []):
+            if debug: print("Condition 1: lower wins")
+            if debug: print(piece_dict)
+            return LOWER_WINS
+        else:
+            if debug: print("Condition 1: draw")
+            if debug: print(piece_dict)
+            return DRAW
+    
+    # Condition 2
+    elif hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num)[:2] == (True, True):
+        if debug: print("Condition 2: draw")
+        if debug: print(piece_dict)
+        return DRAW
+    
+    # Condition 3
+    elif hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num)[:2] == (True, False) and (
+        len(piece_dict["lower"]["r"]) + len(piece_dict["lower"]["p"]) + len(piece_dict["lower"]["s"]) == 1):
+        if debug: print("Condition 3: upper wins")
+        if debug: print(piece_dict)
+        return UPPER_WINS
+    elif hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num)[:2] == (False, True) and (
+        len(piece_dict["upper"]["r"]) + len(piece_dict["upper"]["p"]) + len(piece_dict["upper"]["s"]) == 1):
+        if debug: print("Condition 3: lower wins")
+        return LOWER_WINS
+    
+    # Condition 4   *** IMPLEMENT LATER, QUITE ANNOYING ***
+    
+    # Condition 5
+    elif turn_num >= 360:
+        if debug: print("Condition 5: draw")
+        if debug: print(piece_dict)
+        return DRAW
+    
+    else:
+        if debug: print("Not ended yet")
+        if debug: print(piece_dict)
+        return NOT_ENDED
+
+
+def manhattanDistance(c0, c1):
+    dx = c1[0] - c0[0]
+    dy = c1[1] - c0[1]
+
+    if np.sign(dx) == np.sign(dy):
+        return abs(dx + dy)
+    else:
+        return max(abs(dx), abs(dy))
+
+
+def getPossibleMoves(state_node, team, include_throws=True):
+
+    coord_dict = state_node.coord_dict
+    piece_dict = state_node.piece_dict
+    
+    all_possible_moves = []
+    
+    if team == "upper":
+        upper_thrown_num = state_node.upper_thrown_num
+
+        if include_throws:
+            # Get throw moves
+            upper_throw_moves = getThrowMoves(upper_thrown_num, team)
+
+            all_possible_moves += upper_throw_moves
+
+        # Get all possible moves for upper pieces on the board
+        for piece, coordinates in piece_dict["upper"].items():
+
+            for coordinate in coordinates:
+
+                possible_moves = getValidMovesForPiece(coordinate, coord_dict, "upper")
+
+                all_possible_moves += possible_moves
+    else:
+        lower_thrown_num = state_node.lower_thrown_num
+
+        if include_throws:
+            # Get throw moves
+            lower_throw_moves = getThrowMoves(lower_thrown_num, team)
+
+            all_possible_moves += lower_throw_moves
+
+        # Get all possible moves for lower pieces on the board
+        for piece, coordinates in piece_dict["lower"].items():
+
+            for coordinate in coordinates:
+
+                possible_moves = getValidMovesForPiece(coordinate, coord_dict, "lower")
+
+                all_possible_moves += possible_moves
+    
+    return all_possible_moves
+
+
+def calculateMoveScores(state_node, heuristic_function):
+    # When this has been called, the tree has been built to the specified depth
+    # Need to go down to the leaf primary_move_nodes, then look at each state_node below them,
+    # if the state_node has no primary_move_nodes in its primary_move_list, then it is a
+    # leaf node. As it is a leaf node, you can run that state through the heuristic function
+    # Add the heuristic value to the "sum_scores" variable in the primary_move_node.
+    
+    # If the state_node below is not a leaf node, then call calculateMoveScores with that
+    # state_node as input
+    
+    if state_node.primary_move_list == []:
+        # This state is a leaf state
+        
+        heuristic_value = heuristic_function(state_node)
+        
+        # Add this heuristic value to the parent primary_mode_node
+        
+        state_node.parent_secondary_node.parent_move.score_sum += heuristic_value
+        
+    else:
+        
+        for primary_move in state_node.primary_move_list:
+            
+            for secondary_move in primary_move.secondary_move_list:
+                
+                calculateMoveScores(secondary_move.state_node, heuristic_function)
+                
+            # All heuristic values now calculated for current primary_move
+            # Can now calculate the average for this primary_move and then add it
+            # To the primary move above
+            
+
+            
+            primary_move.average_score = primary_move.score_sum / len(primary_move.secondary_move_list)
+            
+            if state_node.parent_secondary_node != None:
+                state_node.parent_secondary_node.parent_move.score_sum += primary_move.average_score / len(state_node.primary_move_list)
+
+
+# Gives ratio of player pieces to enemy pieces on board and left to throw
+def board_throw_ratio(throws_upper, throws_lower, team, piece_dict) -> float:
+    # Get the number of pieces for upper and lower
+    # Get number of pieces left to throw
+    upper_count = (9 - throws_upper)
+    lower_count = (9 - throws_lower)
+    # Get number of pieces on the board
+    for piece in piece_dict["upper"]:
+        upper_count += len(piece_dict["upper"][piece])
+    for piece in piece_dict["lower"]:
+        lower_count += len(piece_dict["lower"][piece])
+    # Prevent divide by 0, enemy on 0 pieces is worth twice as much as enemy on 1 piece
+    if upper_count == 0:
+        upper_count = 0.5
+    if lower_count == 0:
+        lower_count = 0.5
+    # get ratio
+    if team == "upper":
+        ratio = upper_count/lower_count
+    else:
+        ratio = lower_count/upper_count
+    return ratio
+
+
+# Gives score based on proximity to prey, adjacent worth 2 and 2 tiles away worth 1
+def get_proximty_prey_score(team, piece_dict):
+    score = 0
+    if team == "upper":
+        for piece in piece_dict["upper"]:
+            # Get the prey type
+            if piece == "r":
+                prey = "s"
+            elif piece == "p":
+                prey = "r"
+            else:
+                prey = "p"
+            for coords in piece_dict["upper"][piece]:
+                for preycoords in piece_dict["lower"][prey]:
+                    score += max(3 - manhattanDistance(coords, preycoords), 0)
+    # If team is not upper, team is lower
+    else:
+        for piece in piece_dict["lower"]:
+            # Get the prey type
+            if piece == "r":
+                prey = "s"
+            elif piece == "p":
+                prey = "r"
+            else:
+                prey = "p"
+            for coords in piece_dict["lower"][piece]:
+                for preycoords in piece_dict["upper"][prey]:
+                    score += max(3 - manhattanDistance(coords, preycoords), 0)
+    return score
+
+
+# Gives absolute number of enemy pieces captured
+def enemy_pieces_captured(enemy_throws, team, piece_dict) -> float:
+    if team == "upper":
+        captured = enemy_throws
+        for piece in piece_dict["lower"]:
+            captured -= len(piece_dict["lower"][piece])
+    # If team is not upper, team is lower
+    else:
+        captured = enemy_throws
+        for piece in piece_dict["upper"]:
+            captured -= len(piece_dict["upper"][piece])
+    return captured
+
+
+# Co-efficient of board_throw_ratio encourages aggressive trading when ahead
+# Piece capture worth 4, Piece 1 tile from prey worth 2 and tile 2 tiles from prey worth 1
+# Should encourage module to push advantages and play to win fast
+def test_board_heuristic_three (state_node):
+    
+    throws_upper = state_node.upper_thrown_num
+    throws_lower = state_node.lower_thrown_num
+    team = state_node.team
+    piece_dict = state_node.piece_dict
+    
+    # Get number of pieces captured
+    if team == "upper":
+        captured = 4 * enemy_pieces_captured(throws_lower, team, piece_dict)
+    # If team is not upper, team is lower
+    else:
+        captured = 4 * enemy_pieces_captured(throws_upper, team, piece_dict)
+    # Get board score
+    board_score = get_proximty_prey_score(team, piece_dict)
+    # Multiply by ratio and return
+    return (board_throw_ratio(throws_upper, throws_lower, team, piece_dict) * (captured + board_score))
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from positions import randomPositions
+
+
+@pytest.fixture(scope="session")
+def random_positions():
+    return randomPositions()
@@ -0,0 +1,75 @@
+import random
+from collections import namedtuple
+from types import SimpleNamespace
+
+import baseline
+
+
+# Position reached in a random game, and the random joint move played from it
+Position = namedtuple("Position", ["coord_dict", "piece_dict", "upper_thrown_num", "lower_thrown_num", "turn_num",
+                                   "upper_move", "lower_move"])
+
+POSITIONS_SEED = 30024
+POSITIONS_GAMES = 30
+POSITIONS_MAX_TURNS = 80
+
+
+def baselineState(team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num):
+    # Just enough of a State_node for the baseline's getPossibleMoves and heuristic
+    return SimpleNamespace(team=team, coord_dict=coord_dict, piece_dict=piece_dict,
+                           upper_thrown_num=upper_thrown_num, lower_thrown_num=lower_thrown_num)
+
+
+PREY = {"r": "s", "p": "r", "s": "p"}
+
+
+def capturesPrey(move, team, coord_dict):
+    # Whether move lands on a hex holding the other team's tokens of the moved token's prey
+
+    symbol = move[1] if move[0] == "THROW" else coord_dict[move[1]][0].lower()
+    prey = PREY[symbol] if team == "lower" else PREY[symbol].upper()
+
+    return prey in coord_dict.get(move[2], ())
+
+
+def randomPositions(seed=POSITIONS_SEED, games=POSITIONS_GAMES, max_turns=POSITIONS_MAX_TURNS):
+    # Positions of games where both teams play random legal moves, moved with the baseline engine.
+    # Throws are only chosen a third of the time and moves onto prey half of the time, so games get to
+    # their middle and end
+
+    rng = random.Random(seed)
+    positions = []
+
+    for _ in range(games):
+        coord_dict = baseline.dd(list)
+        piece_dict = {"upper": {"r": [], "p": [], "s": []}, "lower": {"r": [], "p": [], "s": []}}
+        upper_thrown_num = lower_thrown_num = 0
+
+        for turn_num in range(1, max_turns + 1):
+            state = baselineState("upper", coord_dict, piece_dict, upper_thrown_num, lower_thrown_num)
+
+            joint_move = []
+            for team in ("upper", "lower"):
+                moves = baseline.getPossibleMoves(state, team)
+                throws = [move for move in moves if move[0] == "THROW"]
+                board_moves = [move for move in moves if move[0] != "THROW"]
+
+                captures = [move for move in moves if capturesPrey(move, team, coord_dict)]
+
+                if captures and rng.random() < 1 / 2:
+                    joint_move.append(rng.choice(captures))
+                elif throws and (not board_moves or rng.random() < 1 / 3):
+                    joint_move.append(rng.choice(throws))
+                else:
+                    joint_move.append(rng.choice(board_moves))
+
+            positions.append(Position(coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, turn_num,
+                                      *joint_move))
+
+            coord_dict, piece_dict, upper_thrown_num, lower_thrown_num = baseline.resolveMoves(
+                *joint_move, coord_dict, upper_thrown_num, lower_thrown_num)
+
+            if baseline.gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, turn_num + 1) != baseline.NOT_ENDED:
+                break
+
+    return positions
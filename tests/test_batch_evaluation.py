@@ -0,0 +1,148 @@
+import Tronity
+from Tronity import State_node, buildStateTree, calculateMoveScores
+from batch_evaluation import LeafBatch
+from bitboard import fromBoardDicts
+from evaluation_cache import EvaluationCache
+from transposition import TranspositionTable
+
+import baseline
+from test_search import rootState, searchPositions, seededPruning, moveScores
+
+
+def leafStates(positions):
+    # A leaf state for each team of each position, half of them keeping their board as a BitBoard
+
+    state_nodes = []
+
+    for index, position in enumerate(positions):
+        for team in ("upper", "lower"):
+            state_node = State_node(team, position.coord_dict, position.piece_dict, position.upper_thrown_num,
+                                    position.lower_thrown_num, [], None, 2)
+
+            if index % 2:
+                state_node.board = fromBoardDicts(position.coord_dict, position.upper_thrown_num,
+                                                  position.lower_thrown_num)
+                state_node.coord_dict = None
+                state_node.piece_dict = None
+
+            state_nodes.append(state_node)
+
+    return state_nodes
+
+
+def baselineScore(position, team):
+    return baseline.test_board_heuristic_three(State_node(
+        team, position.coord_dict, position.piece_dict, position.upper_thrown_num, position.lower_thrown_num,
+        [], None, 2))
+
+
+def test_heuristic_matches_baseline(random_positions):
+
+    for position in random_positions:
+        for team in ("upper", "lower"):
+            state_node = State_node(team, position.coord_dict, position.piece_dict, position.upper_thrown_num,
+                                    position.lower_thrown_num, [], None, 2)
+
+            assert Tronity.test_board_heuristic_three(state_node) == baselineScore(position, team)
+
+
+def test_leaf_batch_matches_baseline(random_positions):
+
+    state_nodes = leafStates(random_positions)
+
+    leaf_batch = LeafBatch()
+    for state_node in state_nodes:
+        leaf_batch.add(state_node)
+
+    scores = leaf_batch.evaluate()
+
+    expected = [baselineScore(position, team) for position in random_positions for team in ("upper", "lower")]
+
+    # Exactly the same floats, not just close
+    assert scores == expected
+    assert [state_node.score for state_node in state_nodes] == expected
+
+
+def test_leaf_batch_cached_scores(random_positions):
+
+    evaluation_cache = EvaluationCache(Tronity.test_board_heuristic_three)
+
+    first_batch = LeafBatch(evaluation_cache)
+    for state_node in leafStates(random_positions):
+        first_batch.add(state_node)
+    first_batch.evaluate()
+
+    # Every position is now cached, so the second batch scores them all as they are added
+    state_nodes = leafStates(random_positions)
+
+    second_batch = LeafBatch(evaluation_cache)
+    for state_node in state_nodes:
+        second_batch.add(state_node)
+
+    assert second_batch.evaluate() == []
+    assert [state_node.score for state_node in state_nodes] == \
+           [baselineScore(position, team) for position in random_positions for team in ("upper", "lower")]
+
+
+def leafScores(state_node, scores):
+    # Score of every leaf of a tree by Zobrist key, and the number of leaves
+
+    leaves = 0
+
+    if state_node.primary_move_list == [] and state_node.transposed_state is None:
+        scores.setdefault(state_node.zobrist_key, set()).add(state_node.score)
+        leaves += 1
+
+    for primary_move_node in state_node.primary_move_list:
+        for secondary_move_node in primary_move_node.secondary_move_list:
+            leaves += leafScores(secondary_move_node.state_node, scores)
+
+    return leaves
+
+
+def test_leaf_batch_scores_positions_once(random_positions):
+
+    for position in searchPositions(random_positions)[::3]:
+        evaluation_cache = EvaluationCache(Tronity.test_board_heuristic_three)
+        transposition_table = TranspositionTable()
+
+        root_state = rootState(position, "upper")
+
+        leaf_batch = LeafBatch(evaluation_cache)
+        buildStateTree(root_state, 2, seededPruning, position.turn_num, transposition_table=transposition_table,
+                       leaf_batch=leaf_batch)
+        leaf_batch.evaluate(transposition_table)
+
+        scores = {}
+        leaves = leafScores(root_state, scores)
+
+        # Each position is evaluated once, and every leaf of it gets that score
+        assert len(leaf_batch) == len(scores) == evaluation_cache.misses
+        assert leaves == len(leaf_batch) + len(leaf_batch.duplicates) > len(scores)
+        assert all(len(key_scores) == 1 for key_scores in scores.values())
+
+        calculateMoveScores(root_state, Tronity.test_board_heuristic_three, transposition_table)
+
+        tree_root = rootState(position, "upper")
+        buildStateTree(tree_root, 2, seededPruning, position.turn_num)
+        calculateMoveScores(tree_root, Tronity.test_board_heuristic_three)
+
+        assert moveScores(root_state) == moveScores(tree_root)
+
+        # The same search again finds the root's children in the transposition table
+        transposition_table.new_search()
+
+        leaf_batch = LeafBatch(evaluation_cache)
+        buildStateTree(rootState(position, "upper"), 2, seededPruning, position.turn_num,
+                       transposition_table=transposition_table, leaf_batch=leaf_batch)
+
+        assert transposition_table.hits > 0
+        assert len(leaf_batch) == 0
+
+        # and with a new table, its leaves in the evaluation cache
+        leaf_batch = LeafBatch(evaluation_cache)
+        buildStateTree(rootState(position, "upper"), 2, seededPruning, position.turn_num,
+                       transposition_table=TranspositionTable(), leaf_batch=leaf_batch)
+
+        assert evaluation_cache.hits == leaves
+        assert len(leaf_batch) == 0
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import bitboard
+from bitboard import fromBoardDicts, EMPTY_BITBOARD
+from batch_simulator import BatchSimulator, UPPER, LOWER, SLOT_CODES
+from moves import encodeMove
+
+
+def startBoards(random_positions):
+    # Empty boards and boards from every stage of the test games
+    return [EMPTY_BITBOARD] * 4 + [fromBoardDicts(position.coord_dict, position.upper_thrown_num,
+                                                  position.lower_thrown_num)
+                                   for position in random_positions[::40]]
+
+
+def test_legal_moves_match_bitboard(random_positions):
+
+    boards = startBoards(random_positions)
+    simulator = BatchSimulator(boards)
+    games = np.arange(len(boards))
+
+    for team, team_name in ((UPPER, "upper"), (LOWER, "lower")):
+        legal = simulator.legalMoves(team, games)
+
+        for game, board in enumerate(boards):
+            assert sorted(SLOT_CODES[legal[game]]) == sorted(bitboard.getPossibleMoveCodes(board, team_name))
+
+
+def test_random_playouts_match_bitboard(random_positions):
+
+    boards = startBoards(random_positions)
+    turn_num = 20
+
+    simulator = BatchSimulator(boards, turn_num)
+    rng = np.random.default_rng(0)
+
+    # Each game played out one joint move at a time with bitboard, the moves the simulator chose
+    results = [bitboard.gameEnded(board, turn_num) for board in boards]
+    assert simulator.results.tolist() == results
+
+    turns = 0
+
+    while len(simulator.active()) and turns < 120:
+        games = simulator.active()
+
+        upper_codes = simulator.randomMoves(UPPER, games, rng)
+        lower_codes = simulator.randomMoves(LOWER, games, rng)
+
+        for game, upper_code, lower_code in zip(games, upper_codes, lower_codes):
+            board = boards[game]
+
+            # Only legal moves are chosen
+            assert upper_code in bitboard.getPossibleMoveCodes(board, "upper")
+            assert lower_code in bitboard.getPossibleMoveCodes(board, "lower")
+
+            boards[game] = bitboard.resolveMoveCodes(int(upper_code), int(lower_code), board)
+            results[game] = bitboard.gameEnded(boards[game], turn_num + turns + 1)
+
+        simulator.step(upper_codes, lower_codes, games)
+        turns += 1
+
+        assert simulator.toBoards() == boards
+        assert simulator.results.tolist() == results
+
+    # Some games ended along the way, and every game that hasn't is still being played
+    assert (simulator.results != bitboard.NOT_ENDED).any()
+    assert (simulator.turn_num[simulator.active()] == turn_num + turns).all()
+
+
+def test_move_from_empty_hex_is_rejected():
+
+    simulator = BatchSimulator([EMPTY_BITBOARD])
+
+    with pytest.raises(ValueError):
+        simulator.step([encodeMove(("SLIDE", (0, 0), (0, 1)))], [encodeMove(("THROW", "r", (-4, 0)))])
@@ -0,0 +1,79 @@
+import bitboard
+from bitboard import fromBoardDicts, toBoardDicts
+
+import baseline
+from positions import baselineState
+
+
+def boardContents(coord_dict):
+    # coord_dict without empty hexes, with each hex's pieces in a fixed order
+    return {coord: sorted(pieces) for coord, pieces in coord_dict.items() if pieces}
+
+
+def test_board_dicts_round_trip(random_positions):
+
+    for position in random_positions:
+        board = fromBoardDicts(position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+        coord_dict, piece_dict, upper_thrown_num, lower_thrown_num = toBoardDicts(board)
+
+        assert boardContents(coord_dict) == boardContents(position.coord_dict)
+        assert {team: {symbol: sorted(coords) for symbol, coords in pieces.items()}
+                for team, pieces in piece_dict.items()} == \
+               {team: {symbol: sorted(coords) for symbol, coords in pieces.items()}
+                for team, pieces in position.piece_dict.items()}
+        assert (upper_thrown_num, lower_thrown_num) == (position.upper_thrown_num, position.lower_thrown_num)
+
+
+def test_possible_moves_match_baseline(random_positions):
+
+    for position in random_positions:
+        board = fromBoardDicts(position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+        state = baselineState("upper", position.coord_dict, position.piece_dict, position.upper_thrown_num,
+                              position.lower_thrown_num)
+
+        for team in ("upper", "lower"):
+            moves = bitboard.getPossibleMoves(board, team)
+            baseline_moves = set(baseline.getPossibleMoves(state, team))
+
+            # Stacked tokens share their moves instead of repeating them
+            assert len(moves) == len(set(moves))
+            assert set(moves) == baseline_moves
+
+            assert set(bitboard.getPossibleMoves(board, team, include_throws=False)) == \
+                   {move for move in baseline_moves if move[0] != "THROW"}
+
+
+def test_resolve_moves_matches_baseline(random_positions):
+
+    for position in random_positions:
+        board = fromBoardDicts(position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+        coord_dict, _, upper_thrown_num, lower_thrown_num = baseline.resolveMoves(
+            position.upper_move, position.lower_move, position.coord_dict, position.upper_thrown_num,
+            position.lower_thrown_num)
+
+        assert bitboard.resolveMoves(position.upper_move, position.lower_move, board) == \
+               fromBoardDicts(coord_dict, upper_thrown_num, lower_thrown_num)
+
+
+def test_game_ended_matches_baseline(random_positions):
+
+    for position in random_positions:
+        board = fromBoardDicts(position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+        # Every game's last position is only reached after its final joint move
+        coord_dict, piece_dict, upper_thrown_num, lower_thrown_num = baseline.resolveMoves(
+            position.upper_move, position.lower_move, position.coord_dict, position.upper_thrown_num,
+            position.lower_thrown_num)
+        next_board = fromBoardDicts(coord_dict, upper_thrown_num, lower_thrown_num)
+
+        for board, piece_dict, upper_thrown_num, lower_thrown_num, turn_num in (
+                (board, position.piece_dict, position.upper_thrown_num, position.lower_thrown_num, position.turn_num),
+                (next_board, piece_dict, upper_thrown_num, lower_thrown_num, position.turn_num + 1)):
+
+            assert bitboard.hasInvincibleToken(board) == baseline.hasInvincibleToken(
+                piece_dict, upper_thrown_num, lower_thrown_num)
+
+            for game_turn_num in (turn_num, 360):
+                assert bitboard.gameEnded(board, game_turn_num) == baseline.gameEnded(
+                    piece_dict, upper_thrown_num, lower_thrown_num, game_turn_num)
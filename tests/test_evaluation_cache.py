@@ -0,0 +1,101 @@
+import pytest
+
+import Tronity
+from Tronity import State_node
+from evaluation_cache import EvaluationCache
+from symmetry import TRANSFORMS, transformPosition
+
+from test_search import rootState
+
+
+class CountingHeuristic:
+    # test_board_heuristic_three, counting its calls
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, state_node):
+        self.calls += 1
+        return Tronity.test_board_heuristic_three(state_node)
+
+
+def test_least_recently_used_is_evicted():
+
+    evaluation_cache = EvaluationCache(Tronity.test_board_heuristic_three, max_entries=3)
+
+    for key in (1, 2, 3):
+        evaluation_cache.store(key, float(key))
+
+    # 1 is now the most recently used, so 2 is dropped for 4, then 3 for 5
+    assert evaluation_cache.lookup(1) == 1.0
+
+    evaluation_cache.store(4, 4.0)
+    assert list(evaluation_cache.scores) == [3, 1, 4]
+
+    evaluation_cache.store(5, 5.0)
+    assert list(evaluation_cache.scores) == [1, 4, 5]
+
+    assert evaluation_cache.lookup(2) is None
+    assert evaluation_cache.lookup(3) is None
+    assert len(evaluation_cache) == 3
+
+    assert (evaluation_cache.hits, evaluation_cache.misses, evaluation_cache.evictions) == (1, 2, 2)
+    assert evaluation_cache.hit_rate == 1 / 3
+
+    # Storing a key already there replaces its score without evicting anything
+    evaluation_cache.store(1, 6.0)
+    assert evaluation_cache.lookup(1) == 6.0
+    assert len(evaluation_cache) == 3
+    assert evaluation_cache.evictions == 2
+
+    evaluation_cache.clear()
+    assert len(evaluation_cache) == 0
+
+
+def test_max_entries_must_be_positive():
+
+    with pytest.raises(ValueError):
+        EvaluationCache(Tronity.test_board_heuristic_three, max_entries=0)
+
+    assert EvaluationCache(Tronity.test_board_heuristic_three).hit_rate == 0.0
+
+
+def test_cached_scores_match_heuristic(random_positions):
+
+    heuristic = CountingHeuristic()
+    evaluation_cache = EvaluationCache(heuristic, max_entries=len(random_positions))
+
+    positions = random_positions[::20]
+
+    for _ in range(2):
+        for position in positions:
+            # Exactly the same floats, not just close
+            state_node = rootState(position, "upper")
+            assert evaluation_cache(state_node) == Tronity.test_board_heuristic_three(state_node)
+
+    # The second pass is all hits, unless a position came up twice in the first
+    assert heuristic.calls == evaluation_cache.misses == len(evaluation_cache)
+    assert evaluation_cache.hits + evaluation_cache.misses == 2 * len(positions)
+    assert evaluation_cache.hits >= len(positions)
+    assert evaluation_cache.evictions == 0
+
+
+def test_symmetric_cache_shares_transforms(random_positions):
+
+    heuristic = CountingHeuristic()
+    evaluation_cache = EvaluationCache(heuristic, symmetric=True)
+
+    position = random_positions[len(random_positions) // 2]
+    score = evaluation_cache(rootState(position, "upper"))
+
+    for transform in TRANSFORMS:
+        team, coord_dict, upper_thrown_num, lower_thrown_num = transformPosition(
+            transform, "upper", position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+        state_node = State_node(team, coord_dict, Tronity.pieceDictFromCoordDict(coord_dict), upper_thrown_num,
+                                lower_thrown_num, [], None, 0)
+
+        assert evaluation_cache(state_node) == score
+
+    assert heuristic.calls == 1
+    assert evaluation_cache.hits == len(TRANSFORMS)
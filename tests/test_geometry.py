@@ -0,0 +1,54 @@
+import Tronity
+from geometry import CELLS, HEX_DISTANCE, CELL_DISTANCE, PROXIMITY_MATRIX, HEX_PROXIMITY, NO_DISTANCE
+from geometry import distanceReductions
+
+import baseline
+from positions import baselineState
+
+
+def test_hex_distance_matches_baseline():
+
+    for i, c0 in enumerate(CELLS):
+        for j, c1 in enumerate(CELLS):
+            distance = baseline.manhattanDistance(c0, c1)
+
+            assert HEX_DISTANCE[c0][c1] == CELL_DISTANCE[i][j] == distance
+            assert HEX_PROXIMITY[c0][c1] == PROXIMITY_MATRIX[i, j] == max(3 - distance, 0)
+
+
+def test_distance_reductions_match_lookups():
+
+    # Both the table lookup and the NumPy path
+    for from_coords, to_coords in ((CELLS[:5], CELLS[-7:]), (CELLS, CELLS[::2]), (CELLS[:3], [])):
+        for proximity in (False, True):
+            minimums, sums = distanceReductions(list(from_coords), list(to_coords), proximity)
+
+            for coord, minimum, total in zip(from_coords, minimums, sums):
+                scores = [HEX_PROXIMITY[coord][to_coord] if proximity else HEX_DISTANCE[coord][to_coord]
+                          for to_coord in to_coords]
+
+                assert minimum == (min(scores) if scores else NO_DISTANCE)
+                assert total == sum(scores)
+
+
+def test_possible_moves_match_baseline(random_positions):
+
+    for position in random_positions:
+        state = baselineState("upper", position.coord_dict, position.piece_dict, position.upper_thrown_num,
+                              position.lower_thrown_num)
+
+        for team in ("upper", "lower"):
+            # Same moves in the same order
+            assert Tronity.getPossibleMoves(state, team) == baseline.getPossibleMoves(state, team)
+
+
+def test_valid_move_matches_baseline(random_positions):
+
+    for position in random_positions[::10]:
+        for from_pos in position.coord_dict:
+            # The baseline also let a piece swing back onto its own hex, which isn't a move
+            for to_pos in [cell for cell in CELLS if cell != from_pos]:
+                for team in ("upper", "lower"):
+                    for move_type in ("SLIDE", "SWING"):
+                        assert Tronity.validMove(team, move_type, from_pos, to_pos, position.coord_dict) == \
+                               baseline.validMove(team, move_type, from_pos, to_pos, position.coord_dict)
@@ -0,0 +1,65 @@
+import Tronity
+from Tronity import State_node, apply_joint_move, undo_joint_move, streamingSearch
+from incremental_evaluation import evaluationSummary, updateEvaluationSummary, summaryHeuristic
+from incremental_evaluation import incrementalHeuristic
+
+import baseline
+from test_search import rootState, searchPositions, seededPruning, moveScores
+
+
+def test_summary_heuristic_matches_baseline(random_positions):
+
+    for position in random_positions:
+        summary = evaluationSummary(position.piece_dict)
+
+        for team in ("upper", "lower"):
+            state_node = State_node(team, position.coord_dict, position.piece_dict, position.upper_thrown_num,
+                                    position.lower_thrown_num, [], None, 2)
+
+            # Exactly the same floats, not just close
+            assert summaryHeuristic(team, summary, position.upper_thrown_num, position.lower_thrown_num) == \
+                   baseline.test_board_heuristic_three(state_node)
+
+
+def test_updated_summary_matches_scratch(random_positions):
+
+    for position in random_positions:
+        coord_dict = Tronity.deepCopy(position.coord_dict)
+        piece_dict = Tronity.pieceDictFromCoordDict(coord_dict)
+
+        summary = evaluationSummary(piece_dict)
+
+        upper_thrown_num, lower_thrown_num, undo_record = apply_joint_move(
+            position.upper_move, position.lower_move, coord_dict, piece_dict, position.upper_thrown_num,
+            position.lower_thrown_num)
+
+        assert updateEvaluationSummary(summary, undo_record, coord_dict, piece_dict) == \
+               evaluationSummary(piece_dict)
+
+        # The move is the one the test game played
+        _, next_piece_dict, next_upper_thrown_num, next_lower_thrown_num = baseline.resolveMoves(
+            position.upper_move, position.lower_move, position.coord_dict, position.upper_thrown_num,
+            position.lower_thrown_num)
+
+        assert evaluationSummary(piece_dict) == evaluationSummary(next_piece_dict)
+        assert (upper_thrown_num, lower_thrown_num) == (next_upper_thrown_num, next_lower_thrown_num)
+
+        assert undo_joint_move(undo_record, coord_dict, piece_dict) == \
+               (position.upper_thrown_num, position.lower_thrown_num)
+        assert coord_dict == rootState(position, "upper").coord_dict
+        assert evaluationSummary(piece_dict) == summary
+
+
+def test_incremental_search_matches_search(random_positions):
+
+    for position in searchPositions(random_positions):
+        for team in ("upper", "lower"):
+            search_root = rootState(position, team)
+            streamingSearch(search_root, 2, seededPruning, Tronity.test_board_heuristic_three, position.turn_num)
+
+            # Every state's summary is updated from its parent's
+            incremental_root = rootState(position, team)
+            incremental_root.evaluation_summary = evaluationSummary(incremental_root.piece_dict)
+            streamingSearch(incremental_root, 2, seededPruning, incrementalHeuristic, position.turn_num)
+
+            assert moveScores(incremental_root) == moveScores(search_root)
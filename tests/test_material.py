@@ -0,0 +1,57 @@
+import Tronity
+from Tronity import State_node, materialSummary, materialGameEnded
+
+import baseline
+from positions import randomPositions
+
+
+def gamePositions(positions):
+    # (piece_dict, upper_thrown_num, lower_thrown_num, turn_num) of every position and the position its
+    # joint move leads to, which includes the last position of every game
+
+    for position in positions:
+        yield position.piece_dict, position.upper_thrown_num, position.lower_thrown_num, position.turn_num
+
+        _, piece_dict, upper_thrown_num, lower_thrown_num = baseline.resolveMoves(
+            position.upper_move, position.lower_move, position.coord_dict, position.upper_thrown_num,
+            position.lower_thrown_num)
+
+        yield piece_dict, upper_thrown_num, lower_thrown_num, position.turn_num + 1
+
+
+def test_material_game_ended_matches_baseline(random_positions):
+
+    # The test games and more random playouts
+    positions = random_positions + randomPositions(seed=1, games=10)
+
+    results = set()
+
+    for piece_dict, upper_thrown_num, lower_thrown_num, turn_num in gamePositions(positions):
+        material = materialSummary(piece_dict, upper_thrown_num, lower_thrown_num)
+
+        # Worked out when a state is created
+        state_node = State_node("upper", None, piece_dict, upper_thrown_num, lower_thrown_num, [], None, 0)
+        assert state_node.material == material
+
+        assert material.invincible == baseline.hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num)
+        assert Tronity.hasInvincibleToken(piece_dict, upper_thrown_num, lower_thrown_num) == material.invincible
+
+        for game_turn_num in (turn_num, 360):
+            result = baseline.gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, game_turn_num)
+
+            assert materialGameEnded(material, game_turn_num) == result
+            assert Tronity.gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, game_turn_num) == result
+
+            results.add(result)
+
+    # Every result came up
+    assert results == {Tronity.UPPER_WINS, Tronity.LOWER_WINS, Tronity.DRAW, Tronity.NOT_ENDED}
+
+
+def test_debug_prints_pieces(random_positions, capsys):
+
+    position = random_positions[-1]
+
+    Tronity.gameEnded(position.piece_dict, position.upper_thrown_num, position.lower_thrown_num, 360, debug=True)
+
+    assert capsys.readouterr().out == "Condition 5: draw\n{}\n".format(position.piece_dict)
@@ -0,0 +1,20 @@
+import random
+
+from bitboard import fromBoardDicts
+from mcts import mctsSearch
+
+
+def test_seeded_search_is_repeatable(random_positions):
+
+    for position in random_positions[::150]:
+        board = fromBoardDicts(position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+        moves = []
+        for _ in range(2):
+            random.seed(position.turn_num)
+            move, stats = mctsSearch(board, "upper", position.turn_num, iterations=50)
+
+            assert stats["iterations"] == 50
+            moves.append(move)
+
+        assert moves[0] == moves[1]
@@ -0,0 +1,36 @@
+import Tronity
+import bitboard
+from bitboard import fromBoardDicts
+from moves import THROW_MOVES, THROW_CODES, DECODED_MOVES, encodeMove, decodeMove
+
+import baseline
+from positions import baselineState
+
+
+def test_codes_round_trip(random_positions):
+
+    # Every move there is has its own code
+    assert all(encodeMove(move) == code for code, move in DECODED_MOVES.items())
+    assert len(set(DECODED_MOVES.values())) == len(DECODED_MOVES)
+
+    for position in random_positions:
+        board = fromBoardDicts(position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+        state = baselineState("upper", position.coord_dict, position.piece_dict, position.upper_thrown_num,
+                              position.lower_thrown_num)
+
+        for team in ("upper", "lower"):
+            assert all(decodeMove(encodeMove(move)) == move for move in baseline.getPossibleMoves(state, team))
+
+            assert [decodeMove(code) for code in bitboard.getPossibleMoveCodes(board, team)] == \
+                   bitboard.getPossibleMoves(board, team)
+
+
+def test_throw_moves_match_baseline():
+
+    for team in ("upper", "lower"):
+        for thrown_num in range(10):
+            # Same moves in the same order
+            assert Tronity.getThrowMoves(thrown_num, team) == baseline.getThrowMoves(thrown_num, team)
+
+            assert [decodeMove(code) for code in THROW_CODES[team][thrown_num]] == \
+                   list(THROW_MOVES[team][thrown_num])
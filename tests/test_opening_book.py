@@ -0,0 +1,126 @@
+import Tronity
+from Tronity import Player, State_node, getEmptyBoardConfigs, getPossibleMoves, resolveMoves
+from opening_book import OpeningBook, loadOpeningBook, writeOpeningBook, BOOK_TURNS
+from symmetry import TRANSFORMS, canonicalKey, transformPosition, transformMove
+from transposition import zobristKey
+
+
+def legalMoves(team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num):
+    state_node = State_node(team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num, [], None, 0)
+    return getPossibleMoves(state_node, team)
+
+
+def test_book_moves_are_legal():
+
+    opening_book = loadOpeningBook()
+    found = 0
+
+    for team in ("upper", "lower"):
+        positions = [getEmptyBoardConfigs() + (0, 0)]
+
+        # Follow the book move against every legal reply, as far as the book goes
+        for turn_num in range(1, BOOK_TURNS + 1):
+            next_positions = []
+
+            for coord_dict, piece_dict, upper_thrown_num, lower_thrown_num in positions:
+                move = opening_book.lookup(team, coord_dict, upper_thrown_num, lower_thrown_num)
+                if move is None:
+                    continue
+
+                found += 1
+                assert move in legalMoves(team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num)
+
+                if turn_num == BOOK_TURNS:
+                    continue
+
+                other_team = "lower" if team == "upper" else "upper"
+
+                for reply in legalMoves(other_team, coord_dict, piece_dict, upper_thrown_num, lower_thrown_num):
+                    upper_move, lower_move = (move, reply) if team == "upper" else (reply, move)
+                    next_positions.append(resolveMoves(upper_move, lower_move, coord_dict, upper_thrown_num,
+                                                       lower_thrown_num))
+
+            positions = next_positions
+
+        # At least the empty board and some of the replies to its move
+        assert found > 2
+
+
+def test_transformed_positions_share_entries(random_positions):
+
+    opening_book = OpeningBook()
+
+    for position in random_positions[::50]:
+        move = position.upper_move
+        opening_book.add("upper", position.coord_dict, position.upper_thrown_num, position.lower_thrown_num, move)
+
+        key, _ = canonicalKey("upper", position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+        transformed_positions = [transformPosition(transform, "upper", position.coord_dict, position.upper_thrown_num,
+                                                   position.lower_thrown_num) for transform in TRANSFORMS]
+
+        # A position that is its own transform (e.g. the empty board) stores the move of one of its transforms,
+        # which is just as good but not the same move
+        symmetric = len(set(zobristKey(*transformed_position) for transformed_position in transformed_positions)) < 4
+
+        for transform, (team, coord_dict, upper_thrown_num, lower_thrown_num) in zip(TRANSFORMS,
+                                                                                    transformed_positions):
+            assert canonicalKey(team, coord_dict, upper_thrown_num, lower_thrown_num)[0] == key
+
+            # The move comes back transformed for the transformed position, so it is still legal there
+            transformed_move = opening_book.lookup(team, coord_dict, upper_thrown_num, lower_thrown_num)
+            assert transformed_move in legalMoves(team, coord_dict, Tronity.pieceDictFromCoordDict(coord_dict),
+                                                  upper_thrown_num, lower_thrown_num)
+
+            if not symmetric:
+                assert transformed_move == transformMove(transform, move)
+
+                # And back again
+                assert transformMove(transform, transformed_move) == move
+
+
+def test_book_file_round_trip(tmp_path, random_positions):
+
+    opening_book = OpeningBook()
+    for position in random_positions[::50]:
+        opening_book.add("lower", position.coord_dict, position.upper_thrown_num, position.lower_thrown_num,
+                         position.lower_move)
+
+    path = tmp_path / "book.bin"
+    writeOpeningBook(opening_book, path)
+
+    assert loadOpeningBook(path).entries == opening_book.entries
+    assert loadOpeningBook(tmp_path / "missing.bin") is None
+
+
+class CountingBook(OpeningBook):
+    # Book with only upper's move on the empty board, that counts its lookups
+
+    def __init__(self, move):
+        super().__init__()
+        self.lookups = 0
+        self.add("upper", getEmptyBoardConfigs()[0], 0, 0, move)
+
+    def lookup(self, team, coord_dict, upper_thrown_num, lower_thrown_num):
+        self.lookups += 1
+        return super().lookup(team, coord_dict, upper_thrown_num, lower_thrown_num)
+
+
+def test_book_is_used_for_its_turns():
+
+    move = ("THROW", "s", (4, -2))
+
+    for turn_num in range(1, BOOK_TURNS + 2):
+        player = Player("upper", opening_book_path=None, tablebase_path=None)
+        player.opening_book = CountingBook(move)
+        player.turn_num = turn_num
+
+        if turn_num <= BOOK_TURNS:
+            assert player.action() == move
+            assert player.opening_book.lookups == 1
+        else:
+            # Searched, even though the position is in the book
+            player.action()
+            assert player.opening_book.lookups == 0
+
+        player.close()
@@ -0,0 +1,48 @@
+import random
+
+import Tronity
+from Tronity import Player, search_context
+
+from test_search import searchPositions
+
+
+def ponderingPlayer(position):
+    # Upper player at position and the move it chose, it has started pondering the replies to the move
+
+    player = Player("upper", ponder=True, opening_book_path=None, tablebase_path=None)
+
+    player.coord_dict = Tronity.deepCopy(position.coord_dict)
+    player.piece_dict = Tronity.pieceDictFromCoordDict(player.coord_dict)
+    player.upper_thrown_num = position.upper_thrown_num
+    player.lower_thrown_num = position.lower_thrown_num
+    player.turn_num = position.turn_num
+
+    return player, player.action()
+
+
+def test_pondering_keeps_to_its_thread(random_positions):
+
+    # Positions searched by the tree search, after the hand-coded openings
+    positions = [position for position in searchPositions(random_positions) if position.turn_num > 4]
+
+    for position in positions[:2]:
+        results = []
+
+        for finish in (False, True):
+            random.seed(position.turn_num)
+
+            player, move = ponderingPlayer(position)
+            nodes_before = search_context.joint_moves_applied
+
+            if finish:
+                player.ponder_thread.join()
+                assert player.pondered_trees != {}
+
+            player.close()
+
+            # The pondered searches don't count as this thread's nodes or use its random choices
+            assert search_context.joint_moves_applied == nodes_before
+
+            results.append((move, player.last_search_nodes, random.getstate()))
+
+        assert results[0] == results[1]
@@ -0,0 +1,316 @@
+import math
+import random
+import time
+
+import pytest
+
+import Tronity
+from Tronity import State_node, buildStateTree, calculateMoveScores, streamingSearch, smabSearch, getBestMove
+from Tronity import loadLeafBoard, iterativeDeepeningSearch, descendStateTree, extendStateTree
+from transposition import TranspositionTable, zobristKey
+from batch_evaluation import LeafBatch
+from bitboard import fromBoardDicts
+
+import baseline
+
+
+def seededPruning(state_node):
+    # test_pruning_three with its random choices seeded by the position, so a state gets the same moves
+    # however (and whenever) a search reaches it
+    random.seed(zobristKey(state_node.team, state_node.coord_dict, state_node.upper_thrown_num,
+                           state_node.lower_thrown_num))
+    return Tronity.test_pruning_three(state_node)
+
+
+def rootState(position, team):
+    # Search root for team at position, on a copy of the position's board (searches apply moves in place)
+    coord_dict = Tronity.deepCopy(position.coord_dict)
+    return State_node(team, coord_dict, Tronity.pieceDictFromCoordDict(coord_dict), position.upper_thrown_num,
+                      position.lower_thrown_num, [], None, 0)
+
+
+def searchPositions(random_positions):
+    # Positions from every stage of the test games that aren't over yet
+    return [position for position in random_positions[::100]
+            if Tronity.gameEnded(position.piece_dict, position.upper_thrown_num, position.lower_thrown_num,
+                                 position.turn_num) == Tronity.NOT_ENDED]
+
+
+def moveScores(state_node):
+    return [(primary_move_node.move, primary_move_node.average_score)
+            for primary_move_node in state_node.primary_move_list]
+
+
+def resetScoreSums(state_node):
+    # Clear the sums calculateMoveScores adds to, so the same tree can be scored again
+    for primary_move_node in state_node.primary_move_list:
+        primary_move_node.score_sum = 0
+
+        for secondary_move_node in primary_move_node.secondary_move_list:
+            resetScoreSums(secondary_move_node.state_node)
+
+
+def maximinScore(state_node):
+    # Pessimistic value of a state of a fully built and scored tree: its best primary move's worst outcome
+    if state_node.primary_move_list == []:
+        return state_node.score
+
+    return max(rowScore(primary_move_node) for primary_move_node in state_node.primary_move_list)
+
+
+def rowScore(primary_move_node):
+    return min(maximinScore(secondary_move_node.state_node)
+               for secondary_move_node in primary_move_node.secondary_move_list)
+
+
+def baselineHeuristic(state_node):
+    loadLeafBoard(state_node)
+    return baseline.test_board_heuristic_three(state_node)
+
+
+def test_tree_scores_match_baseline(random_positions):
+
+    for position in searchPositions(random_positions):
+        for team in ("upper", "lower"):
+            root_state = rootState(position, team)
+            buildStateTree(root_state, 2, seededPruning, position.turn_num)
+
+            baseline.calculateMoveScores(root_state, baselineHeuristic)
+            baseline_scores = moveScores(root_state)
+
+            resetScoreSums(root_state)
+            calculateMoveScores(root_state, Tronity.test_board_heuristic_three)
+
+            # Exactly the same floats, not just close
+            assert moveScores(root_state) == baseline_scores
+
+
+def test_streaming_search_matches_tree(random_positions):
+
+    for position in searchPositions(random_positions):
+        for team in ("upper", "lower"):
+            for desired_depth in (1, 2):
+                tree_root = rootState(position, team)
+                buildStateTree(tree_root, desired_depth, seededPruning, position.turn_num)
+                calculateMoveScores(tree_root, Tronity.test_board_heuristic_three)
+
+                stream_root = rootState(position, team)
+                streamingSearch(stream_root, desired_depth, seededPruning, Tronity.test_board_heuristic_three,
+                                position.turn_num)
+
+                # Exactly the same floats, not just close
+                assert moveScores(stream_root) == moveScores(tree_root)
+
+                # The board is put back as it was
+                assert stream_root.coord_dict == rootState(position, team).coord_dict
+
+
+def test_streaming_search_reuses_transposition_table(random_positions):
+
+    for position in searchPositions(random_positions):
+        for team in ("upper", "lower"):
+            transposition_table = TranspositionTable()
+
+            first_root = rootState(position, team)
+            streamingSearch(first_root, 2, seededPruning, Tronity.test_board_heuristic_three, position.turn_num,
+                            transposition_table)
+
+            # Every child of the root is in the table now, and adds its stored score as one term instead of
+            # one per primary move, so the sums can differ in their last bits
+            transposition_table.new_search()
+
+            second_root = rootState(position, team)
+            streamingSearch(second_root, 2, seededPruning, Tronity.test_board_heuristic_three, position.turn_num,
+                            transposition_table)
+
+            assert [move for move, _ in moveScores(second_root)] == [move for move, _ in moveScores(first_root)]
+            assert [score for _, score in moveScores(second_root)] == \
+                   pytest.approx([score for _, score in moveScores(first_root)], rel=1e-12)
+
+
+def test_smab_search_matches_maximin(random_positions):
+
+    for position in searchPositions(random_positions):
+        for team in ("upper", "lower"):
+            for desired_depth in (1, 2):
+                tree_root = rootState(position, team)
+                buildStateTree(tree_root, desired_depth, seededPruning, position.turn_num,
+                               heuristic_function=Tronity.test_board_heuristic_three)
+
+                smab_root = rootState(position, team)
+                score = smabSearch(smab_root, desired_depth, seededPruning, Tronity.test_board_heuristic_three,
+                                   position.turn_num)
+
+                assert score == maximinScore(tree_root)
+                assert len(smab_root.primary_move_list) == len(tree_root.primary_move_list)
+
+                for smab_move_node, tree_move_node in zip(smab_root.primary_move_list, tree_root.primary_move_list):
+                    assert smab_move_node.move == tree_move_node.move
+
+                    # Rows are either searched exactly or abandoned as no better than the best row
+                    if smab_move_node.average_score == -math.inf:
+                        assert rowScore(tree_move_node) <= score
+                    else:
+                        assert smab_move_node.average_score == rowScore(tree_move_node)
+
+                assert rowScore(next(move_node for move_node in tree_root.primary_move_list
+                                     if move_node.move == getBestMove(smab_root))) == score
+
+
+def scoredTree(state_node, turn_num, batched, extend=False):
+    # Build (or extend) state_node's tree to depth 2 and score it, as Player.action does if batched
+
+    transposition_table = TranspositionTable() if batched else None
+    leaf_batch = LeafBatch() if batched else None
+
+    build_function = extendStateTree if extend else buildStateTree
+    build_function(state_node, 2, seededPruning, turn_num, transposition_table=transposition_table,
+                   leaf_batch=leaf_batch)
+
+    if batched:
+        leaf_batch.evaluate(transposition_table)
+
+    calculateMoveScores(state_node, Tronity.test_board_heuristic_three, transposition_table)
+
+    return state_node
+
+
+@pytest.mark.parametrize("batched", [False, True])
+@pytest.mark.parametrize("team", ["upper", "lower"])
+def test_extended_tree_matches_fresh_tree(random_positions, team, batched):
+
+    extended = 0
+
+    for position in searchPositions(random_positions)[::2]:
+        tree_root = scoredTree(rootState(position, team), position.turn_num, batched)
+
+        # The best move, against the first replies whose states were expanded
+        primary_move = getBestMove(tree_root, randomly_choose_tie=False)
+        primary_move_node = next(primary_move_node for primary_move_node in tree_root.primary_move_list
+                                 if primary_move_node.move == primary_move)
+
+        for secondary_move_node in primary_move_node.secondary_move_list[:2]:
+            upper_move, lower_move = (primary_move, secondary_move_node.move) if team == "upper" else \
+                                     (secondary_move_node.move, primary_move)
+
+            coord_dict, piece_dict, upper_thrown_num, lower_thrown_num = Tronity.resolveMoves(
+                upper_move, lower_move, position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+            kept_root = descendStateTree(tree_root, primary_move, secondary_move_node.move)
+            if kept_root is None:
+                continue
+
+            board = boardContents(coord_dict)
+
+            kept_root.coord_dict = coord_dict
+            kept_root.piece_dict = piece_dict
+            scoredTree(kept_root, position.turn_num + 1, batched, extend=True)
+
+            fresh_root = State_node(team, Tronity.deepCopy(coord_dict), Tronity.pieceDictFromCoordDict(coord_dict),
+                                    upper_thrown_num, lower_thrown_num, [], None, 0)
+            scoredTree(fresh_root, position.turn_num + 1, batched)
+
+            # Exactly the same floats, not just close, so the same move
+            assert moveScores(kept_root) == moveScores(fresh_root)
+            assert getBestMove(kept_root, randomly_choose_tie=False) == \
+                   getBestMove(fresh_root, randomly_choose_tie=False)
+
+            # The board is put back as it was
+            assert boardContents(coord_dict) == board
+
+            extended += 1
+
+    assert extended > 0
+
+
+def boardContents(coord_dict):
+    return {coord: sorted(pieces) for coord, pieces in coord_dict.items() if pieces}
+
+
+def test_iterative_deepening_keeps_to_its_budget(random_positions):
+
+    for position in searchPositions(random_positions):
+        for team in ("upper", "lower"):
+            root_state = rootState(position, team)
+
+            start = time.monotonic()
+            move, depth = iterativeDeepeningSearch(root_state, seededPruning, Tronity.test_board_heuristic_three,
+                                                   position.turn_num, time_budget=0.02, max_depth=4)
+
+            # The deadline is checked between every pair of joint moves, so it is only overrun by one
+            assert time.monotonic() - start < 0.25
+            assert depth < 4
+            assert move in Tronity.getPossibleMoves(root_state, team)
+
+
+@pytest.mark.parametrize("search_function", [streamingSearch, smabSearch])
+def test_iterative_deepening_matches_fixed_depth(random_positions, search_function):
+
+    for position in searchPositions(random_positions)[::2]:
+        for team in ("upper", "lower"):
+            move, depth = iterativeDeepeningSearch(rootState(position, team), seededPruning,
+                                                   Tronity.test_board_heuristic_three, position.turn_num,
+                                                   time_budget=60, max_depth=2, search_function=search_function)
+
+            fixed_root = rootState(position, team)
+            search_function(fixed_root, 2, seededPruning, Tronity.test_board_heuristic_three, position.turn_num)
+
+            assert depth == 2
+            assert move == getBestMove(fixed_root)
+
+
+def test_parallel_root_search_matches_tree(random_positions):
+
+    positions = searchPositions(random_positions)[::2]
+
+    for position in positions:
+        tree_root = rootState(position, "upper")
+        buildStateTree(tree_root, 2, seededPruning, position.turn_num)
+        calculateMoveScores(tree_root, Tronity.test_board_heuristic_three)
+
+        board = tuple(fromBoardDicts(position.coord_dict, position.upper_thrown_num, position.lower_thrown_num))
+        secondary_moves = [secondary_move_node.move
+                           for secondary_move_node in tree_root.primary_move_list[0].secondary_move_list]
+
+        # In this process, with batched leaves
+        Tronity._initSearchWorker()
+
+        for primary_move_node in tree_root.primary_move_list:
+            _, average_score, _ = Tronity._searchPrimaryMove(
+                board, "upper", position.turn_num, primary_move_node.move, secondary_moves, 2, seededPruning,
+                None, 0)
+
+            assert average_score == primary_move_node.average_score
+
+    # The functions are sent to the worker processes
+    process_pool = Tronity.createSearchPool(2)
+
+    try:
+        for position in positions:
+            tree_root = rootState(position, "upper")
+            buildStateTree(tree_root, 2, seededPruning, position.turn_num)
+            calculateMoveScores(tree_root, Tronity.test_board_heuristic_three)
+
+            parallel_root = rootState(position, "upper")
+            Tronity.parallelRootSearch(parallel_root, 2, seededPruning, position.turn_num, process_pool,
+                                       Tronity.test_board_heuristic_three)
+
+            # Exactly the same floats, not just close
+            assert moveScores(parallel_root) == moveScores(tree_root)
+
+        # With the pruning function's own random choices, the same seed gives the same search
+        for position in positions:
+            results = []
+
+            for _ in range(2):
+                random.seed(1)
+
+                parallel_root = rootState(position, "upper")
+                Tronity.parallelRootSearch(parallel_root, 2, Tronity.test_pruning_three, position.turn_num,
+                                           process_pool)
+
+                results.append(moveScores(parallel_root))
+
+            assert results[0] == results[1]
+    finally:
+        process_pool.shutdown()
@@ -0,0 +1,88 @@
+from collections import Counter
+
+import Tronity
+from Tronity import buildStateTree, calculateMoveScores, streamingSearch
+from search_stats import SearchStats
+from transposition import TranspositionTable
+
+from test_search import rootState, searchPositions, seededPruning
+
+
+def treeCounts(state_node, desired_depth, counts):
+    # Count a built tree's states the way SearchStats does: expanded states (and their moves), leaves,
+    # states not expanded because the game had ended and states taking their scores from another one
+
+    counts["states"] += 1
+
+    if state_node.primary_move_list != []:
+        counts["nodes_expanded"] += 1
+        counts["primary_moves"] += len(state_node.primary_move_list)
+        counts["secondary_moves"] += len(state_node.primary_move_list[0].secondary_move_list)
+    elif state_node.transposed_state is not None:
+        counts["transposition_hits"] += 1
+    else:
+        counts["leaves_evaluated"] += 1
+
+        if state_node.node_depth < desired_depth:
+            counts["game_ended_cutoffs"] += 1
+
+    for primary_move_node in state_node.primary_move_list:
+        for secondary_move_node in primary_move_node.secondary_move_list:
+            treeCounts(secondary_move_node.state_node, desired_depth, counts)
+
+    return counts
+
+
+def test_stats_match_tree(random_positions):
+
+    for index, position in enumerate(searchPositions(random_positions)):
+        team = ("upper", "lower")[index % 2]
+
+        for transposition_table in (None, TranspositionTable()):
+            search_stats = SearchStats()
+
+            tree_root = rootState(position, team)
+            buildStateTree(tree_root, 2, seededPruning, position.turn_num, transposition_table=transposition_table,
+                           search_stats=search_stats)
+
+            # The leaves are evaluated when the tree is scored
+            assert search_stats.leaves_evaluated == 0
+            calculateMoveScores(tree_root, Tronity.test_board_heuristic_three, search_stats=search_stats)
+            search_stats.finish()
+
+            counts = treeCounts(tree_root, 2, Counter())
+
+            assert search_stats.nodes_expanded == counts["nodes_expanded"]
+            assert search_stats.primary_moves == counts["primary_moves"]
+            assert search_stats.secondary_moves == counts["secondary_moves"]
+            assert search_stats.leaves_evaluated == counts["leaves_evaluated"]
+            assert search_stats.game_ended_cutoffs == counts["game_ended_cutoffs"]
+            assert search_stats.transposition_hits == counts["transposition_hits"]
+
+            # Every state of the tree is kept
+            assert search_stats.live_states == search_stats.peak_states == counts["states"]
+
+            assert search_stats.primary_branching == counts["primary_moves"] / counts["nodes_expanded"]
+            assert search_stats.total_time >= search_stats.pruning_time + search_stats.resolve_time
+
+            if transposition_table is None:
+                tree_counts = counts
+
+        # The streaming search expands and evaluates the same states, keeping only the current path
+        stream_stats = SearchStats()
+        streamingSearch(rootState(position, team), 2, seededPruning, Tronity.test_board_heuristic_three,
+                        position.turn_num, search_stats=stream_stats)
+
+        assert stream_stats.nodes_expanded == tree_counts["nodes_expanded"]
+        assert stream_stats.leaves_evaluated == tree_counts["leaves_evaluated"]
+        assert stream_stats.game_ended_cutoffs == tree_counts["game_ended_cutoffs"]
+        assert stream_stats.live_states == 1
+        assert stream_stats.peak_states == 3
+
+
+def test_stats_of_an_empty_search():
+
+    search_stats = SearchStats()
+
+    assert search_stats.primary_branching == search_stats.secondary_branching == 0.0
+    assert search_stats.asDict()["nodes_expanded"] == 0
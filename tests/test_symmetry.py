@@ -0,0 +1,109 @@
+import Tronity
+from Tronity import State_node, getPossibleMoves
+from geometry import CELLS
+from symmetry import TRANSFORMS, SWAP, transformCell, transformPosition, transformMove, canonicalKey
+from transposition import zobristKey
+
+import baseline
+
+
+def boardContents(coord_dict):
+    # Pieces on each occupied hex, in a fixed order
+    return {coord: sorted(pieces) for coord, pieces in coord_dict.items() if pieces}
+
+
+def positionContents(team, coord_dict, upper_thrown_num, lower_thrown_num):
+    return team, boardContents(coord_dict), upper_thrown_num, lower_thrown_num
+
+
+def legalMoves(team, coord_dict, upper_thrown_num, lower_thrown_num):
+    state_node = State_node(team, coord_dict, Tronity.pieceDictFromCoordDict(coord_dict), upper_thrown_num,
+                            lower_thrown_num, [], None, 0)
+    return getPossibleMoves(state_node, team)
+
+
+def test_transforms_are_involutions(random_positions):
+
+    for transform in TRANSFORMS:
+        # Every cell is mapped onto a cell, and back
+        assert sorted(transformCell(cell, transform) for cell in CELLS) == sorted(CELLS)
+        assert all(transformCell(transformCell(cell, transform), transform) == cell for cell in CELLS)
+
+    for position in random_positions[::25]:
+        for team in ("upper", "lower"):
+            original = (team, position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+            for transform in TRANSFORMS:
+                transformed = transformPosition(transform, *original)
+
+                assert positionContents(*transformPosition(transform, *transformed)) == positionContents(*original)
+                assert transformMove(transform, transformMove(transform, position.upper_move)) == \
+                       position.upper_move
+
+
+def test_transforms_preserve_moves(random_positions):
+
+    for position in random_positions[::25]:
+        for transform in TRANSFORMS:
+            for team in ("upper", "lower"):
+                transformed_team, coord_dict, upper_thrown_num, lower_thrown_num = transformPosition(
+                    transform, team, position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+                # A team's legal moves are the transformed team's legal moves in the transformed position
+                assert sorted(transformMove(transform, move) for move in legalMoves(
+                    team, position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)) == \
+                       sorted(legalMoves(transformed_team, coord_dict, upper_thrown_num, lower_thrown_num))
+
+
+def test_transforms_preserve_resolve_moves(random_positions):
+
+    for position in random_positions[::5]:
+        next_position = baseline.resolveMoves(position.upper_move, position.lower_move, position.coord_dict,
+                                              position.upper_thrown_num, position.lower_thrown_num)
+        next_coord_dict, _, next_upper_thrown_num, next_lower_thrown_num = next_position
+
+        for transform in TRANSFORMS:
+            team, coord_dict, upper_thrown_num, lower_thrown_num = transformPosition(
+                transform, "upper", position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+            # Swapping the teams swaps whose move is whose
+            upper_move = transformMove(transform, position.upper_move)
+            lower_move = transformMove(transform, position.lower_move)
+            if transform & SWAP:
+                upper_move, lower_move = lower_move, upper_move
+
+            # Resolving the transformed moves gives the transform of the resolved position
+            transformed_next = baseline.resolveMoves(upper_move, lower_move, coord_dict, upper_thrown_num,
+                                                     lower_thrown_num)
+
+            assert positionContents(team, transformed_next[0], *transformed_next[2:]) == \
+                   positionContents(*transformPosition(transform, "upper", next_coord_dict, next_upper_thrown_num,
+                                                       next_lower_thrown_num))
+
+
+def test_canonical_key_is_smallest_transform(random_positions):
+
+    for position in random_positions[::25]:
+        for team in ("upper", "lower"):
+            keys = [zobristKey(*transformPosition(transform, team, position.coord_dict, position.upper_thrown_num,
+                                                  position.lower_thrown_num))
+                    for transform in TRANSFORMS]
+
+            key, transform = canonicalKey(team, position.coord_dict, position.upper_thrown_num,
+                                          position.lower_thrown_num)
+
+            assert key == min(keys)
+            assert keys[transform] == key
+
+            # Transforms have the same heuristic score, so symmetric evaluation caches can share them
+            scores = set()
+
+            for transform in TRANSFORMS:
+                transformed_team, coord_dict, upper_thrown_num, lower_thrown_num = transformPosition(
+                    transform, team, position.coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+                scores.add(Tronity.test_board_heuristic_three(State_node(
+                    transformed_team, coord_dict, Tronity.pieceDictFromCoordDict(coord_dict), upper_thrown_num,
+                    lower_thrown_num, [], None, 0)))
+
+            assert len(scores) == 1
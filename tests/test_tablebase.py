@@ -0,0 +1,184 @@
+import random
+
+import pytest
+
+import Tronity
+from Tronity import Player, State_node, buildStateTree, calculateMoveScores
+from batch_evaluation import LeafBatch
+from bitboard import fromBoardDicts
+from geometry import CELLS
+from tablebase import Tablebase, generateTablebase, writeTablebase, tablebaseMove, tablebaseHeuristic
+from tablebase import TABLEBASE_WIN_SCORE
+
+import baseline
+from positions import baselineState
+from test_search import seededPruning, moveScores
+
+
+# Tablebase of every position with up to 2 tokens, all of which have ended, so the tables of both sizes can be
+# checked by hand and positions with one token more have moves that end the game
+TABLE_TOKENS = 2
+
+
+@pytest.fixture(scope="module")
+def tablebase_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("tablebase") / "tablebase.bin"
+    writeTablebase(generateTablebase(TABLE_TOKENS), TABLE_TOKENS, str(path))
+    return str(path)
+
+
+def randomPosition(rng, token_count):
+    # coord_dict of token_count random tokens, both teams having thrown all 9, with one symbol per hex
+
+    coord_dict = baseline.dd(list)
+
+    while sum(map(len, coord_dict.values())) < token_count:
+        coord = rng.choice(CELLS)
+        piece = rng.choice("rpsRPS")
+
+        if all(other.lower() == piece.lower() for other in coord_dict[coord]):
+            coord_dict[coord].append(piece)
+
+    return coord_dict
+
+
+def forcedWinMoves(coord_dict, team):
+    # Moves of team that win whatever the other team plays, by playing them all out with the baseline
+
+    piece_dict = Tronity.pieceDictFromCoordDict(coord_dict)
+    state = baselineState(team, coord_dict, piece_dict, 9, 9)
+
+    win = baseline.UPPER_WINS if team == "upper" else baseline.LOWER_WINS
+
+    winning_moves = []
+
+    for move in baseline.getPossibleMoves(state, team):
+        for reply in baseline.getPossibleMoves(state, "lower" if team == "upper" else "upper"):
+            upper_move, lower_move = (move, reply) if team == "upper" else (reply, move)
+
+            _, next_piece_dict, upper_thrown_num, lower_thrown_num = baseline.resolveMoves(
+                upper_move, lower_move, coord_dict, 9, 9)
+
+            if baseline.gameEnded(next_piece_dict, upper_thrown_num, lower_thrown_num, 2) != win:
+                break
+        else:
+            winning_moves.append(move)
+
+    return winning_moves
+
+
+@pytest.mark.parametrize("max_tokens", [1, 2])
+def test_table_matches_game_end(tmp_path, max_tokens):
+
+    path = tmp_path / "tablebase.bin"
+    writeTablebase(generateTablebase(max_tokens), max_tokens, str(path))
+
+    tablebase = Tablebase(str(path))
+    rng = random.Random(max_tokens)
+
+    for _ in range(500):
+        token_count = rng.randint(0, max_tokens + 1)
+        coord_dict = randomPosition(rng, token_count)
+        board = fromBoardDicts(coord_dict, 9, 9)
+
+        assert tablebase.covers(board) == (token_count <= max_tokens)
+
+        if token_count > max_tokens:
+            assert tablebase.probe(board) is None
+            continue
+
+        # With this few tokens every position has ended (or is a draw), so its entry is its result
+        result = baseline.gameEnded(Tronity.pieceDictFromCoordDict(coord_dict), 9, 9, 1)
+        assert tablebase.probe(board) == (result, 0)
+
+    # Only positions with everything thrown are in the table
+    assert tablebase.probe(fromBoardDicts(baseline.dd(list), 8, 9)) is None
+
+    tablebase.close()
+
+
+# Positions with one token more than the table that a team can win in one move: the other team can only
+# move one of its two tokens off the hex under attack, and the last one is no match for the attacker
+WINNING_POSITIONS = [{(1, -2): ["S", "S"], (0, -2): ["r"]}, {(-1, 2): ["s", "s"], (0, 2): ["R"]}]
+
+
+def test_table_moves_are_forced_wins(tablebase_path):
+
+    tablebase = Tablebase(tablebase_path)
+    rng = random.Random(3)
+
+    positions = [baseline.dd(list, position) for position in WINNING_POSITIONS]
+    positions += [randomPosition(rng, TABLE_TOKENS + 1) for _ in range(300)]
+
+    wins = 0
+
+    for coord_dict in positions:
+        if baseline.gameEnded(Tronity.pieceDictFromCoordDict(coord_dict), 9, 9, 1) != baseline.NOT_ENDED:
+            continue
+
+        for team in ("upper", "lower"):
+            move = tablebaseMove(tablebase, fromBoardDicts(coord_dict, 9, 9), team)
+            winning_moves = forcedWinMoves(coord_dict, team)
+
+            if winning_moves:
+                wins += 1
+                assert move in winning_moves
+            else:
+                assert move is None
+
+    assert wins >= len(WINNING_POSITIONS)
+
+    tablebase.close()
+
+
+def test_leaves_are_scored_from_table(tablebase_path):
+
+    tablebase = Tablebase(tablebase_path)
+    rng = random.Random(4)
+
+    table_leaves = 0
+
+    for _ in range(30):
+        coord_dict = randomPosition(rng, TABLE_TOKENS + 1)
+        piece_dict = Tronity.pieceDictFromCoordDict(coord_dict)
+
+        if baseline.gameEnded(piece_dict, 9, 9, 1) != baseline.NOT_ENDED:
+            continue
+
+        for team in ("upper", "lower"):
+            # Every leaf is below the root, whose position isn't in the table
+            batch_root = State_node(team, Tronity.deepCopy(coord_dict), Tronity.deepCopy(piece_dict), 9, 9, [],
+                                    None, 0)
+            leaf_batch = LeafBatch(tablebase=tablebase)
+            buildStateTree(batch_root, 1, seededPruning, 50, leaf_batch=leaf_batch)
+            leaf_batch.evaluate()
+
+            for leaf in Tronity.getLeafStates(batch_root):
+                if abs(leaf.score) == TABLEBASE_WIN_SCORE:
+                    table_leaves += 1
+
+            calculateMoveScores(batch_root, Tronity.test_board_heuristic_three)
+
+            # The same scores as the tablebase's heuristic
+            tree_root = State_node(team, Tronity.deepCopy(coord_dict), Tronity.deepCopy(piece_dict), 9, 9, [],
+                                   None, 0)
+            buildStateTree(tree_root, 1, seededPruning, 50,
+                           heuristic_function=tablebaseHeuristic(tablebase, Tronity.test_board_heuristic_three))
+            calculateMoveScores(tree_root, None)
+
+            assert moveScores(batch_root) == moveScores(tree_root)
+
+    assert table_leaves > 0
+
+    tablebase.close()
+
+
+def test_player_closes_table(tablebase_path):
+
+    player = Player("upper", opening_book_path=None, tablebase_path=tablebase_path)
+    tablebase = player.tablebase
+
+    player.close()
+
+    assert player.tablebase is None
+    assert tablebase.map.closed and tablebase.file.closed
@@ -0,0 +1,94 @@
+import json
+import sys
+
+import pytest
+
+import tournament
+from tournament import RandomPlayer, parseAgent, scheduleGames
+from Tronity import Player
+
+
+def test_schedule_swaps_colours():
+
+    assert scheduleGames([("player", "random"), ("a", "b")], 3, 10) == [
+        (0, "player", "random", 10), (1, "random", "player", 11), (2, "player", "random", 12),
+        (3, "a", "b", 13), (4, "b", "a", 14), (5, "a", "b", 15)]
+
+
+def test_parse_agent():
+
+    assert parseAgent("random") == (RandomPlayer, {})
+    assert parseAgent("player:") == (Player, {})
+
+    # Python literals, anything else is a string
+    assert parseAgent("player:time_budget=0.5,max_depth=3,reuse_tree=False,opening_book_path=None,"
+                      "search_engine=smab,tablebase_path='tb.bin'") == \
+           (Player, {"time_budget": 0.5, "max_depth": 3, "reuse_tree": False, "opening_book_path": None,
+                     "search_engine": "smab", "tablebase_path": "tb.bin"})
+
+    with pytest.raises(ValueError):
+        parseAgent("minimax")
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_failed_games_are_recorded(tmp_path, monkeypatch, capsys, workers):
+
+    output = tmp_path / "games.jsonl"
+
+    # The second pairing's Player can't be made, the other games are still played
+    monkeypatch.setattr(sys, "argv", ["tournament.py", "--games", "2", "--seed", "5", "--workers", str(workers),
+                                      "--pairing", "random", "random",
+                                      "--pairing", "random", "player:search_engine=minimax",
+                                      "--output", str(output)])
+    tournament.main()
+
+    records = sorted((json.loads(line) for line in output.read_text().splitlines()),
+                     key=lambda record: record["game"])
+
+    assert [(record["game"], record["seed"]) for record in records] == [(0, 5), (1, 6), (2, 7), (3, 8)]
+
+    for record in records[:2]:
+        assert record["result"] in ("upper", "lower", "draw")
+        assert record["winner"] == (None if record["result"] == "draw" else record["result"])
+        assert record["turns"] > 0
+
+    for record in records[2:]:
+        assert record["result"] == "error"
+        assert record["winner"] is None
+        assert "minimax" in record["error"]
+
+    assert "error: 2" in capsys.readouterr().err
+
+
+class CrashingPlayer(RandomPlayer):
+    # Random agent that fails on its third move
+
+    closed = 0
+
+    def __init__(self, player):
+        super().__init__(player)
+        self.moves = 0
+
+    def action(self):
+        self.moves += 1
+        if self.moves == 3:
+            raise RuntimeError("crashed")
+        return super().action()
+
+    def close(self):
+        CrashingPlayer.closed += 1
+
+
+def test_game_failing_part_way_is_recorded(monkeypatch):
+
+    monkeypatch.setitem(tournament.AGENTS, "crashing", CrashingPlayer)
+
+    record = tournament.playGame(0, "random", "crashing", 1)
+
+    assert record["result"] == "error"
+    assert "RuntimeError: crashed" in record["error"]
+
+    # The players are closed however the game ends
+    assert CrashingPlayer.closed == 1
+
+    assert tournament.playGame(1, "random", "random", 1)["result"] != "error"
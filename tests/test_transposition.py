@@ -0,0 +1,135 @@
+from collections import Counter
+
+import Tronity
+from Tronity import apply_joint_move, undo_joint_move, buildStateTree, calculateMoveScores
+from transposition import TranspositionTable, zobristKey, updateZobristKey
+
+from test_search import rootState, searchPositions, seededPruning, moveScores
+
+
+def test_updated_key_matches_scratch(random_positions):
+
+    for position in random_positions:
+        coord_dict = Tronity.deepCopy(position.coord_dict)
+        piece_dict = Tronity.pieceDictFromCoordDict(coord_dict)
+
+        for team in ("upper", "lower"):
+            key = zobristKey(team, coord_dict, position.upper_thrown_num, position.lower_thrown_num)
+
+            upper_thrown_num, lower_thrown_num, undo_record = apply_joint_move(
+                position.upper_move, position.lower_move, coord_dict, piece_dict, position.upper_thrown_num,
+                position.lower_thrown_num)
+
+            assert updateZobristKey(key, undo_record, coord_dict, upper_thrown_num, lower_thrown_num) == \
+                   zobristKey(team, coord_dict, upper_thrown_num, lower_thrown_num)
+
+            undo_joint_move(undo_record, coord_dict, piece_dict)
+
+            assert zobristKey(team, coord_dict, position.upper_thrown_num, position.lower_thrown_num) == key
+
+
+def test_key_ignores_piece_order():
+
+    coord_dict = {(0, 0): ["r", "R", "r"], (1, 1): ["p"]}
+    reordered = {(1, 1): ["p"], (0, 0): ["r", "r", "R"], (2, 2): []}
+
+    assert zobristKey("upper", coord_dict, 3, 2) == zobristKey("upper", reordered, 3, 2)
+    assert zobristKey("upper", coord_dict, 3, 2) != zobristKey("lower", coord_dict, 3, 2)
+    assert zobristKey("upper", coord_dict, 3, 2) != zobristKey("upper", coord_dict, 2, 3)
+
+
+def test_depth_preferred_replacement():
+
+    transposition_table = TranspositionTable(size_power=4)
+
+    # Keys of the same slot
+    key, other_key = 5, 5 + (1 << 4)
+
+    transposition_table.store(key, 2, 1.0)
+
+    assert transposition_table.probe(key, 2) == 1.0
+    assert transposition_table.probe(key, 1) == 1.0
+    assert transposition_table.probe(key, 3) is None
+    assert transposition_table.probe(other_key, 0) is None
+    assert (transposition_table.hits, transposition_table.misses) == (2, 2)
+
+    # A shallower search of another position doesn't replace the entry, a search as deep does
+    transposition_table.store(other_key, 1, 2.0)
+    assert transposition_table.probe(key, 2) == 1.0
+
+    transposition_table.store(other_key, 2, 3.0)
+    assert transposition_table.probe(key, 0) is None
+    assert transposition_table.probe(other_key, 2) == 3.0
+
+    # The same position is always replaced
+    transposition_table.store(other_key, 0, 4.0)
+    assert transposition_table.probe(other_key, 0) == 4.0
+    assert transposition_table.probe(other_key, 1) is None
+
+    transposition_table.store(key, 3, 5.0)
+    assert transposition_table.stores == 4
+
+
+def test_old_entries_are_replaced():
+
+    transposition_table = TranspositionTable(size_power=4)
+    key, other_key = 7, 7 + (1 << 4)
+
+    transposition_table.store(key, 3, 1.0)
+    transposition_table.store(other_key, 0, 2.0)
+    assert transposition_table.probe(key, 3) == 1.0
+
+    # Entries from earlier searches are still found, but anything may replace them
+    transposition_table.new_search()
+    assert transposition_table.probe(key, 3) == 1.0
+
+    transposition_table.store(other_key, 0, 2.0)
+    assert transposition_table.probe(key, 0) is None
+    assert transposition_table.probe(other_key, 0) == 2.0
+
+    transposition_table.clear()
+    assert transposition_table.probe(other_key, 0) is None
+
+
+def expandedStates(state_node, counts):
+    # Count the expanded states of a tree by (Zobrist key, search depth), and the states taking their
+    # scores from another state (under None)
+
+    if state_node.primary_move_list != []:
+        counts[(state_node.zobrist_key, state_node.search_depth)] += 1
+    elif state_node.transposed_state is not None:
+        counts[None] += 1
+
+    for primary_move_node in state_node.primary_move_list:
+        for secondary_move_node in primary_move_node.secondary_move_list:
+            expandedStates(secondary_move_node.state_node, counts)
+
+    return counts
+
+
+def test_transposed_states_are_expanded_once(random_positions):
+
+    transposed = 0
+
+    for index, position in enumerate(searchPositions(random_positions)):
+        team = ("upper", "lower")[index % 2]
+
+        tree_root = rootState(position, team)
+        buildStateTree(tree_root, 2, seededPruning, position.turn_num)
+        calculateMoveScores(tree_root, Tronity.test_board_heuristic_three)
+
+        transposition_root = rootState(position, team)
+        buildStateTree(transposition_root, 2, seededPruning, position.turn_num,
+                       transposition_table=TranspositionTable())
+        calculateMoveScores(transposition_root, Tronity.test_board_heuristic_three)
+
+        counts = expandedStates(transposition_root, Counter())
+        transposed += counts.pop(None, 0)
+
+        assert max(counts.values()) == 1
+
+        # Exactly the same floats, not just close
+        assert moveScores(transposition_root) == moveScores(tree_root)
+
+    # Some states were reached by more than one joint move
+    assert transposed > 0
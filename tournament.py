@@ -0,0 +1,235 @@
+"""
+Self-play tournament runner.
+
+Plays games between agents across a process pool and writes one JSON line per game as each game
+finishes. A game whose agent raises an exception is recorded with the result "error" and its
+traceback, and the other games are still played. For example, 50 games of the default Player against
+a random agent and 50 against a Player using simultaneous-move alpha-beta, with colours swapped every
+game:
+
+    python tournament.py --games 50 --pairing player random --pairing player player:search_engine=smab
+
+An agent is a name from AGENTS, optionally followed by ':' and comma separated keyword arguments
+for it (values are Python literals, anything else is taken as a string).
+"""
+
+import argparse
+import ast
+import json
+import os
+import random
+import sys
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Tronity import Player, State_node, getEmptyBoardConfigs, getPossibleMoves, resolveMoves, gameEnded
+from Tronity import UPPER_WINS, LOWER_WINS, DRAW
+
+
+class RandomPlayer:
+    # Plays a uniformly random legal move every turn (same interface as Tronity.Player)
+
+    def __init__(self, player):
+
+        self.team = player
+
+        self.coord_dict, self.piece_dict = getEmptyBoardConfigs()
+
+        self.upper_thrown_num = 0
+        self.lower_thrown_num = 0
+
+        self.last_search_nodes = 0
+
+    def action(self):
+
+        state_node = State_node(team=self.team, coord_dict=self.coord_dict, piece_dict=self.piece_dict,
+                                upper_thrown_num=self.upper_thrown_num, lower_thrown_num=self.lower_thrown_num,
+                                primary_move_list=[], parent_secondary_node=None, node_depth=0)
+
+        return random.choice(getPossibleMoves(state_node, self.team))
+
+    def update(self, opponent_action, player_action):
+
+        if self.team == "upper":
+            upper_move, lower_move = player_action, opponent_action
+        else:
+            upper_move, lower_move = opponent_action, player_action
+
+        self.coord_dict, self.piece_dict, self.upper_thrown_num, self.lower_thrown_num = resolveMoves(
+            upper_move, lower_move, self.coord_dict, self.upper_thrown_num, self.lower_thrown_num)
+
+    def close(self):
+        pass
+
+
+AGENTS = {"player": Player, "random": RandomPlayer}
+
+RESULT_NAMES = {UPPER_WINS: "upper", LOWER_WINS: "lower", DRAW: "draw"}
+
+
+def parseAgent(agent_spec):
+    # "name:key=value,key=value" -> (agent class, keyword arguments)
+
+    name, _, arguments = agent_spec.partition(":")
+
+    if name not in AGENTS:
+        raise ValueError('agent of:', name, 'is not one of', tuple(AGENTS))
+
+    kwargs = {}
+
+    for argument in filter(None, arguments.split(",")):
+        key, _, value = argument.partition("=")
+        try:
+            kwargs[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            kwargs[key] = value
+
+    return AGENTS[name], kwargs
+
+
+def errorRecord(game_index, upper_spec, lower_spec, seed, error):
+    # Result record of a game that couldn't be finished, error is the traceback
+    return {"game": game_index, "seed": seed, "upper": upper_spec, "lower": lower_spec, "result": "error",
+            "winner": None, "error": error}
+
+
+def playGame(game_index, upper_spec, lower_spec, seed):
+    # Play one game and return its result record. winner is the winning side ("upper" or "lower", None
+    # for a draw), the agents playing each side are under "upper" and "lower"
+
+    random.seed(seed)
+
+    players = {}
+
+    try:
+        for team, agent_spec in (("upper", upper_spec), ("lower", lower_spec)):
+            agent, kwargs = parseAgent(agent_spec)
+            players[team] = agent(team, **kwargs)
+
+        move_times = {"upper": [], "lower": []}
+        nodes = {"upper": 0, "lower": 0}
+
+        coord_dict, piece_dict = getEmptyBoardConfigs()
+        upper_thrown_num = 0
+        lower_thrown_num = 0
+        turn_num = 1
+
+        while not gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, turn_num):
+
+            moves = {}
+            for team, player in players.items():
+                start = time.perf_counter()
+                moves[team] = player.action()
+                move_times[team].append(time.perf_counter() - start)
+
+                nodes[team] += player.last_search_nodes
+
+            players["upper"].update(moves["lower"], moves["upper"])
+            players["lower"].update(moves["upper"], moves["lower"])
+
+            coord_dict, piece_dict, upper_thrown_num, lower_thrown_num = resolveMoves(
+                moves["upper"], moves["lower"], coord_dict, upper_thrown_num, lower_thrown_num)
+
+            turn_num += 1
+
+    except Exception:
+        return errorRecord(game_index, upper_spec, lower_spec, seed, traceback.format_exc())
+
+    finally:
+        # Players may hold worker processes (parallel_workers) or a pondering thread
+        for player in players.values():
+            player.close()
+
+    result = RESULT_NAMES[gameEnded(piece_dict, upper_thrown_num, lower_thrown_num, turn_num)]
+
+    record = {"game": game_index, "seed": seed, "upper": upper_spec, "lower": lower_spec, "result": result,
+              "winner": result if result != "draw" else None, "turns": turn_num - 1}
+
+    for team in ("upper", "lower"):
+        times = move_times[team]
+        record[team + "_move_time"] = {"mean": sum(times) / len(times), "max": max(times)}
+        record[team + "_nodes"] = nodes[team]
+
+    return record
+
+
+def scheduleGames(pairings, games, seed):
+    # (game_index, upper_spec, lower_spec, seed) for every game, colours swap every other game of a pairing
+
+    schedule = []
+
+    for first_spec, second_spec in pairings:
+        for pairing_game in range(games):
+
+            if pairing_game % 2 == 0:
+                upper_spec, lower_spec = first_spec, second_spec
+            else:
+                upper_spec, lower_spec = second_spec, first_spec
+
+            game_index = len(schedule)
+            schedule.append((game_index, upper_spec, lower_spec, seed + game_index))
+
+    return schedule
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Play games between agents and write one JSON line per game.")
+    parser.add_argument("--pairing", nargs=2, action="append", metavar=("AGENT", "AGENT"),
+                        help="agents to play against each other (repeatable), default: player random")
+    parser.add_argument("--games", type=int, default=10, help="games per pairing (default 10)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, game i uses seed + i")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes, 0 plays every game in this process (default: CPU count)")
+    parser.add_argument("--output", help="file to write the JSON lines to (default: stdout)")
+    args = parser.parse_args()
+
+    pairings = args.pairing or [("player", "random")]
+
+    # Check the agent specs before starting any games
+    for agent_spec in {spec for pairing in pairings for spec in pairing}:
+        parseAgent(agent_spec)
+
+    schedule = scheduleGames(pairings, args.games, args.seed)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+
+    # Wins of each agent on each side (so agents playing themselves are told apart), draws and errors
+    results = Counter()
+
+    def recordResult(record):
+        print(json.dumps(record), file=output, flush=True)
+
+        if record["winner"] is None:
+            results[record["result"]] += 1
+        else:
+            results["{} ({})".format(record[record["winner"]], record["winner"])] += 1
+
+    try:
+        if args.workers == 0:
+            for game in schedule:
+                recordResult(playGame(*game))
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers) as process_pool:
+                futures = {process_pool.submit(playGame, *game): game for game in schedule}
+
+                for future in as_completed(futures):
+                    try:
+                        record = future.result()
+                    except Exception:
+                        # The worker process itself failed (e.g. it was killed)
+                        record = errorRecord(*futures[future], traceback.format_exc())
+
+                    recordResult(record)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    for outcome, count in results.most_common():
+        print("{}: {}".format(outcome, count), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
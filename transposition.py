@@ -0,0 +1,136 @@
+from array import array
+import random
+
+from geometry import CELLS
+
+
+# Zobrist hashing of board positions and a transposition table storing the scores of
+# positions that have already been evaluated, so positions reached through different joint
+# moves are only evaluated once.
+#
+# A position's key is the XOR of one random 64-bit number per (hex, piece, count) (count is
+# how many of that piece are stacked on the hex), one per throw count for each team and one
+# for the team the position is scored for. Keys are updated incrementally from the undo
+# records of apply_joint_move, only the hexes touched by the move are rehashed.
+
+ZOBRIST_SEED = 30024
+
+# Most tokens of one kind that can be stacked on a hex (each team only has 9 tokens)
+MAX_STACK = 9
+
+def _buildZobristTables():
+    rng = random.Random(ZOBRIST_SEED)
+
+    def randomKey():
+        return rng.getrandbits(64)
+
+    # ZOBRIST_HEX[coord][piece][count], a count of 0 hashes to 0 so empty hexes don't need hashing
+    hex_keys = {cell: {piece: (0,) + tuple(randomKey() for _ in range(MAX_STACK)) for piece in "RPSrps"}
+                for cell in CELLS}
+
+    upper_thrown_keys = tuple(randomKey() for _ in range(10))
+    lower_thrown_keys = tuple(randomKey() for _ in range(10))
+
+    team_keys = {"upper": 0, "lower": randomKey()}
+
+    return hex_keys, upper_thrown_keys, lower_thrown_keys, team_keys
+
+ZOBRIST_HEX, ZOBRIST_UPPER_THROWN, ZOBRIST_LOWER_THROWN, ZOBRIST_TEAM = _buildZobristTables()
+
+
+def hexKey(coord, pieces):
+    # Hash of the list of pieces on one hex
+    key = 0
+    piece_keys = ZOBRIST_HEX[coord]
+    for piece in set(pieces):
+        key ^= piece_keys[piece][pieces.count(piece)]
+    return key
+
+
+def zobristKey(team, coord_dict, upper_thrown_num, lower_thrown_num):
+    # Hash a whole position from scratch
+
+    key = ZOBRIST_TEAM[team] ^ ZOBRIST_UPPER_THROWN[upper_thrown_num] ^ ZOBRIST_LOWER_THROWN[lower_thrown_num]
+
+    for coord, pieces in coord_dict.items():
+        if pieces:
+            key ^= hexKey(coord, pieces)
+
+    return key
+
+
+def updateZobristKey(key, undo_record, coord_dict, upper_thrown_num, lower_thrown_num):
+    # Key of the position after apply_joint_move, given the key from before it. undo_record is the
+    # record apply_joint_move returned, coord_dict and the thrown nums are the position after the move
+
+    touched_hexes, _, old_upper_thrown_num, old_lower_thrown_num = undo_record
+
+    for coord, old_pieces in touched_hexes.items():
+        if old_pieces:
+            key ^= hexKey(coord, old_pieces)
+        new_pieces = coord_dict.get(coord)
+        if new_pieces:
+            key ^= hexKey(coord, new_pieces)
+
+    key ^= ZOBRIST_UPPER_THROWN[old_upper_thrown_num] ^ ZOBRIST_UPPER_THROWN[upper_thrown_num]
+    key ^= ZOBRIST_LOWER_THROWN[old_lower_thrown_num] ^ ZOBRIST_LOWER_THROWN[lower_thrown_num]
+
+    return key
+
+
+class TranspositionTable:
+    # Fixed size table of (key, depth, score) entries, where depth is how many plies below the
+    # position were searched to get score (0 for a heuristic score).
+    #
+    # Each key maps to a single slot. A slot is replaced by a search at least as deep, or by any
+    # search once its entry is from an earlier call to new_search (depth-preferred replacement
+    # with ageing), so deep entries from old turns don't fill up the table.
+
+    def __init__(self, size_power=18):
+
+        self.size = 1 << size_power
+        self.mask = self.size - 1
+
+        self.keys = array("Q", bytes(8 * self.size))
+        self.depths = array("b", [-1]) * self.size
+        self.scores = array("d", bytes(8 * self.size))
+        self.generations = array("H", bytes(2 * self.size))
+
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def new_search(self):
+        # Call at the start of each search so the previous searches' entries become replaceable
+        self.generation = (self.generation + 1) & 0xFFFF
+
+    def probe(self, key, depth):
+        # Return the stored score for key if it was searched to at least depth, otherwise None
+
+        slot = key & self.mask
+
+        if self.depths[slot] >= depth and self.keys[slot] == key:
+            self.hits += 1
+            return self.scores[slot]
+
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score):
+
+        slot = key & self.mask
+
+        if (self.depths[slot] <= depth or self.keys[slot] == key
+                or self.generations[slot] != self.generation):
+
+            self.keys[slot] = key
+            self.depths[slot] = depth
+            self.scores[slot] = score
+            self.generations[slot] = self.generation
+
+            self.stores += 1
+
+    def clear(self):
+        self.depths = array("b", [-1]) * self.size